@@ -0,0 +1,124 @@
+"""
+Synthetic movie catalogs with the final_movies.csv schema, for benchmarks.
+
+Words, titles and people are drawn from Zipf-like distributions over
+generated vocabularies, so TF-IDF sparsity, title collisions and shared
+cast look like the real catalog at any size. Output is deterministic for
+a given size and seed.
+
+    python benchmarks/generate_catalog.py --rows 100k --output catalog_100k.csv
+"""
+
+import argparse
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from recommendation.filters import GENRES
+
+SIZES = {'10k': 10_000, '100k': 100_000, '1m': 1_000_000}
+COLUMNS = [
+    'title', 'release_date', 'original_language', 'overview', 'genres', 'cast', 'director', 'imdb_rating',
+    'poster_path',
+]
+LANGUAGES = ['en', 'hi', 'ta', 'te', 'ml', 'kn', 'fr', 'ja', 'ko', 'es', 'de', 'it', 'zh']
+LANGUAGE_WEIGHTS = [0.55, 0.08, 0.05, 0.05, 0.04, 0.03, 0.05, 0.04, 0.03, 0.03, 0.02, 0.02, 0.01]
+SYLLABLES = [
+    'ka', 'lo', 'mi', 'ra', 'ten', 'sor', 'vel', 'dun', 'bri', 'sha', 'tor', 'ne', 'gal', 'pha', 'rin',
+    'do', 'mer', 'qui', 'zen', 'ul', 'ast', 'el', 'von', 'ry', 'cha', 'mo', 'lin', 'ber', 'ix', 'pra',
+]
+POSTER_CHARS = np.array(list('abcdefghijklmnopqrstuvwxyzABCDEFGHIJKLMNOPQRSTUVWXYZ0123456789'))
+
+
+def parse_size(value):
+    """Row count from '10k', '100k', '1m' or a plain integer."""
+    return SIZES.get(str(value).lower()) or int(value)
+
+
+def _words(rng, count, min_syllables=2, max_syllables=4):
+    lengths = rng.integers(min_syllables, max_syllables + 1, count)
+    parts = rng.integers(0, len(SYLLABLES), (count, max_syllables))
+    words = {''.join(SYLLABLES[p] for p in row[:length]) for row, length in zip(parts, lengths)}
+    # Sorted for determinism, then shuffled so frequency does not follow spelling
+    return rng.permutation(np.array(sorted(words)))
+
+
+def _zipf_choice(rng, vocabulary, size, exponent=1.1):
+    """Draw vocabulary entries with Zipf-like frequencies: few common, many rare."""
+    weights = 1.0 / np.arange(1, len(vocabulary) + 1) ** exponent
+    return vocabulary[rng.choice(len(vocabulary), size=size, p=weights / weights.sum())]
+
+
+def _join_rows(tokens, lengths):
+    """Space-join consecutive runs of tokens, one string per length."""
+    ends = np.cumsum(lengths)
+    tokens = tokens.tolist()
+    return [' '.join(tokens[end - length:end]) for end, length in zip(ends, lengths)]
+
+
+def generate_catalog(n_rows, seed=0):
+    """DataFrame of n_rows synthetic movies with the final_movies.csv columns."""
+    rng = np.random.default_rng(seed)
+    vocabulary = _words(rng, max(2000, min(60000, n_rows // 4)))
+    title_words = _words(rng, max(500, min(20000, n_rows // 20)), 1, 3)
+    first_names = np.char.capitalize(_words(rng, 3000, 1, 2))
+    last_names = np.char.capitalize(_words(rng, max(2000, n_rows // 10), 2, 3))
+    people = np.char.add(np.char.add(first_names[rng.integers(0, len(first_names), max(5000, n_rows // 2))], ' '),
+                         last_names[rng.integers(0, len(last_names), max(5000, n_rows // 2))])
+
+    title_lengths = rng.integers(1, 5, n_rows)
+    titles = _join_rows(np.char.capitalize(_zipf_choice(rng, title_words, title_lengths.sum(), 0.9)), title_lengths)
+    sequels = rng.random(n_rows) < 0.05
+    titles = [f"{title} {number}" if sequel else title
+              for title, sequel, number in zip(titles, sequels, rng.integers(2, 6, n_rows))]
+
+    days = rng.integers(0, (2025 - 1920) * 365, n_rows)
+    release_dates = (np.datetime64('1920-01-01') + days).astype(str).astype(object)
+    release_dates[rng.random(n_rows) < 0.02] = ''
+
+    overview_lengths = rng.integers(15, 60, n_rows)
+    overviews = _join_rows(_zipf_choice(rng, vocabulary, overview_lengths.sum()), overview_lengths)
+
+    genre_counts = rng.integers(1, 4, n_rows)
+    genres = _join_rows(np.array(GENRES)[rng.integers(0, len(GENRES), genre_counts.sum())], genre_counts)
+
+    cast_sizes = rng.integers(3, 9, n_rows)
+    cast = _join_rows(_zipf_choice(rng, people, cast_sizes.sum(), 0.8), cast_sizes)
+    directors = _zipf_choice(rng, people, n_rows, 0.8)
+
+    ratings = np.round(rng.uniform(1.0, 9.5, n_rows), 3).astype(object)
+    ratings[rng.random(n_rows) < 0.03] = ''
+    posters = ['/' + ''.join(chars) + '.jpg' for chars in POSTER_CHARS[rng.integers(0, len(POSTER_CHARS), (n_rows, 27))]]
+
+    df = pd.DataFrame({
+        'title': titles,
+        'release_date': release_dates,
+        'original_language': rng.choice(LANGUAGES, n_rows, p=LANGUAGE_WEIGHTS),
+        'overview': overviews,
+        'genres': genres,
+        'cast': cast,
+        'director': directors,
+        'imdb_rating': ratings,
+        'poster_path': posters,
+    }, columns=COLUMNS)
+    # Numbered from 1 like process_movies output
+    df.index = pd.RangeIndex(1, n_rows + 1, name='index')
+    return df
+
+
+def write_catalog(n_rows, output, seed=0):
+    generate_catalog(n_rows, seed).to_csv(output, index=True)
+    return output
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Generate a synthetic final_movies.csv")
+    parser.add_argument('--rows', default='10k', help="10k, 100k, 1m or a row count")
+    parser.add_argument('--output', required=True, help="CSV file to write")
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+    write_catalog(parse_size(args.rows), args.output, args.seed)
+    print(f"Wrote {parse_size(args.rows):,} movies to {args.output}")
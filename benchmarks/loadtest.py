@@ -0,0 +1,404 @@
+"""
+Load test of the WSGI app (movie.wsgi), to size gunicorn workers.
+
+Requests replay a seeded mix of user sessions:
+
+    autocomplete  typing a title from moviesdb.csv: one autocomplete
+                  request per keystroke from the second character on
+    index         /api/recommendations by movie_index
+    fuzzy         /api/recommendations by a misspelled title
+    miss          autocomplete of text no title contains: the substring
+                  search comes up empty and the fuzzy fallback gathers
+                  candidates from the title trigram postings, then
+                  reranks the best 200 with difflib
+
+against one of two targets:
+
+    inprocess  --workers processes each load the app and call its WSGI
+               handler directly, from their share of --concurrency threads
+    gunicorn   `gunicorn movie.wsgi` is started with --workers sync workers
+               on a free local port and --concurrency client threads send
+               it requests over HTTP
+
+Throughput, latency percentiles (overall and per kind), response statuses
+and the RSS of every worker are printed and written as JSON, by default
+to benchmarks/results/loadtest-<timestamp>-<commit>.json. Everything runs
+locally, no network access is needed. RSS is read from /proc, so it is
+only reported on Linux.
+
+    python benchmarks/loadtest.py --target gunicorn --workers 2 --concurrency 8 --requests 5000
+"""
+
+import argparse
+import csv
+import http.client
+import json
+import multiprocessing
+import os
+import queue
+import random
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime, timezone
+from urllib.parse import urlencode
+from wsgiref.util import setup_testing_defaults
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+from benchmarks.run import RESULTS_DIR, _git_commit, _misspell, latency_stats
+from recommendation.artifact import artifact_exists, read_manifest
+
+TITLES_PATH = os.path.join(ROOT, 'recommendation', 'static', 'recommendation', 'moviesdb.csv')
+ARTIFACT_PATH = os.path.join(ROOT, 'recommendation', 'static', 'recommendation', 'preprocessed')
+# Sessions of each kind, relative to the others
+DEFAULT_MIX = 'autocomplete=6,index=2,fuzzy=1,miss=1'
+KINDS = ('autocomplete', 'index', 'fuzzy', 'miss')
+# Longest typed prefix of an autocomplete session
+MAX_TYPED = 12
+
+# The load test needs no secrets, but the settings refuse to start without one
+os.environ.setdefault('SECRET_KEY', 'loadtest')
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'movie.settings')
+
+
+def parse_mix(spec):
+    """{'autocomplete': 6.0, ...} from a "kind=weight,..." string, kinds not named weigh 0."""
+    mix = dict.fromkeys(KINDS, 0.0)
+    for item in spec.split(','):
+        if not item.strip():
+            continue
+        name, _, weight = item.partition('=')
+        name = name.strip()
+        if name not in mix:
+            raise ValueError(f"Unknown request kind {name!r}, expected one of {', '.join(KINDS)}")
+        mix[name] = float(weight or 1)
+    if not any(weight > 0 for weight in mix.values()):
+        raise ValueError("At least one request kind must weigh more than 0")
+    return mix
+
+
+def read_titles(path=TITLES_PATH):
+    with open(path, newline='', encoding='utf-8') as f:
+        return [row['title'] for row in csv.DictReader(f) if row.get('title')]
+
+
+def build_plan(titles, n_movies, n_requests, mix, seed=0):
+    """
+    Sessions of at least n_requests requests in total. A session is a list
+    of (kind, path) sent one after the other by the same client.
+    """
+    rng = random.Random(seed)
+    kinds = [kind for kind in KINDS if mix[kind] > 0]
+    weights = [mix[kind] for kind in kinds]
+    sessions = []
+    total = 0
+    while total < n_requests:
+        kind = rng.choices(kinds, weights)[0]
+        if kind == 'autocomplete':
+            title = rng.choice(titles)
+            typed = title[:rng.randint(2, max(2, min(len(title), MAX_TYPED)))]
+            session = [(kind, '/autocomplete/?' + urlencode({'q': typed[:end]})) for end in range(2, len(typed) + 1)]
+        elif kind == 'index':
+            session = [(kind, '/api/recommendations?' + urlencode({'movie_index': rng.randrange(n_movies)}))]
+        elif kind == 'fuzzy':
+            session = [(kind, '/api/recommendations?' + urlencode({'title': _misspell(rng, rng.choice(titles))}))]
+        else:
+            miss = ''.join(rng.choice('qxzjvw') for _ in range(rng.randint(5, 9)))
+            session = [(kind, '/autocomplete/?' + urlencode({'q': miss}))]
+        sessions.append(session)
+        total += len(session)
+    return sessions
+
+
+def read_rss(pid='self'):
+    """VmRSS, RssAnon and RssFile of a process in MB, None where /proc is missing."""
+    try:
+        with open(f'/proc/{pid}/status') as f:
+            lines = f.readlines()
+    except OSError:
+        return None
+    rss = {}
+    for line in lines:
+        name, _, value = line.partition(':')
+        if name in ('VmRSS', 'RssAnon', 'RssFile'):
+            rss[name] = round(int(value.split()[0]) / 1024, 1)
+    return rss
+
+
+def _child_pids(pid):
+    pids = []
+    for entry in os.listdir('/proc'):
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f'/proc/{entry}/stat') as f:
+                # The command name in parentheses may contain spaces
+                fields = f.read().rsplit(')', 1)[1].split()
+        except OSError:
+            continue
+        if int(fields[1]) == pid:
+            pids.append(int(entry))
+    return sorted(pids)
+
+
+def _run_sessions(sessions, threads, send):
+    """Send the sessions from `threads` threads; returns (kind, milliseconds, status) samples."""
+    pending = queue.SimpleQueue()
+    for session in sessions:
+        pending.put(session)
+    samples = []
+
+    def client():
+        own = []
+        while True:
+            try:
+                session = pending.get_nowait()
+            except queue.Empty:
+                break
+            for kind, path in session:
+                start = time.perf_counter()
+                try:
+                    status = send(path)
+                except Exception as e:
+                    status = type(e).__name__
+                own.append((kind, (time.perf_counter() - start) * 1000, status))
+        samples.extend(own)
+
+    workers = [threading.Thread(target=client) for _ in range(threads)]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    return samples
+
+
+def _wsgi_sender(application):
+    def send(path):
+        path, _, query = path.partition('?')
+        environ = {'REQUEST_METHOD': 'GET', 'PATH_INFO': path, 'QUERY_STRING': query}
+        setup_testing_defaults(environ)
+        statuses = []
+        body = application(environ, lambda status, headers, exc_info=None: statuses.append(status))
+        try:
+            for _ in body:
+                pass
+        finally:
+            if hasattr(body, 'close'):
+                body.close()
+        return int(statuses[0].split()[0])
+    return send
+
+
+def _http_sender(port):
+    local = threading.local()
+
+    def send(path):
+        if not hasattr(local, 'connection'):
+            local.connection = http.client.HTTPConnection('127.0.0.1', port, timeout=60)
+        try:
+            local.connection.request('GET', path)
+            response = local.connection.getresponse()
+            response.read()
+        except (http.client.HTTPException, OSError):
+            # Sync workers close connections, start a new one next time
+            local.connection.close()
+            del local.connection
+            raise
+        return response.status
+    return send
+
+
+def _inprocess_worker(sessions, threads, warmup, barrier, results):
+    """One in-process worker: load the app, warm up, wait for the others, run."""
+    try:
+        import django
+        django.setup()
+        from django.core.handlers.wsgi import WSGIHandler
+        from recommendation import similarity
+
+        send = _wsgi_sender(WSGIHandler())
+        similarity.get_model()
+        _run_sessions(warmup, 1, send)
+    except BaseException as e:
+        # Release the other processes waiting for this one
+        barrier.abort()
+        results.put((os.getpid(), None, f"{type(e).__name__}: {e}"))
+        raise
+    barrier.wait()
+    samples = _run_sessions(sessions, threads, send)
+    results.put((os.getpid(), samples, read_rss()))
+
+
+def run_inprocess(sessions, warmup, workers, concurrency):
+    """Returns (samples, seconds, [(pid, role, rss)])."""
+    context = multiprocessing.get_context('spawn' if sys.platform == 'win32' else 'fork')
+    barrier = context.Barrier(workers + 1)
+    results = context.Queue()
+    processes = [
+        context.Process(
+            target=_inprocess_worker,
+            args=(sessions[i::workers], len(range(i, concurrency, workers)), warmup, barrier, results),
+        )
+        for i in range(workers)
+    ]
+    for process in processes:
+        process.start()
+    print(f"Waiting for {workers} worker(s) to load the app...")
+    try:
+        barrier.wait()
+    except threading.BrokenBarrierError:
+        pid, _, error = results.get()
+        for process in processes:
+            process.terminate()
+        raise RuntimeError(f"Worker {pid} failed to start: {error}")
+    start = time.perf_counter()
+    samples, rss = [], []
+    for _ in processes:
+        pid, worker_samples, worker_rss = results.get()
+        samples.extend(worker_samples)
+        rss.append((pid, 'worker', worker_rss))
+    seconds = time.perf_counter() - start
+    for process in processes:
+        process.join()
+    return samples, seconds, rss
+
+
+def _free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def _wait_ready(port, server, timeout):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if server.poll() is not None:
+            break
+        try:
+            connection = http.client.HTTPConnection('127.0.0.1', port, timeout=5)
+            connection.request('GET', '/readyz')
+            if connection.getresponse().status == 200:
+                return True
+        except (http.client.HTTPException, OSError):
+            pass
+        time.sleep(0.5)
+    return False
+
+
+def run_gunicorn(sessions, warmup, workers, concurrency, gunicorn_args=(), startup_timeout=120):
+    """Returns (samples, seconds, [(pid, role, rss)]), the gunicorn master last."""
+    port = _free_port()
+    # Workers load the model at boot, so /readyz tells when they can serve
+    env = dict(os.environ, RECOMMENDATION_PRELOAD=os.environ.get('RECOMMENDATION_PRELOAD', 'True'))
+    command = [
+        sys.executable, '-m', 'gunicorn', 'movie.wsgi', '--workers', str(workers),
+        '--bind', f'127.0.0.1:{port}', *gunicorn_args,
+    ]
+    with tempfile.TemporaryFile(mode='w+') as log:
+        print(f"Starting {' '.join(command[2:])}...")
+        server = subprocess.Popen(command, cwd=ROOT, env=env, stdout=log, stderr=subprocess.STDOUT)
+        try:
+            if not _wait_ready(port, server, startup_timeout):
+                log.seek(0)
+                raise RuntimeError(f"gunicorn did not become ready:\n{log.read()[-2000:]}")
+            send = _http_sender(port)
+            _run_sessions(warmup, concurrency, send)
+            start = time.perf_counter()
+            samples = _run_sessions(sessions, concurrency, send)
+            seconds = time.perf_counter() - start
+            pids = _child_pids(server.pid) if os.path.isdir('/proc') else []
+            rss = [(pid, 'worker', read_rss(pid)) for pid in pids] + [(server.pid, 'master', read_rss(server.pid))]
+        finally:
+            server.terminate()
+            server.wait(timeout=30)
+    return samples, seconds, rss
+
+
+def summarize(samples, seconds):
+    statuses = {}
+    for kind, milliseconds, status in samples:
+        statuses[str(status)] = statuses.get(str(status), 0) + 1
+    by_kind = {}
+    for kind in KINDS:
+        latencies = [milliseconds for sample_kind, milliseconds, status in samples if sample_kind == kind]
+        if latencies:
+            by_kind[kind] = latency_stats(latencies)
+    return {
+        'requests': len(samples),
+        'seconds': round(seconds, 3),
+        'throughput_rps': round(len(samples) / seconds, 1) if seconds else None,
+        'latency': latency_stats([milliseconds for kind, milliseconds, status in samples]),
+        'by_kind': by_kind,
+        'statuses': statuses,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Load test the WSGI app with a realistic request mix")
+    parser.add_argument('--target', choices=['inprocess', 'gunicorn'], default='inprocess',
+                        help="call the app in worker processes, or through a local gunicorn")
+    parser.add_argument('--workers', type=int, default=1, help="app worker processes")
+    parser.add_argument('--concurrency', type=int, default=4, help="requests in flight at once")
+    parser.add_argument('--requests', type=int, default=2000, help="requests to time")
+    parser.add_argument('--warmup', type=int, default=200, help="requests sent before timing")
+    parser.add_argument('--mix', default=DEFAULT_MIX, help=f"session kinds and weights (default: {DEFAULT_MIX})")
+    parser.add_argument('--titles', default=TITLES_PATH, help="CSV file whose title column feeds the sessions")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--gunicorn-arg', action='append', default=[], dest='gunicorn_args',
+                        help="extra gunicorn argument, repeatable (e.g. --gunicorn-arg=--preload)")
+    parser.add_argument('--output', help="results file (default: benchmarks/results/loadtest-<timestamp>-<commit>.json)")
+    args = parser.parse_args(argv)
+    if args.workers < 1 or args.concurrency < args.workers:
+        parser.error("--concurrency must be at least --workers, which must be at least 1")
+    mix = parse_mix(args.mix)
+
+    titles = read_titles(args.titles)
+    n_movies = read_manifest(ARTIFACT_PATH)['n_movies'] if artifact_exists(ARTIFACT_PATH) else len(titles)
+    sessions = build_plan(titles, n_movies, args.requests, mix, args.seed)
+    warmup = build_plan(titles, n_movies, args.warmup, mix, args.seed + 1) if args.warmup else []
+
+    if args.target == 'inprocess':
+        samples, seconds, rss = run_inprocess(sessions, warmup, args.workers, args.concurrency)
+    else:
+        samples, seconds, rss = run_gunicorn(sessions, warmup, args.workers, args.concurrency, args.gunicorn_args)
+
+    commit = _git_commit()
+    created = datetime.now(timezone.utc)
+    results = {
+        'created': created.isoformat(timespec='seconds'),
+        'git_commit': commit,
+        'target': args.target,
+        'workers': args.workers,
+        'concurrency': args.concurrency,
+        'mix': mix,
+        'cpu_count': os.cpu_count(),
+        **summarize(samples, seconds),
+        'rss_mb': [{'pid': pid, 'role': role, **(values or {})} for pid, role, values in rss],
+    }
+
+    output = args.output or os.path.join(
+        RESULTS_DIR, f"loadtest-{created.strftime('%Y%m%dT%H%M%SZ')}-{commit or 'unknown'}.json"
+    )
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, 'w') as f:
+        json.dump(results, f, indent=2)
+    print(f"Results written to {output}")
+
+    latency = results['latency']
+    print(f"{results['requests']} requests in {results['seconds']}s: {results['throughput_rps']} req/s, "
+          f"p50 {latency['p50_ms']} ms, p95 {latency['p95_ms']} ms, p99 {latency['p99_ms']} ms")
+    for kind, stats in results['by_kind'].items():
+        print(f"  {kind:<13} {stats['calls']:>6} calls  p50 {stats['p50_ms']:>9.3f} ms  "
+              f"p95 {stats['p95_ms']:>9.3f} ms  p99 {stats['p99_ms']:>9.3f} ms")
+    print(f"  statuses: {results['statuses']}")
+    for entry in results['rss_mb']:
+        values = ', '.join(f"{name} {value} MB" for name, value in entry.items() if name not in ('pid', 'role'))
+        print(f"  {entry['role']} {entry['pid']}: {values or 'RSS unavailable'}")
+
+
+if __name__ == '__main__':
+    main()
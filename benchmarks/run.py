@@ -0,0 +1,223 @@
+"""
+Benchmarks for the build and the request hot paths, on synthetic catalogs.
+
+For each catalog size this generates a catalog (see generate_catalog.py),
+times the preprocess_data build and the artifact load, then times:
+
+    suggest_hit          autocomplete, query contained in titles
+    suggest_miss         autocomplete, no title contains the query nor is close to it
+    suggest_fuzzy        autocomplete, misspelled title (fuzzy fallback)
+    recommend_index      movie_recommendation by movie_index
+    recommend_title_year movie_recommendation by "Title (Year)"
+    recommend_fuzzy      movie_recommendation by misspelled title
+    recommend_large_k    movie_recommendation of 150 movies, past the
+                         build's top-k, scored on demand
+    describe             description_recommendation of a few vocabulary
+                         words (inverted index search)
+
+Result caches are cleared before every call, so timings measure the
+computation. Results are written as JSON, by default to
+benchmarks/results/<timestamp>-<commit>.json; --baseline compares the
+medians against an earlier results file.
+
+    python benchmarks/run.py --sizes 10k,100k [--baseline benchmarks/results/old.json]
+"""
+
+import argparse
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import time
+from datetime import datetime, timezone
+
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+from benchmarks.generate_catalog import parse_size, write_catalog
+from recommendation import similarity
+from recommendation.preprocess_data import preprocess_data
+
+WORK_DIR = os.path.join(ROOT, 'benchmarks', '.work')
+RESULTS_DIR = os.path.join(ROOT, 'benchmarks', 'results')
+# Catalogs above this size are built with the approximate mode
+EXACT_MAX_ROWS = 200_000
+
+
+def _git_commit():
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT, capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def _directory_bytes(path):
+    return sum(os.path.getsize(os.path.join(root, name)) for root, dirs, files in os.walk(path) for name in files)
+
+
+def _misspell(rng, title):
+    """Swap two neighboring letters, the typical typo."""
+    if len(title) < 4:
+        return title + 'x'
+    i = rng.randrange(1, len(title) - 2)
+    return title[:i] + title[i + 1] + title[i] + title[i + 2:]
+
+
+def timings(function, arguments, clear_caches=True):
+    """Per-call statistics in milliseconds of function(*args) for each args tuple."""
+    samples = []
+    for args in arguments:
+        if clear_caches:
+            similarity._result_cache.clear()
+            similarity._suggestion_cache.clear()
+        start = time.perf_counter()
+        function(*args)
+        samples.append((time.perf_counter() - start) * 1000)
+    return latency_stats(samples)
+
+
+def latency_stats(samples):
+    """Mean, percentiles and maximum of latencies in milliseconds."""
+    samples = np.array(samples)
+    return {
+        'calls': len(samples),
+        'mean_ms': round(float(samples.mean()), 3),
+        'p50_ms': round(float(np.percentile(samples, 50)), 3),
+        'p95_ms': round(float(np.percentile(samples, 95)), 3),
+        'p99_ms': round(float(np.percentile(samples, 99)), 3),
+        'max_ms': round(float(samples.max()), 3),
+    }
+
+
+def bench_size(size, iterations=200, workers=1, regenerate=False, rebuild=True, seed=0):
+    n_rows = parse_size(size)
+    work_dir = os.path.join(WORK_DIR, size)
+    os.makedirs(work_dir, exist_ok=True)
+    csv_path = os.path.join(work_dir, 'final_movies.csv')
+    artifact_path = os.path.join(work_dir, 'preprocessed')
+    result = {'size': size, 'rows': n_rows}
+
+    if regenerate or not os.path.exists(csv_path):
+        print(f"[{size}] Generating catalog...")
+        start = time.perf_counter()
+        write_catalog(n_rows, csv_path, seed)
+        result['generate_seconds'] = round(time.perf_counter() - start, 3)
+
+    mode = 'exact' if n_rows <= EXACT_MAX_ROWS else 'ann'
+    result['build_mode'] = mode
+    if rebuild or not os.path.exists(artifact_path):
+        print(f"[{size}] Building the artifact ({mode})...")
+        start = time.perf_counter()
+        preprocess_data(
+            mode=mode, workers=workers, recall_sample=0, csv_path=csv_path, artifact_path=artifact_path,
+        )
+        result['build_seconds'] = round(time.perf_counter() - start, 3)
+    result['artifact_bytes'] = _directory_bytes(artifact_path)
+
+    print(f"[{size}] Loading the artifact...")
+    similarity.artifact_path = artifact_path
+    similarity._model = None
+    start = time.perf_counter()
+    model = similarity.get_model()
+    result['load_seconds'] = round(time.perf_counter() - start, 3)
+
+    rng = random.Random(seed)
+    columns = model['columns']
+    rows = [rng.randrange(len(columns['title'])) for _ in range(iterations)]
+    titles = [str(columns['title'][row]) for row in rows]
+    substrings = []
+    for title in titles:
+        start_char = rng.randrange(max(1, len(title) - 3))
+        substrings.append(title[start_char:start_char + rng.randint(3, 6)])
+    fuzzy_titles = [_misspell(rng, title) for title in titles]
+    misses = [''.join(rng.choice('qxzjvw') for _ in range(6)) for _ in range(iterations)]
+    vocabulary = model['vectorizer'].get_feature_names_out()
+    descriptions = [
+        ' '.join(vocabulary[rng.randrange(len(vocabulary))] for _ in range(rng.randint(2, 5)))
+        for _ in range(iterations)
+    ]
+
+    print(f"[{size}] Timing the hot paths...")
+    result['benchmarks'] = {
+        'suggest_hit': timings(similarity.get_movie_suggestions, [(query, 50) for query in substrings]),
+        'suggest_miss': timings(similarity.get_movie_suggestions, [(query, 50) for query in misses]),
+        'suggest_fuzzy': timings(similarity.get_movie_suggestions, [(query, 50) for query in fuzzy_titles]),
+        'recommend_index': timings(similarity.movie_recommendation, [('', 10, row) for row in rows]),
+        'recommend_title_year': timings(
+            similarity.movie_recommendation, [(str(columns['full_title'][row]), 10) for row in rows]
+        ),
+        'recommend_fuzzy': timings(similarity.movie_recommendation, [(title, 10) for title in fuzzy_titles]),
+        'recommend_large_k': timings(similarity.movie_recommendation, [('', 150, row) for row in rows]),
+        'describe': timings(similarity.description_recommendation, [(text, 10) for text in descriptions]),
+    }
+    similarity._model = None
+    return result
+
+
+def compare(results, baseline_path):
+    """Print the median ratio of each benchmark against a baseline results file."""
+    with open(baseline_path) as f:
+        baseline = {entry['size']: entry for entry in json.load(f)['results']}
+    for entry in results['results']:
+        previous = baseline.get(entry['size'])
+        if previous is None:
+            continue
+        for name in ('build_seconds', 'load_seconds'):
+            if name in entry and name in previous:
+                print(f"  {entry['size']:>5} {name:<22} {previous[name]:>10.3f} -> {entry[name]:>10.3f}")
+        for name, stats in entry['benchmarks'].items():
+            old = previous.get('benchmarks', {}).get(name)
+            if old:
+                ratio = stats['p50_ms'] / old['p50_ms'] if old['p50_ms'] else float('inf')
+                print(f"  {entry['size']:>5} {name:<22} {old['p50_ms']:>10.3f} -> {stats['p50_ms']:>10.3f} ms p50 ({ratio:.2f}x)")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the build and request hot paths on synthetic catalogs")
+    parser.add_argument('--sizes', default='10k', help="comma separated catalog sizes: 10k, 100k, 1m or row counts")
+    parser.add_argument('--iterations', type=int, default=200, help="calls per hot path benchmark")
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1, help="processes for the build")
+    parser.add_argument('--regenerate', action='store_true', help="regenerate catalogs even when present")
+    parser.add_argument('--no-rebuild', action='store_true', help="reuse existing artifacts, skipping build timing")
+    parser.add_argument('--output', help="results file (default: benchmarks/results/<timestamp>-<commit>.json)")
+    parser.add_argument('--baseline', help="earlier results file to compare against")
+    args = parser.parse_args(argv)
+
+    commit = _git_commit()
+    created = datetime.now(timezone.utc)
+    results = {
+        'created': created.isoformat(timespec='seconds'),
+        'git_commit': commit,
+        'python': platform.python_version(),
+        'numpy': np.__version__,
+        'platform': platform.platform(),
+        'cpu_count': os.cpu_count(),
+        'iterations': args.iterations,
+        'results': [
+            bench_size(size.strip(), args.iterations, args.workers, args.regenerate, not args.no_rebuild)
+            for size in args.sizes.split(',') if size.strip()
+        ],
+    }
+
+    output = args.output or os.path.join(RESULTS_DIR, f"{created.strftime('%Y%m%dT%H%M%SZ')}-{commit or 'unknown'}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, 'w') as f:
+        json.dump(results, f, indent=2)
+    print(f"Results written to {output}")
+
+    for entry in results['results']:
+        print(f"[{entry['size']}] build {entry.get('build_seconds', '-')}s, load {entry['load_seconds']}s")
+        for name, stats in entry['benchmarks'].items():
+            print(f"  {name:<22} p50 {stats['p50_ms']:>9.3f} ms  p95 {stats['p95_ms']:>9.3f} ms")
+    if args.baseline:
+        print(f"Compared to {args.baseline}:")
+        compare(results, args.baseline)
+
+
+if __name__ == '__main__':
+    main()
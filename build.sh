@@ -6,10 +6,19 @@ set -o errexit
 echo "Installing dependencies..."
 pip install -r requirements.txt
 
+echo "Building recommendation data (unchanged stages are skipped)..."
+# PREPROCESS_WORKERS and PREPROCESS_MEMORY_MB size the similarity build to the build machine.
+# An existing artifact is updated incrementally, set PREPROCESS_FULL=1 to rebuild every stage from scratch.
+BUILD_FLAGS="--incremental"
+if [ -n "${PREPROCESS_FULL:-}" ]; then
+    BUILD_FLAGS="--force"
+fi
+python recommendation/pipeline.py $BUILD_FLAGS \
+    --workers "${PREPROCESS_WORKERS:-$(nproc)}" \
+    --memory-budget "${PREPROCESS_MEMORY_MB:-2048}"
+
+# After the data build, so the static autocomplete shards match the new artifact
 echo "Collecting static files..."
 python manage.py collectstatic --noinput
 
-echo "Running preprocessing to generate similarity data..."
-python recommendation/preprocess_data.py
-
 echo "Build complete!"
@@ -11,6 +11,7 @@ https://docs.djangoproject.com/en/5.1/ref/settings/
 """
 
 from pathlib import Path
+import django
 from decouple import config, Csv
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -44,6 +45,7 @@ INSTALLED_APPS = [
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
     'whitenoise.middleware.WhiteNoiseMiddleware',
+    'django.middleware.http.ConditionalGetMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
@@ -120,9 +122,63 @@ USE_TZ = True
 
 STATIC_URL = '/static/'
 STATIC_ROOT = BASE_DIR / 'staticfiles'
+# Static files generated at build time, such as the autocomplete shards
+# written by collectstatic. Kept out of git, see .gitignore
+RECOMMENDATION_STATIC_BUILD_DIR = BASE_DIR / 'build' / 'static'
+STATICFILES_DIRS = [RECOMMENDATION_STATIC_BUILD_DIR]
 
 # WhiteNoise configuration
-STATICFILES_STORAGE = 'whitenoise.storage.CompressedManifestStaticFilesStorage'
+# Django 4.2 replaced STATICFILES_STORAGE with STORAGES and 5.1 dropped it
+if django.VERSION >= (4, 2):
+    STORAGES = {
+        'default': {'BACKEND': 'django.core.files.storage.FileSystemStorage'},
+        'staticfiles': {'BACKEND': 'whitenoise.storage.CompressedManifestStaticFilesStorage'},
+    }
+else:
+    STATICFILES_STORAGE = 'whitenoise.storage.CompressedManifestStaticFilesStorage'
+
+# Recommendation model
+# Start loading the model in a background thread at startup instead of on first use
+RECOMMENDATION_PRELOAD = config('RECOMMENDATION_PRELOAD', default=False, cast=bool)
+# Seconds browsers and proxies may reuse recommendation and autocomplete responses
+# without asking again. At 0 they revalidate with the ETag, which changes with
+# the artifact, so listed movie indices are never stale after a rebuild
+RECOMMENDATION_CACHE_MAX_AGE = config('RECOMMENDATION_CACHE_MAX_AGE', default=0, cast=int)
+# Filter autocomplete in the browser using the static shards built by collectstatic,
+# asking the server only for fuzzy matches and one-character queries
+RECOMMENDATION_STATIC_AUTOCOMPLETE = config('RECOMMENDATION_STATIC_AUTOCOMPLETE', default=True, cast=bool)
+# Serve autocomplete and /api/recommendations with async views, for ASGI
+# servers (movie.asgi): the work runs on a pool of RECOMMENDATION_ASYNC_WORKERS
+# threads (0 for one per CPU) and is abandoned after RECOMMENDATION_REQUEST_TIMEOUT
+# seconds or when the client disconnects
+RECOMMENDATION_ASYNC_VIEWS = config('RECOMMENDATION_ASYNC_VIEWS', default=False, cast=bool)
+RECOMMENDATION_ASYNC_WORKERS = config('RECOMMENDATION_ASYNC_WORKERS', default=0, cast=int)
+RECOMMENDATION_REQUEST_TIMEOUT = config('RECOMMENDATION_REQUEST_TIMEOUT', default=5.0, cast=float)
+# Weights of the fields of the similarity text, e.g. "director=3,genres=2"
+# (genres, overview, original_language, cast, director; fields not named
+# weigh 1). Recommendations are then scored on demand by the weighted
+# per-field similarity, no rebuild needed. Empty uses the build's
+# combined similarity
+RECOMMENDATION_FIELD_WEIGHTS = config('RECOMMENDATION_FIELD_WEIGHTS', default='')
+# Time the hot path stages: Server-Timing headers on every response and
+# Prometheus metrics at /metrics
+RECOMMENDATION_METRICS = config('RECOMMENDATION_METRICS', default=False, cast=bool)
+if RECOMMENDATION_METRICS:
+    MIDDLEWARE.insert(
+        MIDDLEWARE.index('whitenoise.middleware.WhiteNoiseMiddleware') + 1,
+        'recommendation.middleware.ServerTimingMiddleware',
+    )
+# Profile single requests to the index, autocomplete and JSON views: those
+# sent with an X-Profile header equal to RECOMMENDATION_PROFILE_TOKEN (any
+# X-Profile header with DEBUG on and no token) and a random
+# RECOMMENDATION_PROFILE_SAMPLE_RATE share of the others.
+# Profiles are written to RECOMMENDATION_PROFILE_DIR as folded stacks for
+# flame graphs (sampling) or pstats files (cprofile)
+RECOMMENDATION_PROFILING = config('RECOMMENDATION_PROFILING', default=False, cast=bool)
+RECOMMENDATION_PROFILER = config('RECOMMENDATION_PROFILER', default='sampling')
+RECOMMENDATION_PROFILE_DIR = config('RECOMMENDATION_PROFILE_DIR', default=str(BASE_DIR / 'profiles'))
+RECOMMENDATION_PROFILE_SAMPLE_RATE = config('RECOMMENDATION_PROFILE_SAMPLE_RATE', default=0.0, cast=float)
+RECOMMENDATION_PROFILE_TOKEN = config('RECOMMENDATION_PROFILE_TOKEN', default='')
 
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.1/ref/settings/#default-auto-field
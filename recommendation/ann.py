@@ -0,0 +1,158 @@
+"""
+Approximate top-k neighbor search for large catalogs.
+
+The exact build scores every movie against every other one, which is
+O(n^2) and out of reach for the full TMDB dump. This module only scores
+each movie against a candidate set drawn from two sources:
+
+1. An inverted-file (IVF) index: the TF-IDF rows are reduced to dense
+   embeddings with TruncatedSVD and clustered with spherical k-means into
+   `n_lists` lists. Movies of a list are candidates for each other and for
+   the `n_probe` lists whose centroids are closest. This catches topical
+   similarity spread over common terms.
+2. Rare-term postings: movies sharing a term that occurs in at most
+   `rare_df` movies (cast, director, distinctive words). These terms carry
+   the highest TF-IDF weights, and each posting list is bounded, so the
+   cost per movie does not grow with the catalog.
+
+Candidates are scored exactly (TF-IDF cosine), only the candidate set is
+approximate. Raising n_probe or rare_df trades build time for recall.
+"""
+
+import numpy as np
+from scipy import sparse
+from sklearn.decomposition import TruncatedSVD
+
+# Rows scored per block, bounds the dense (block x candidates) score matrix
+QUERY_BLOCK_SIZE = 64
+
+
+def _normalize_rows(vectors):
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    return vectors / np.maximum(norms, 1e-12)
+
+
+def embed(features, n_components=64, seed=0):
+    """L2-normalized TruncatedSVD embeddings of the TF-IDF rows."""
+    n_components = max(1, min(n_components, features.shape[1] - 1, features.shape[0] - 1))
+    svd = TruncatedSVD(n_components=n_components, random_state=seed)
+    return _normalize_rows(svd.fit_transform(features).astype(np.float32))
+
+
+def spherical_kmeans(vectors, n_lists, n_iter=10, seed=0):
+    """Centroids of a cosine k-means, trained on a sample of the vectors."""
+    rng = np.random.default_rng(seed)
+    sample_size = min(len(vectors), n_lists * 64)
+    sample = vectors[rng.choice(len(vectors), sample_size, replace=False)]
+    centroids = sample[rng.choice(sample_size, n_lists, replace=False)].copy()
+
+    for _ in range(n_iter):
+        assign = np.argmax(sample @ centroids.T, axis=1)
+        one_hot = sparse.csr_matrix(
+            (np.ones(sample_size, dtype=np.float32), (assign, np.arange(sample_size))),
+            shape=(n_lists, sample_size),
+        )
+        sums = np.asarray(one_hot @ sample)
+        empty = ~one_hot.getnnz(axis=1).astype(bool)
+        # Empty lists keep their previous centroid
+        sums[empty] = centroids[empty]
+        centroids = _normalize_rows(sums)
+    return centroids
+
+
+def assign_lists(vectors, centroids, block_size=65536):
+    """Nearest centroid of every vector."""
+    assign = np.empty(len(vectors), dtype=np.int32)
+    for start in range(0, len(vectors), block_size):
+        assign[start:start + block_size] = np.argmax(vectors[start:start + block_size] @ centroids.T, axis=1)
+    return assign
+
+
+def ann_top_k(features, top_k, n_lists=None, n_probe=8, n_components=64, rare_df=100, seed=0):
+    """
+    Approximate top-k neighbors of every row of an L2-normalized sparse
+    matrix. Returns CSR-style (offsets, neighbors, scores); rows with fewer
+    than top_k candidates get shorter lists.
+    """
+    features = sparse.csr_matrix(features)
+    n_movies = features.shape[0]
+    n_lists = n_lists or max(1, int(np.sqrt(n_movies)))
+    n_lists = min(n_lists, n_movies)
+    n_probe = max(1, min(n_probe, n_lists))
+
+    print(f"  Embedding {n_movies} movies into {n_components} dimensions...")
+    vectors = embed(features, n_components, seed)
+    print(f"  Clustering into {n_lists} lists...")
+    centroids = spherical_kmeans(vectors, n_lists, seed=seed)
+    assign = assign_lists(vectors, centroids)
+    del vectors
+
+    order = np.argsort(assign, kind='stable')
+    list_offsets = np.searchsorted(assign[order], np.arange(n_lists + 1))
+    # Each list probes itself plus its closest lists by centroid similarity
+    probes = np.argsort(-(centroids @ centroids.T), axis=1)[:, :n_probe]
+
+    # Movie x term postings restricted to rare terms
+    document_frequency = np.bincount(features.indices, minlength=features.shape[1])
+    rare_terms = np.flatnonzero((document_frequency <= rare_df) & (document_frequency > 0))
+    rare_features = features[:, rare_terms]
+    rare_postings = rare_features.T.tocsr()
+
+    top_neighbors = np.full((n_movies, top_k), -1, dtype=np.int32)
+    top_similarity = np.zeros((n_movies, top_k), dtype=np.float32)
+    counts = np.zeros(n_movies, dtype=np.int64)
+
+    for list_id in range(n_lists):
+        members = order[list_offsets[list_id]:list_offsets[list_id + 1]]
+        if len(members) == 0:
+            continue
+        if list_id % max(1, n_lists // 10) == 0:
+            print(f"  Scoring list {list_id} of {n_lists}...")
+
+        probed = np.concatenate([order[list_offsets[probe]:list_offsets[probe + 1]] for probe in probes[list_id]])
+
+        for start in range(0, len(members), QUERY_BLOCK_SIZE):
+            queries = members[start:start + QUERY_BLOCK_SIZE]
+            # Movies sharing a rare term with any query of the block
+            sharing = (rare_features[queries] @ rare_postings).indices
+            candidates = np.unique(np.concatenate([probed, sharing]))
+            k = min(top_k, len(candidates))
+
+            scores = (features[queries] @ features[candidates].T).toarray().astype(np.float32)
+            top = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+            top_scores = np.take_along_axis(scores, top, axis=1)
+            best_first = np.argsort(-top_scores, axis=1, kind='stable')
+            top_neighbors[queries, :k] = candidates[np.take_along_axis(top, best_first, axis=1)]
+            top_similarity[queries, :k] = np.take_along_axis(top_scores, best_first, axis=1)
+            counts[queries] = k
+
+    offsets = np.zeros(n_movies + 1, dtype=np.int64)
+    np.cumsum(counts, out=offsets[1:])
+    valid = np.arange(top_k) < counts[:, None]
+    return offsets, top_neighbors[valid], top_similarity[valid]
+
+
+def recall_at_k(features, offsets, neighbors, top_k, sample_size=200, seed=0, block_size=16):
+    """
+    Mean recall@k of the neighbor lists against exact search, measured on a
+    random sample of rows. Exact neighbors with a zero score are ignored,
+    since any movie can fill those ties.
+    """
+    n_movies = features.shape[0]
+    rng = np.random.default_rng(seed)
+    sample = rng.choice(n_movies, min(sample_size, n_movies), replace=False)
+    features_t = features.T.tocsc()
+
+    recalls = []
+    for start in range(0, len(sample), block_size):
+        rows = sample[start:start + block_size]
+        scores = (features[rows] @ features_t).toarray()
+        for row, row_scores in zip(rows, scores):
+            k = min(top_k, n_movies)
+            exact = np.argpartition(-row_scores, k - 1)[:k]
+            exact = exact[row_scores[exact] > 0]
+            if len(exact) == 0:
+                continue
+            found = neighbors[offsets[row]:offsets[row + 1]]
+            recalls.append(len(np.intersect1d(exact, found)) / len(exact))
+    return float(np.mean(recalls)) if recalls else 1.0
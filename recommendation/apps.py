@@ -4,3 +4,27 @@ from django.apps import AppConfig
 class RecommendationConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'recommendation'
+
+    def ready(self):
+        from django.conf import settings
+        from . import metrics, profiling
+
+        metrics.configure(getattr(settings, 'RECOMMENDATION_METRICS', False))
+        profiling.configure(
+            getattr(settings, 'RECOMMENDATION_PROFILING', False),
+            getattr(settings, 'RECOMMENDATION_PROFILER', 'sampling'),
+            getattr(settings, 'RECOMMENDATION_PROFILE_DIR', 'profiles'),
+            getattr(settings, 'RECOMMENDATION_PROFILE_SAMPLE_RATE', 0.0),
+            getattr(settings, 'RECOMMENDATION_PROFILE_TOKEN', ''),
+            settings.DEBUG,
+        )
+        field_weights = getattr(settings, 'RECOMMENDATION_FIELD_WEIGHTS', None)
+        if field_weights:
+            from .similarity import configure_field_weights
+            configure_field_weights(field_weights)
+
+        # Warm the model in the background so workers turn ready without
+        # waiting for the first request
+        if getattr(settings, 'RECOMMENDATION_PRELOAD', False):
+            from .similarity import start_background_load
+            start_background_load()
@@ -0,0 +1,471 @@
+"""
+On-disk format of the preprocessed recommendation data.
+
+An artifact is a directory holding a JSON manifest plus flat .npy arrays:
+
+    manifest.json               format version, artifact version, shapes
+    offsets.npy                 int64[n_movies + 1], CSR row offsets
+    neighbors.npy               int32[nnz], neighbor rows, best first
+    scores.npy                  float32/float16[nnz], matching cosine scores
+    columns/<name>.data.npy     uint8, UTF-8 bytes of a text column
+    columns/<name>.offsets.npy  int64[n_movies + 1], byte offsets into it
+    columns/<name>.codes.npy    int16/int32[n_movies], low cardinality text
+                                column as codes into
+    columns/<name>.categories.json
+                                its distinct values
+    columns/<name>.npy          numeric column, stored as is
+    title_index/<name>.npy      arrays of the TitleIndex (TitleIndex.ARRAYS);
+                                format version 2 pickled it to
+                                title_index.pkl, which is no longer read
+    features/{data,indices,indptr}.npy
+                                optional L2-normalized TF-IDF matrix, CSR
+    postings/{data,indices,indptr}.npy
+                                its transpose, the movies and weights of
+                                each term (see TermIndex), stored with it
+    vectorizer.pkl              optional fitted TfidfVectorizer
+    fields/{data,indices,indptr}.npy
+                                optional TF-IDF matrices of each field of
+                                the similarity text side by side, CSR, the
+                                manifest's field_slices giving each one's
+                                columns
+    field_vectorizers.pkl       their fitted TfidfVectorizers by field
+    row_keys.npy                optional uint64[n_movies], stable row identities
+    content_hashes.npy          optional uint64[n_movies], hashes of the
+                                text the similarity is computed from
+    embeddings.npy              optional int8/float16[n_movies, dim], dense
+                                TruncatedSVD embeddings of the TF-IDF rows
+    embedding_scales.npy        float32[n_movies], per-row scales of int8
+                                embeddings
+
+The artifact path is a symlink to the current version, a directory under
+.<name>.versions/ next to it. save_artifact writes the new version there
+and swaps the symlink with os.replace, keeping the previous version for
+workers that are still opening it.
+
+Arrays are opened with numpy memory mapping, so every worker process
+shares a single copy through the OS page cache instead of unpickling its
+own private one. With lazy_columns, text columns stay in the mapped
+buffers as well and are decoded only for the rows a request renders.
+"""
+
+import hashlib
+import json
+import os
+import pickle
+import shutil
+import tempfile
+from datetime import datetime, timezone
+
+import numpy as np
+import pandas as pd
+from scipy import sparse
+
+from .term_index import TermIndex
+
+FORMAT_NAME = 'movie-recommendation-artifact'
+FORMAT_VERSION = 3
+MANIFEST_FILE = 'manifest.json'
+# Text columns with at most this fraction of distinct values are stored as codes
+CATEGORICAL_MAX_FRACTION = 0.5
+
+
+class NeighborTable:
+    """
+    Top-k neighbor lists in CSR layout. Indexing a row returns the same
+    (top_indices, top_scores) pair as the legacy list of tuples.
+    """
+
+    def __init__(self, offsets, neighbors, scores):
+        self.offsets = offsets
+        self.neighbors = neighbors
+        self.scores = scores
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def __getitem__(self, row):
+        start, end = self.offsets[row], self.offsets[row + 1]
+        return self.neighbors[start:end], self.scores[start:end]
+
+    @classmethod
+    def from_lists(cls, similarity):
+        """Build a table from the legacy list of (top_indices, top_scores) tuples."""
+        lengths = [len(top_indices) for top_indices, top_scores in similarity]
+        offsets = np.zeros(len(similarity) + 1, dtype=np.int64)
+        np.cumsum(lengths, out=offsets[1:])
+        if not similarity:
+            return cls(offsets, np.empty(0, dtype=np.int32), np.empty(0, dtype=np.float32))
+        return cls(
+            offsets,
+            np.concatenate([top_indices for top_indices, top_scores in similarity]).astype(np.int32),
+            np.concatenate([top_scores for top_indices, top_scores in similarity]).astype(np.float32),
+        )
+
+    def gather(self, rows, number):
+        """
+        First `number` neighbors of many rows in one vectorized gather.
+        Returns (neighbors, scores, counts): two (len(rows), number) arrays,
+        padded with -1 and 0 past each row's count, and the per-row counts.
+        """
+        rows = np.asarray(rows, dtype=np.int64)
+        starts = self.offsets[rows]
+        counts = np.minimum(self.offsets[rows + 1] - starts, number)
+        positions = starts[:, None] + np.arange(number)
+        valid = np.arange(number) < counts[:, None]
+
+        neighbors = np.full((len(rows), number), -1, dtype=np.int64)
+        scores = np.zeros((len(rows), number), dtype=np.float32)
+        neighbors[valid] = self.neighbors[positions[valid]]
+        scores[valid] = self.scores[positions[valid]]
+        return neighbors, scores, counts
+
+
+class StringColumn:
+    """
+    Text column read from the memory-mapped UTF-8 buffer of an artifact.
+    Indexing with a row gives a str, with an array of rows or a slice an
+    object array, like a numpy column; only those rows are decoded.
+    """
+
+    # Rows decoded at a time when iterating
+    ITER_CHUNK = 65536
+
+    def __init__(self, data, offsets):
+        self.data = np.asarray(data)
+        self.offsets = np.asarray(offsets)
+        # Slicing memoryviews is much cheaper than slicing arrays row by row
+        self._buffer = memoryview(self.data)
+        self._bounds = memoryview(self.offsets)
+
+    @classmethod
+    def from_values(cls, values):
+        """Encode a sequence of strings."""
+        encoded = [str(value).encode('utf-8') for value in values]
+        offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+        np.cumsum([len(value) for value in encoded], out=offsets[1:])
+        return cls(np.frombuffer(b''.join(encoded), dtype=np.uint8), offsets)
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def __getitem__(self, rows):
+        if isinstance(rows, (int, np.integer)):
+            row = int(rows) + len(self) if rows < 0 else int(rows)
+            return str(self._buffer[self._bounds[row]:self._bounds[row + 1]], 'utf-8')
+        if isinstance(rows, slice):
+            rows = np.arange(len(self))[rows]
+        buffer, bounds = self._buffer, self._bounds
+        values = np.empty(len(rows), dtype=object)
+        values[:] = [str(buffer[bounds[row]:bounds[row + 1]], 'utf-8') for row in np.asarray(rows).tolist()]
+        return values
+
+    def __iter__(self):
+        for start in range(0, len(self), self.ITER_CHUNK):
+            yield from self[start:start + self.ITER_CHUNK].tolist()
+
+    def tolist(self):
+        return self[:].tolist()
+
+
+class CategoricalColumn:
+    """Low cardinality text column: per-row codes into its distinct values."""
+
+    def __init__(self, codes, categories):
+        self.codes = np.asarray(codes)
+        self.categories = np.array(categories, dtype=object)
+        self._code_view = memoryview(self.codes)
+        self._category_list = list(categories)
+
+    def __len__(self):
+        return len(self.codes)
+
+    def __getitem__(self, rows):
+        if isinstance(rows, (int, np.integer)):
+            return self._category_list[self._code_view[rows]]
+        return self.categories[self.codes[rows]]
+
+    def __iter__(self):
+        return iter(self.tolist())
+
+    def tolist(self):
+        return self.categories[self.codes].tolist()
+
+
+def artifact_exists(path):
+    return os.path.exists(os.path.join(path, MANIFEST_FILE))
+
+
+def read_manifest(path):
+    """Manifest of an artifact directory, without opening its arrays."""
+    with open(os.path.join(path, MANIFEST_FILE)) as f:
+        return json.load(f)
+
+
+def _write_column(columns_dir, name, values):
+    if pd.api.types.is_numeric_dtype(values):
+        np.save(os.path.join(columns_dir, f'{name}.npy'), values.to_numpy())
+        return
+    codes, categories = pd.factorize(values.astype(str))
+    if len(categories) <= CATEGORICAL_MAX_FRACTION * len(values):
+        dtype = np.int16 if len(categories) <= np.iinfo(np.int16).max else np.int32
+        np.save(os.path.join(columns_dir, f'{name}.codes.npy'), codes.astype(dtype))
+        with open(os.path.join(columns_dir, f'{name}.categories.json'), 'w', encoding='utf-8') as f:
+            json.dump(categories.tolist(), f, ensure_ascii=False)
+        return
+    column = StringColumn.from_values(values)
+    np.save(os.path.join(columns_dir, f'{name}.data.npy'), column.data)
+    np.save(os.path.join(columns_dir, f'{name}.offsets.npy'), column.offsets)
+
+
+def _read_column(columns_dir, name, lazy=False):
+    """A column as a list of values, or as a compact column object when lazy."""
+    numeric_path = os.path.join(columns_dir, f'{name}.npy')
+    if os.path.exists(numeric_path):
+        # Plain array view of the map, indexing memmaps is several times slower
+        return np.asarray(np.load(numeric_path, mmap_mode='r'))
+    codes_path = os.path.join(columns_dir, f'{name}.codes.npy')
+    if os.path.exists(codes_path):
+        with open(os.path.join(columns_dir, f'{name}.categories.json'), encoding='utf-8') as f:
+            column = CategoricalColumn(np.load(codes_path, mmap_mode='r'), json.load(f))
+        return column if lazy else column.tolist()
+    column = StringColumn(
+        np.load(os.path.join(columns_dir, f'{name}.data.npy'), mmap_mode='r'),
+        np.load(os.path.join(columns_dir, f'{name}.offsets.npy'), mmap_mode='r'),
+    )
+    return column if lazy else column.tolist()
+
+
+def _write_features(path, features, name='features'):
+    features_dir = os.path.join(path, name)
+    os.makedirs(features_dir)
+    # Copy, sorting in place would reorder index arrays shared with the caller's matrix
+    features = sparse.csr_matrix(features, dtype=np.float32, copy=True)
+    features.sort_indices()
+    np.save(os.path.join(features_dir, 'data.npy'), features.data)
+    np.save(os.path.join(features_dir, 'indices.npy'), features.indices.astype(np.int32))
+    np.save(os.path.join(features_dir, 'indptr.npy'), features.indptr.astype(np.int64))
+    return list(features.shape)
+
+
+def _read_features(path, shape, name='features'):
+    features_dir = os.path.join(path, name)
+    return sparse.csr_matrix(
+        (
+            np.load(os.path.join(features_dir, 'data.npy'), mmap_mode='r'),
+            np.load(os.path.join(features_dir, 'indices.npy'), mmap_mode='r'),
+            np.load(os.path.join(features_dir, 'indptr.npy'), mmap_mode='r'),
+        ),
+        shape=tuple(shape),
+        copy=False,
+    )
+
+
+def save_artifact(path, df, offsets, neighbors, scores, title_index, score_dtype='float32',
+                  features=None, vectorizer=None, build_info=None, row_keys=None, content_hashes=None,
+                  embeddings=None, embedding_scales=None, field_features=None, field_slices=None,
+                  field_vectorizers=None):
+    """
+    Write a new version of an artifact and point the path at it. Readers
+    see either the previous version or the complete new one.
+    """
+    offsets = np.ascontiguousarray(offsets, dtype=np.int64)
+    neighbors = np.ascontiguousarray(neighbors, dtype=np.int32)
+    scores = np.ascontiguousarray(scores, dtype=score_dtype)
+
+    digest = hashlib.sha1()
+    for array in (offsets, neighbors, scores):
+        digest.update(array.tobytes())
+    digest.update(pd.util.hash_pandas_object(df, index=False).values.tobytes())
+    if embeddings is not None:
+        digest.update(np.ascontiguousarray(embeddings).tobytes())
+
+    path = os.path.abspath(path)
+    versions_dir = _versions_dir(path)
+    os.makedirs(versions_dir, exist_ok=True)
+    # Dot-prefixed while it is written, so cleanups leave it alone
+    tmp_path = tempfile.mkdtemp(prefix='.tmp-', dir=versions_dir)
+    try:
+        np.save(os.path.join(tmp_path, 'offsets.npy'), offsets)
+        np.save(os.path.join(tmp_path, 'neighbors.npy'), neighbors)
+        np.save(os.path.join(tmp_path, 'scores.npy'), scores)
+
+        columns_dir = os.path.join(tmp_path, 'columns')
+        os.makedirs(columns_dir)
+        for column in df.columns:
+            _write_column(columns_dir, column, df[column])
+
+        title_index_dir = os.path.join(tmp_path, 'title_index')
+        os.makedirs(title_index_dir)
+        for name, array in title_index.arrays().items():
+            np.save(os.path.join(title_index_dir, f'{name}.npy'), array)
+
+        features_shape = postings_shape = None
+        if features is not None:
+            features_shape = _write_features(tmp_path, features)
+            postings_shape = _write_features(tmp_path, sparse.csr_matrix(features).T, name='postings')
+        if vectorizer is not None:
+            # stop_words_ only lists pruned terms and can dwarf the vocabulary
+            vectorizer.stop_words_ = None
+            with open(os.path.join(tmp_path, 'vectorizer.pkl'), 'wb') as f:
+                pickle.dump(vectorizer, f, protocol=pickle.HIGHEST_PROTOCOL)
+        field_features_shape = None
+        if field_features is not None:
+            field_features_shape = _write_features(tmp_path, field_features, name='fields')
+        if field_vectorizers is not None:
+            for field_vectorizer in field_vectorizers.values():
+                if field_vectorizer is not None:
+                    field_vectorizer.stop_words_ = None
+            with open(os.path.join(tmp_path, 'field_vectorizers.pkl'), 'wb') as f:
+                pickle.dump(field_vectorizers, f, protocol=pickle.HIGHEST_PROTOCOL)
+        if row_keys is not None:
+            np.save(os.path.join(tmp_path, 'row_keys.npy'), np.asarray(row_keys, dtype=np.uint64))
+        if content_hashes is not None:
+            np.save(os.path.join(tmp_path, 'content_hashes.npy'), np.asarray(content_hashes, dtype=np.uint64))
+        if embeddings is not None:
+            np.save(os.path.join(tmp_path, 'embeddings.npy'), np.ascontiguousarray(embeddings))
+        if embedding_scales is not None:
+            np.save(os.path.join(tmp_path, 'embedding_scales.npy'), np.asarray(embedding_scales, dtype=np.float32))
+
+        manifest = {
+            'format': FORMAT_NAME,
+            'format_version': FORMAT_VERSION,
+            'artifact_version': digest.hexdigest()[:16],
+            'created': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+            'n_movies': len(df),
+            'n_neighbors': int(len(neighbors)),
+            'score_dtype': str(scores.dtype),
+            'columns': list(df.columns),
+            'features_shape': features_shape,
+            'postings_shape': postings_shape,
+            'embedding_shape': list(embeddings.shape) if embeddings is not None else None,
+            'embedding_dtype': str(embeddings.dtype) if embeddings is not None else None,
+            'field_features_shape': field_features_shape,
+            'field_slices': field_slices if field_features is not None else None,
+            'build': build_info or {},
+        }
+        with open(os.path.join(tmp_path, MANIFEST_FILE), 'w') as f:
+            json.dump(manifest, f, indent=2)
+
+        # mkdtemp creates the directory 0700, give it the permissions of a plain mkdir
+        umask = os.umask(0)
+        os.umask(umask)
+        os.chmod(tmp_path, 0o755 & ~umask)
+
+        # The temp suffix tells rebuilds of the same data apart
+        suffix = os.path.basename(tmp_path)[len('.tmp'):]
+        version_path = os.path.join(versions_dir, manifest['artifact_version'] + suffix)
+        os.rename(tmp_path, version_path)
+    except BaseException:
+        shutil.rmtree(tmp_path, ignore_errors=True)
+        raise
+
+    previous_path = os.path.realpath(path) if os.path.islink(path) else None
+    if os.path.isdir(path) and not os.path.islink(path):
+        # A directory written before versioning can't be swapped atomically,
+        # it is moved among the versions first and the path is briefly missing
+        previous_path = os.path.join(versions_dir, 'unversioned' + suffix)
+        os.rename(path, previous_path)
+    # Readers see either the old or the new version, never a missing path
+    link_path = os.path.join(os.path.dirname(path), f'.{os.path.basename(path)}.link{suffix}')
+    os.symlink(os.path.relpath(version_path, os.path.dirname(path)), link_path)
+    os.replace(link_path, path)
+
+    # The previous version stays for workers still opening it; running
+    # workers keep their memory maps of deleted files valid
+    keep = {os.path.basename(version_path), os.path.basename(previous_path or '')}
+    for entry in os.scandir(versions_dir):
+        if not entry.name.startswith('.') and entry.name not in keep:
+            shutil.rmtree(entry.path, ignore_errors=True)
+    return manifest
+
+
+def _versions_dir(path):
+    """Directory next to the artifact path holding its versions."""
+    return os.path.join(os.path.dirname(path), f'.{os.path.basename(path)}.versions')
+
+
+def load_artifact(path, lazy_columns=False):
+    """
+    Open an artifact directory. Returns the same keys as the legacy pickle
+    ('df', 'similarity', 'title_index') plus 'features', 'term_index',
+    'vectorizer', 'row_keys', 'content_hashes', 'embeddings',
+    'embedding_scales', 'field_features', 'field_slices' and
+    'field_vectorizers' (None when not stored, and 'title_index' is None
+    for artifacts older than format version 3) and the 'manifest'. With
+    lazy_columns, 'df' is None and 'columns' maps column names to numeric
+    arrays, StringColumns and CategoricalColumns instead.
+    """
+    # Resolve the version once, so a swap while loading can't mix two
+    path = os.path.realpath(path)
+    manifest = read_manifest(path)
+
+    if manifest.get('format') != FORMAT_NAME or manifest.get('format_version', 0) > FORMAT_VERSION:
+        raise ValueError(
+            f"Unsupported artifact at {path}: format {manifest.get('format')!r} "
+            f"version {manifest.get('format_version')!r}"
+        )
+
+    similarity = NeighborTable(
+        np.load(os.path.join(path, 'offsets.npy'), mmap_mode='r'),
+        np.load(os.path.join(path, 'neighbors.npy'), mmap_mode='r'),
+        np.load(os.path.join(path, 'scores.npy'), mmap_mode='r'),
+    )
+
+    columns_dir = os.path.join(path, 'columns')
+    columns = {column: _read_column(columns_dir, column, lazy_columns) for column in manifest['columns']}
+    df = None if lazy_columns else pd.DataFrame(columns)
+
+    # Older artifacts pickled an index of another layout, the caller
+    # rebuilds it from the columns
+    title_index = None
+    title_index_dir = os.path.join(path, 'title_index')
+    if os.path.isdir(title_index_dir):
+        from .title_index import TitleIndex
+        title_index = TitleIndex.from_arrays({
+            name: np.asarray(np.load(os.path.join(title_index_dir, f'{name}.npy'), mmap_mode='r'))
+            for name in TitleIndex.ARRAYS
+        })
+
+    features = None
+    if manifest.get('features_shape'):
+        features = _read_features(path, manifest['features_shape'])
+    term_index = None
+    if manifest.get('postings_shape'):
+        term_index = TermIndex(_read_features(path, manifest['postings_shape'], name='postings'))
+
+    vectorizer = None
+    vectorizer_path = os.path.join(path, 'vectorizer.pkl')
+    if os.path.exists(vectorizer_path):
+        with open(vectorizer_path, 'rb') as f:
+            vectorizer = pickle.load(f)
+
+    field_features = field_vectorizers = None
+    if manifest.get('field_features_shape'):
+        field_features = _read_features(path, manifest['field_features_shape'], name='fields')
+    field_vectorizers_path = os.path.join(path, 'field_vectorizers.pkl')
+    if os.path.exists(field_vectorizers_path):
+        with open(field_vectorizers_path, 'rb') as f:
+            field_vectorizers = pickle.load(f)
+
+    row_arrays = {}
+    for name in ('row_keys', 'content_hashes', 'embeddings', 'embedding_scales'):
+        array_path = os.path.join(path, f'{name}.npy')
+        row_arrays[name] = np.load(array_path, mmap_mode='r') if os.path.exists(array_path) else None
+
+    return {
+        'df': df,
+        'columns': columns if lazy_columns else None,
+        'similarity': similarity,
+        'title_index': title_index,
+        'features': features,
+        'term_index': term_index,
+        'vectorizer': vectorizer,
+        'row_keys': row_arrays['row_keys'],
+        'content_hashes': row_arrays['content_hashes'],
+        'embeddings': row_arrays['embeddings'],
+        'embedding_scales': row_arrays['embedding_scales'],
+        'field_features': field_features,
+        'field_slices': manifest.get('field_slices') if field_features is not None else None,
+        'field_vectorizers': field_vectorizers,
+        'manifest': manifest,
+    }
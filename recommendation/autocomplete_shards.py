@@ -0,0 +1,88 @@
+"""
+Static autocomplete index, built by collectstatic and served by whitenoise
+as precompressed files so typing in the search box does not hit Django.
+
+    autocomplete/index.json                  artifact version, result limit,
+                                             list of shard keys
+    autocomplete/<version>/<key>.json        movies whose title contains the key
+
+Autocomplete matches titles containing the query, so a shard holds every
+movie whose lowercased title contains its key: the first two characters
+of a query select the shard, and the client filters it. Shards over
+MAX_SHARD_ROWS are split by three-character keys instead, and keys whose
+shard is still too large are left out, sending those queries to the
+server. Keys are the hex encoded UTF-8 of the characters, safe in file
+names and URLs.
+
+Each shard lists [title, year, release_date, poster_path, index] rows in
+catalog order, the same order /autocomplete/ returns.
+"""
+
+import json
+import os
+import shutil
+from collections import defaultdict
+
+# Larger shards are split into three-character shards
+MAX_SHARD_ROWS = 5000
+# Same as the limit of the autocomplete view
+RESULT_LIMIT = 50
+INDEX_FILE = 'index.json'
+
+
+def shard_key(text):
+    """File name key of a two or three character query start."""
+    return text.encode('utf-8').hex()
+
+
+def _grams(title, size):
+    return {title[i:i + size] for i in range(len(title) - size + 1)}
+
+
+def build_shards(columns, version, output_dir, max_shard_rows=MAX_SHARD_ROWS):
+    """
+    Write the shards of a catalog into output_dir, replacing previous ones.
+    `columns` maps column names to sequences (title, year, formatted_date,
+    poster_path). Returns {'shards': count, 'rows': total rows written}.
+    """
+    titles = [str(title).lower() for title in columns['title']]
+    rows = [
+        [title, year, release_date, poster_path, index]
+        for index, (title, year, release_date, poster_path) in enumerate(zip(
+            columns['title'], columns['year'], columns['formatted_date'], columns['poster_path'],
+        ))
+    ]
+
+    bigrams = defaultdict(list)
+    for index, title in enumerate(titles):
+        for gram in _grams(title, 2):
+            bigrams[gram].append(index)
+
+    shards = {}
+    for bigram, indices in bigrams.items():
+        if len(indices) <= max_shard_rows:
+            shards[bigram] = indices
+            continue
+        trigrams = defaultdict(list)
+        for index in indices:
+            for gram in _grams(titles[index], 3):
+                if gram.startswith(bigram):
+                    trigrams[gram].append(index)
+        shards.update((gram, members) for gram, members in trigrams.items() if len(members) <= max_shard_rows)
+
+    # A directory per artifact version, so cached shards never go stale
+    if os.path.exists(output_dir):
+        shutil.rmtree(output_dir)
+    version_dir = os.path.join(output_dir, version)
+    os.makedirs(version_dir)
+
+    total = 0
+    for gram, indices in shards.items():
+        with open(os.path.join(version_dir, f'{shard_key(gram)}.json'), 'w', encoding='utf-8') as f:
+            json.dump([rows[index] for index in indices], f, ensure_ascii=False, separators=(',', ':'))
+        total += len(indices)
+
+    index = {'version': version, 'limit': RESULT_LIMIT, 'shards': sorted(shard_key(gram) for gram in shards)}
+    with open(os.path.join(output_dir, INDEX_FILE), 'w', encoding='utf-8') as f:
+        json.dump(index, f, separators=(',', ':'))
+    return {'shards': len(shards), 'rows': total}
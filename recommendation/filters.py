@@ -0,0 +1,127 @@
+from collections import OrderedDict
+import math
+import re
+import threading
+
+import numpy as np
+import pandas as pd
+
+from .artifact import CategoricalColumn
+
+# TMDB genre names, one bit each in the per-movie genre bitmap
+GENRES = [
+    'Action', 'Adventure', 'Animation', 'Comedy', 'Crime', 'Documentary', 'Drama', 'Family', 'Fantasy',
+    'History', 'Horror', 'Music', 'Mystery', 'Romance', 'Science Fiction', 'TV Movie', 'Thriller', 'War',
+    'Western',
+]
+
+FILTER_NAMES = ('language', 'genres', 'year_min', 'year_max', 'min_rating')
+
+
+def _factorize(column):
+    """(codes, distinct values) of a text column, reusing the codes of a CategoricalColumn."""
+    if isinstance(column, CategoricalColumn):
+        return np.asarray(column.codes), pd.Index(column.categories)
+    return pd.factorize(pd.Series(list(column), dtype=object).fillna(''))
+
+
+class CatalogFilters:
+    """
+    Precomputed per-column arrays for filtering recommendations: language
+    codes, a genre bitmap, release years and ratings. Masks are cached per
+    filter combination, so repeated filters cost a dictionary lookup.
+    """
+
+    MAX_CACHED_MASKS = 32
+
+    def __init__(self, columns):
+        # Each filter array is computed once per distinct value and spread
+        # to the rows through the codes
+        codes, languages = _factorize(columns['original_language'])
+        self.language_codes = {language: code for code, language in enumerate(languages)}
+        self.languages = codes.astype(np.int16)
+
+        codes, genres = _factorize(columns['genres'])
+        genres = pd.Series(genres, dtype=object).astype(str)
+        self.genre_bits = {genre.lower(): 1 << bit for bit, genre in enumerate(GENRES)}
+        genre_masks = np.zeros(len(genres), dtype=np.uint32)
+        for genre in GENRES:
+            has_genre = genres.str.contains(rf'\b{re.escape(genre)}\b', case=False, regex=True).to_numpy()
+            genre_masks[has_genre] |= np.uint32(self.genre_bits[genre.lower()])
+        self.genres = genre_masks[codes]
+
+        # 0 means unknown release year
+        codes, years = _factorize(columns['year'])
+        self.years = pd.to_numeric(pd.Series(years, dtype=object), errors='coerce').fillna(0).to_numpy(np.int16)[codes]
+        self.ratings = np.asarray(columns['rating'], dtype=np.float64)
+
+        self._masks = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def normalize(filters):
+        """
+        Canonical form of a filters dict: validated values, unset filters
+        dropped. Raises ValueError for malformed values.
+        """
+        normalized = {}
+        for name in FILTER_NAMES:
+            value = (filters or {}).get(name)
+            if value in (None, '', []):
+                continue
+            if name == 'language':
+                normalized[name] = str(value).strip().lower()
+            elif name == 'genres':
+                values = value if isinstance(value, (list, tuple)) else str(value).split(',')
+                normalized[name] = tuple(sorted({str(genre).strip().lower() for genre in values if str(genre).strip()}))
+            elif name in ('year_min', 'year_max'):
+                normalized[name] = int(value)
+            else:
+                normalized[name] = float(value)
+                # nan would match nothing and inf everything or nothing
+                if not math.isfinite(normalized[name]):
+                    raise ValueError(f"{name} must be a finite number")
+        return normalized
+
+    def _build_mask(self, filters):
+        mask = np.ones(len(self.years), dtype=bool)
+        if 'language' in filters:
+            code = self.language_codes.get(filters['language'])
+            if code is None:
+                return np.zeros(len(self.years), dtype=bool)
+            mask &= self.languages == code
+        if 'genres' in filters:
+            bits = 0
+            for genre in filters['genres']:
+                if genre not in self.genre_bits:
+                    return np.zeros(len(self.years), dtype=bool)
+                bits |= self.genre_bits[genre]
+            # Movies must have every requested genre
+            mask &= (self.genres & np.uint32(bits)) == bits
+        if 'year_min' in filters:
+            mask &= self.years >= filters['year_min']
+        if 'year_max' in filters:
+            mask &= (self.years <= filters['year_max']) & (self.years > 0)
+        if 'min_rating' in filters:
+            mask &= self.ratings >= filters['min_rating']
+        return mask
+
+    def mask(self, filters):
+        """Boolean mask of the movies passing the filters, None when no filter is set."""
+        filters = self.normalize(filters)
+        if not filters:
+            return None
+
+        key = tuple(sorted(filters.items()))
+        with self._lock:
+            mask = self._masks.get(key)
+            if mask is not None:
+                self._masks.move_to_end(key)
+                return mask
+
+        mask = self._build_mask(filters)
+        with self._lock:
+            self._masks[key] = mask
+            if len(self._masks) > self.MAX_CACHED_MASKS:
+                self._masks.popitem(last=False)
+        return mask
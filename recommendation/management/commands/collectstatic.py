@@ -0,0 +1,55 @@
+import os
+
+from django.conf import settings
+from django.contrib.staticfiles.management.commands.collectstatic import Command as CollectStaticCommand
+
+from ...artifact import artifact_exists, load_artifact
+from ...autocomplete_shards import build_shards
+from ...preprocess_data import ARTIFACT_PATH
+
+# Autocomplete shards are written under the static build directory, so
+# collectstatic picks them up and whitenoise compresses them
+SHARDS_SUBDIR = os.path.join('recommendation', 'autocomplete')
+
+# Build outputs living next to the static files that must not be published
+BUILD_DATA_PATTERNS = ['preprocessed', '.preprocessed.*', 'pipeline.json', '*.tmp']
+
+
+class Command(CollectStaticCommand):
+    help = "Build the static autocomplete shards, then collect static files."
+
+    def add_arguments(self, parser):
+        super().add_arguments(parser)
+        parser.add_argument(
+            '--skip-autocomplete', action='store_true',
+            help="Do not rebuild the static autocomplete shards.",
+        )
+
+    def set_options(self, **options):
+        options['ignore_patterns'] = list(options.get('ignore_patterns') or []) + BUILD_DATA_PATTERNS
+        super().set_options(**options)
+
+    def handle(self, **options):
+        if not options['skip_autocomplete']:
+            self.build_autocomplete()
+        return super().handle(**options)
+
+    def build_autocomplete(self):
+        if not artifact_exists(ARTIFACT_PATH):
+            self.stderr.write(
+                f"No artifact at {ARTIFACT_PATH}, skipping the static autocomplete shards. "
+                "Run the build pipeline before collectstatic to include them."
+            )
+            return
+        artifact = load_artifact(ARTIFACT_PATH, lazy_columns=True)
+        columns = artifact['columns']
+        if 'formatted_date' not in columns:
+            self.stderr.write("The artifact predates the display columns, skipping the static autocomplete shards.")
+            return
+        shards_dir = os.path.join(settings.RECOMMENDATION_STATIC_BUILD_DIR, SHARDS_SUBDIR)
+        stats = build_shards(
+            {column: columns[column].tolist() for column in ('title', 'year', 'formatted_date', 'poster_path')},
+            artifact['manifest']['artifact_version'],
+            shards_dir,
+        )
+        self.stdout.write(f"Built {stats['shards']} autocomplete shards with {stats['rows']} rows in {shards_dir}")
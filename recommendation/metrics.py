@@ -0,0 +1,182 @@
+"""
+Hot path instrumentation: stage timers, latency histograms and counters,
+reported per request in a Server-Timing header and for all requests in
+Prometheus text format at /metrics.
+
+Disabled by default (see RECOMMENDATION_METRICS). While disabled, stage()
+returns a shared no-op context manager and increment() returns at once,
+so instrumented code costs a function call and a flag check.
+
+Metrics live in process memory: with several gunicorn workers each one
+reports its own requests.
+"""
+
+from bisect import bisect_left
+from contextvars import ContextVar
+import threading
+import time
+
+# Upper bounds in seconds of the latency histogram buckets
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+
+# name: (type, help, label names)
+METRICS = {
+    'recommendation_request_seconds': ('histogram', "Request latency by view", ('view',)),
+    'recommendation_stage_seconds': ('histogram', "Time spent in each hot path stage", ('stage',)),
+    'recommendation_fuzzy_fallbacks_total': (
+        'counter', "Lookups that fell back to fuzzy title matching", ('path',)
+    ),
+}
+
+_enabled = False
+_lock = threading.Lock()
+_histograms = {}
+_counters = {}
+# (stage, seconds) pairs of the current request, None outside instrumented requests
+_request_stages = ContextVar('recommendation_request_stages', default=None)
+
+
+class Histogram:
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+
+class _Stage:
+    __slots__ = ('name', 'start')
+
+    def __init__(self, name):
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        record_stage(self.name, time.perf_counter() - self.start)
+        return False
+
+
+class _NullStage:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+
+_NULL_STAGE = _NullStage()
+
+
+def configure(enabled):
+    global _enabled
+    _enabled = bool(enabled)
+
+
+def is_enabled():
+    return _enabled
+
+
+def reset():
+    """Drop every recorded value."""
+    with _lock:
+        _histograms.clear()
+        _counters.clear()
+
+
+def observe(name, labels, seconds):
+    """Add a value to the histogram `name` for the given label values."""
+    key = (name, tuple(labels))
+    with _lock:
+        histogram = _histograms.get(key)
+        if histogram is None:
+            histogram = _histograms[key] = Histogram()
+        histogram.observe(seconds)
+
+
+def increment(name, labels, value=1):
+    if not _enabled:
+        return
+    key = (name, tuple(labels))
+    with _lock:
+        _counters[key] = _counters.get(key, 0) + value
+
+
+def record_stage(name, seconds):
+    observe('recommendation_stage_seconds', (name,), seconds)
+    stages = _request_stages.get()
+    if stages is not None:
+        stages.append((name, seconds))
+
+
+def stage(name):
+    """Context manager timing a hot path stage, a no-op while disabled."""
+    return _Stage(name) if _enabled else _NULL_STAGE
+
+
+def start_request():
+    """Collect the stages of the current request; returns the list they go to."""
+    stages = []
+    _request_stages.set(stages)
+    return stages
+
+
+def server_timing(stages, total_seconds):
+    """Server-Timing header value, stages summed by name, durations in milliseconds."""
+    durations = {}
+    for name, seconds in stages:
+        durations[name] = durations.get(name, 0.0) + seconds
+    durations['total'] = total_seconds
+    return ', '.join(f'{name};dur={seconds * 1000:.3f}' for name, seconds in durations.items())
+
+
+def _format_labels(names, values, extra=()):
+    pairs = list(zip(names, values)) + list(extra)
+    if not pairs:
+        return ''
+    escaped = (str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for _, value in pairs)
+    return '{' + ','.join(f'{name}="{value}"' for (name, _), value in zip(pairs, escaped)) + '}'
+
+
+def render(gauges=()):
+    """
+    All metrics in Prometheus text format. `gauges` adds values read at
+    scrape time, as (name, type, help, label names, [(label values, value)]).
+    """
+    with _lock:
+        histograms = {key: (list(h.counts), h.sum, h.count, h.buckets) for key, h in _histograms.items()}
+        counters = dict(_counters)
+
+    lines = []
+    for name, (metric_type, help_text, label_names) in METRICS.items():
+        lines.append(f'# HELP {name} {help_text}')
+        lines.append(f'# TYPE {name} {metric_type}')
+        if metric_type == 'histogram':
+            for (metric, labels), (counts, total, count, buckets) in sorted(histograms.items()):
+                if metric != name:
+                    continue
+                cumulative = 0
+                for bound, bucket_count in zip(buckets + (float('inf'),), counts):
+                    cumulative += bucket_count
+                    le = '+Inf' if bound == float('inf') else repr(bound)
+                    lines.append(f'{name}_bucket{_format_labels(label_names, labels, [("le", le)])} {cumulative}')
+                lines.append(f'{name}_sum{_format_labels(label_names, labels)} {total}')
+                lines.append(f'{name}_count{_format_labels(label_names, labels)} {count}')
+        else:
+            for (metric, labels), value in sorted(counters.items()):
+                if metric == name:
+                    lines.append(f'{name}{_format_labels(label_names, labels)} {value}')
+
+    for name, metric_type, help_text, label_names, samples in gauges:
+        lines.append(f'# HELP {name} {help_text}')
+        lines.append(f'# TYPE {name} {metric_type}')
+        for labels, value in samples:
+            lines.append(f'{name}{_format_labels(label_names, labels)} {value}')
+    return '\n'.join(lines) + '\n'
@@ -0,0 +1,49 @@
+import time
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+
+from . import metrics
+
+
+class ServerTimingMiddleware:
+    """
+    Time every request, report its hot path stages in a Server-Timing
+    header and add it to the request latency histogram. Only installed
+    when RECOMMENDATION_METRICS is on. Supports both sync and async
+    requests, so async views stay on the event loop under ASGI.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self._acall(request)
+        if not metrics.is_enabled():
+            return self.get_response(request)
+
+        stages = metrics.start_request()
+        start = time.perf_counter()
+        response = self.get_response(request)
+        return self._finish(request, response, stages, time.perf_counter() - start)
+
+    async def _acall(self, request):
+        if not metrics.is_enabled():
+            return await self.get_response(request)
+
+        stages = metrics.start_request()
+        start = time.perf_counter()
+        response = await self.get_response(request)
+        return self._finish(request, response, stages, time.perf_counter() - start)
+
+    def _finish(self, request, response, stages, total):
+        match = getattr(request, 'resolver_match', None)
+        view = match.url_name if match is not None and match.url_name else 'other'
+        metrics.observe('recommendation_request_seconds', (view,), total)
+        response['Server-Timing'] = metrics.server_timing(stages, total)
+        return response
@@ -0,0 +1,60 @@
+"""
+Bounded worker pool for the async views. Title matching and formatting
+are CPU bound, so the async views run them here instead of on the event
+loop, and each call gets a deadline.
+
+Offloaded functions take a `cancel` threading.Event and call
+check_cancelled(cancel) in their loops: it is set when the deadline
+passes or when the awaiting request is cancelled (Django 5.0+ cancels
+async views whose client disconnected), so abandoned autocomplete
+queries stop instead of holding a worker.
+"""
+
+import asyncio
+import contextvars
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+class Cancelled(Exception):
+    """Raised inside offloaded work whose request timed out or went away."""
+
+
+def check_cancelled(cancel):
+    if cancel is not None and cancel.is_set():
+        raise Cancelled()
+
+
+def get_pool():
+    """The shared pool, RECOMMENDATION_ASYNC_WORKERS threads (0 for one per CPU)."""
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                from django.conf import settings
+                workers = getattr(settings, 'RECOMMENDATION_ASYNC_WORKERS', 0) or os.cpu_count() or 1
+                _pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='recommendation-async')
+    return _pool
+
+
+async def run(func, *args, timeout=None):
+    """
+    Await func(*args, cancel=event) on the pool. Raises asyncio.TimeoutError
+    after `timeout` seconds; on timeout or cancellation the event is set so
+    the work stops at its next check, and calls still queued never start.
+    """
+    cancel = threading.Event()
+    loop = asyncio.get_running_loop()
+    # Keep the request context, e.g. the Server-Timing stages of metrics
+    context = contextvars.copy_context()
+    future = loop.run_in_executor(get_pool(), partial(context.run, func, *args, cancel=cancel))
+    try:
+        return await asyncio.wait_for(future, timeout)
+    except BaseException:
+        cancel.set()
+        raise
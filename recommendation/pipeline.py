@@ -0,0 +1,199 @@
+"""
+Build pipeline for the recommendation data: process_movies turns the raw
+TMDB dump into final_movies.csv, then preprocess_data turns that into the
+similarity artifact.
+
+Each stage is keyed by a hash of its input files, its parameters and the
+source of the modules it runs. The keys are recorded in a manifest next to
+the outputs, and a stage whose key is unchanged and whose outputs are still
+the ones it wrote is skipped. Deploys that do not touch the data skip the
+build entirely.
+
+    python recommendation/pipeline.py [--raw TMDB_all_movies.csv] [--force] [preprocess_data options]
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import sys
+import time
+from datetime import datetime, timezone
+
+if __package__:
+    from . import ann, artifact, preprocess_data, process_movies, title_index
+else:
+    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    from recommendation import ann, artifact, preprocess_data, process_movies, title_index
+
+# Bump to invalidate every recorded stage key
+PIPELINE_VERSION = 1
+MANIFEST_PATH = 'recommendation/static/recommendation/pipeline.json'
+RAW_PATH = 'TMDB_all_movies.csv'
+
+# Modules whose source is part of each stage's key
+PROCESS_MODULES = (process_movies,)
+PREPROCESS_MODULES = (preprocess_data, ann, artifact, title_index)
+
+
+def file_digest(path, known=None):
+    """
+    Size, mtime and sha256 of a file. The sha256 of `known`, a previous
+    digest of the same path, is reused when size and mtime still match.
+    """
+    stat = os.stat(path)
+    signature = {'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns}
+    if known and all(known.get(name) == value for name, value in signature.items()):
+        return dict(known)
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            digest.update(block)
+    return dict(signature, sha256=digest.hexdigest())
+
+
+def source_digest(modules):
+    digest = hashlib.sha256()
+    for module in modules:
+        with open(module.__file__, 'rb') as f:
+            digest.update(f.read())
+    return digest.hexdigest()
+
+
+def stage_key(inputs, params, modules):
+    """Cache key of a stage: hash of its input contents, parameters and code."""
+    payload = {
+        'pipeline_version': PIPELINE_VERSION,
+        'inputs': {name: digest['sha256'] for name, digest in inputs.items()},
+        'params': params,
+        'code': source_digest(modules),
+    }
+    return hashlib.sha256(json.dumps(payload, sort_keys=True).encode('utf-8')).hexdigest()[:16]
+
+
+def process_params():
+    """The process_movies settings that shape final_movies.csv."""
+    return {
+        'indian_languages': process_movies.INDIAN_LANGUAGES,
+        'hollywood_language': process_movies.HOLLYWOOD_LANGUAGE,
+        'min_popularity_indian': process_movies.MIN_POPULARITY_INDIAN,
+        'min_popularity_hollywood': process_movies.MIN_POPULARITY_HOLLYWOOD,
+        'min_popularity_other': process_movies.MIN_POPULARITY_OTHER,
+        'min_runtime': process_movies.MIN_RUNTIME,
+        'columns': process_movies.COLUMNS_TO_KEEP,
+    }
+
+
+def load_manifest(path=MANIFEST_PATH):
+    if not os.path.exists(path):
+        return {'pipeline_version': PIPELINE_VERSION, 'stages': {}}
+    with open(path) as f:
+        return json.load(f)
+
+
+def save_manifest(manifest, path=MANIFEST_PATH):
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'w') as f:
+        json.dump(manifest, f, indent=2)
+    os.replace(tmp_path, path)
+
+
+def _record(manifest, stage, key, inputs, params, outputs, started):
+    manifest['stages'][stage] = {
+        'key': key,
+        'inputs': inputs,
+        'params': params,
+        'outputs': outputs,
+        'completed': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+        'seconds': round(time.perf_counter() - started, 2),
+    }
+    save_manifest(manifest)
+
+
+def _artifact_output(path):
+    return {path: {'artifact_version': artifact.read_manifest(path)['artifact_version']}}
+
+
+def run_pipeline(raw_path=RAW_PATH, force=False, chunksize=process_movies.DEFAULT_CHUNKSIZE, **preprocess_options):
+    """
+    Run the stages whose key or outputs changed, skip the others. The raw
+    dump is optional: without it, an existing final_movies.csv is used as is.
+    preprocess_options are passed to preprocess_data. Returns the names of
+    the stages that ran.
+    """
+    csv_path = preprocess_options.pop('csv_path', preprocess_data.CSV_PATH)
+    artifact_path = preprocess_options.pop('artifact_path', preprocess_data.ARTIFACT_PATH)
+    manifest = load_manifest()
+    stages = manifest['stages']
+    ran = []
+
+    # Stage 1: raw TMDB dump -> final_movies.csv
+    if os.path.exists(raw_path):
+        previous = stages.get('process', {})
+        inputs = {raw_path: file_digest(raw_path, previous.get('inputs', {}).get(raw_path))}
+        params = process_params()
+        key = stage_key(inputs, params, PROCESS_MODULES)
+        recorded = previous.get('outputs', {}).get(csv_path)
+        up_to_date = (
+            not force and previous.get('key') == key and os.path.exists(csv_path)
+            and file_digest(csv_path, recorded)['sha256'] == (recorded or {}).get('sha256')
+        )
+        if up_to_date:
+            print(f"[process] Up to date (key {key}), skipping")
+        else:
+            print(f"[process] Running (key {key})...")
+            started = time.perf_counter()
+            if not process_movies.process_movies(raw_path, csv_path, streaming=True, chunksize=chunksize):
+                raise RuntimeError(f"Processing {raw_path} failed")
+            _record(manifest, 'process', key, inputs, params, {csv_path: file_digest(csv_path)}, started)
+            ran.append('process')
+    else:
+        print(f"[process] {raw_path} not found, using {csv_path} as is")
+
+    # Stage 2: final_movies.csv -> similarity artifact
+    previous = stages.get('preprocess', {})
+    known = previous.get('inputs', {}).get(csv_path) or stages.get('process', {}).get('outputs', {}).get(csv_path)
+    inputs = {csv_path: file_digest(csv_path, known)}
+    params = preprocess_data.output_params(preprocess_options)
+    key = stage_key(inputs, params, PREPROCESS_MODULES)
+    recorded = previous.get('outputs', {}).get(artifact_path)
+    up_to_date = (
+        not force and previous.get('key') == key and artifact.artifact_exists(artifact_path)
+        and _artifact_output(artifact_path)[artifact_path] == recorded
+    )
+    if up_to_date:
+        print(f"[preprocess] Up to date (key {key}), skipping")
+    else:
+        print(f"[preprocess] Running (key {key})...")
+        started = time.perf_counter()
+        preprocess_data.preprocess_data(csv_path=csv_path, artifact_path=artifact_path, **preprocess_options)
+        _record(manifest, 'preprocess', key, inputs, params, _artifact_output(artifact_path), started)
+        ran.append('preprocess')
+    return ran
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Build the recommendation data, skipping stages whose inputs did not change",
+        parents=[preprocess_data.build_parser(add_help=False)],
+    )
+    parser.add_argument('--raw', default=RAW_PATH, help="raw TMDB dump, used when present")
+    parser.add_argument('--chunksize', type=int, default=process_movies.DEFAULT_CHUNKSIZE,
+                        help="rows per chunk when processing the raw dump")
+    parser.add_argument('--force', action='store_true', help="rerun every stage")
+    return parser.parse_args(argv)
+
+
+if __name__ == '__main__':
+    args = parse_args()
+    started = time.perf_counter()
+    try:
+        ran = run_pipeline(
+            raw_path=args.raw, force=args.force, chunksize=args.chunksize,
+            **preprocess_data.preprocess_options(args),
+        )
+    except Exception as e:
+        print(f"Error during the build pipeline: {e}")
+        exit(1)
+    print(f"✓ Pipeline complete in {time.perf_counter() - started:.1f}s, ran: {', '.join(ran) or 'nothing'}")
@@ -1,15 +1,402 @@
+import argparse
 import pandas as pd
-import pickle
 import os
+import sys
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
 import numpy as np
+from scipy import sparse
 from sklearn.feature_extraction.text import TfidfVectorizer
-from sklearn.metrics.pairwise import cosine_similarity
 
-def preprocess_data():
-    """Generate preprocessed similarity data from CSV file."""
-    
-    csv_path = 'recommendation/static/recommendation/final_movies.csv'
-    pkl_path = 'recommendation/static/recommendation/preprocessed_data.pkl'
+if __package__:
+    from .ann import ann_top_k, embed, recall_at_k
+    from .artifact import artifact_exists, load_artifact, save_artifact
+    from .title_index import TitleIndex
+else:
+    # Running as a script: import through the package so pickled classes
+    # resolve to recommendation.* when the web app loads them
+    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    from recommendation.ann import ann_top_k, embed, recall_at_k
+    from recommendation.artifact import artifact_exists, load_artifact, save_artifact
+    from recommendation.title_index import TitleIndex
+
+# Columns kept in the artifact, raw fields followed by ready-to-serve display fields
+ARTIFACT_COLUMNS = [
+    'title', 'release_date', 'original_language', 'overview', 'genres', 'cast', 'director', 'imdb_rating', 'poster_path',
+    'year', 'formatted_date', 'rating', 'full_title',
+]
+
+CSV_PATH = 'recommendation/static/recommendation/final_movies.csv'
+ARTIFACT_PATH = 'recommendation/static/recommendation/preprocessed'
+
+# TfidfVectorizer settings, limited to reduce memory
+VECTORIZER_PARAMS = {'min_df': 2, 'max_df': 0.8}
+
+# Fields of the similarity text (see combined_features), also vectorized
+# one by one so the request path can weigh them (see field_features)
+FEATURE_FIELDS = ('genres', 'overview', 'original_language', 'cast', 'director')
+
+# Incremental updates rebuild from scratch once this share of the catalog
+# changed since the last full build...
+MAX_INCREMENTAL_FRACTION = 0.2
+# ...or when changed movies have this many more out-of-vocabulary tokens
+# than the catalog had at the last full build
+MAX_VOCABULARY_DRIFT = 0.1
+# Movies sampled to measure the out-of-vocabulary rate of a full build
+OOV_SAMPLE_SIZE = 2000
+
+# Dense TruncatedSVD embeddings stored next to the TF-IDF matrix, 0 to skip them
+EMBEDDING_DIM = 128
+EMBEDDING_DTYPES = ('int8', 'float16')
+
+# Similarity batches per worker at least, so no worker sits idle on small builds
+MIN_BATCHES_PER_WORKER = 4
+
+def _release_year(release_date):
+    """Year part of a yyyy-mm-dd release date, '' when unknown."""
+    return release_date.split('-')[0] if release_date and '-' in str(release_date) else ''
+
+def _format_date(release_date):
+    """Format a yyyy-mm-dd release date as dd-mm-yyyy."""
+    if release_date and '-' in str(release_date):
+        parts = str(release_date).split('-')
+        if len(parts) == 3:
+            return f"{parts[2]}-{parts[1]}-{parts[0]}"
+    return release_date
+
+def _parse_rating(imdb_rating):
+    """Convert imdb_rating to float, 0.0 when empty or invalid."""
+    try:
+        return round(float(imdb_rating), 2) if imdb_rating else 0.0
+    except (ValueError, TypeError):
+        return 0.0
+
+def add_display_columns(df):
+    """
+    Add the fields served by the request path (year, formatted_date,
+    rating, full_title) so requests never parse or format per row.
+    Expects missing values already filled with ''.
+    """
+    df = df.copy()
+    df['year'] = df['release_date'].map(_release_year)
+    df['formatted_date'] = df['release_date'].map(_format_date)
+    df['rating'] = df['imdb_rating'].map(_parse_rating).astype('float64')
+    df['full_title'] = [f"{title} ({year})" if year else title for title, year in zip(df['title'], df['year'])]
+    return df
+
+def quantize_embeddings(vectors, dtype='int8'):
+    """
+    Compact storage of L2-normalized embedding rows. int8 rows are scaled to
+    use the full [-127, 127] range and come with their float32 scales;
+    float16 rows are stored as is and have no scales.
+    Returns (rows, scales or None).
+    """
+    vectors = np.asarray(vectors, dtype=np.float32)
+    if dtype == 'float16':
+        return vectors.astype(np.float16), None
+    if dtype != 'int8':
+        raise ValueError(f"Unknown embedding dtype {dtype!r}, expected one of {EMBEDDING_DTYPES}")
+    scales = np.maximum(np.abs(vectors).max(axis=1), 1e-12) / 127
+    return np.round(vectors / scales[:, None]).astype(np.int8), scales.astype(np.float32)
+
+def batch_size_for_budget(n_movies, workers, memory_budget_mb, n_rows=None):
+    """
+    Rows per similarity batch so that all workers together stay within the
+    memory budget. Each batch row holds, against every movie, the sparse
+    product (float32 data plus int32 or int64 indices), the dense float32
+    score row, its negated copy for argpartition and the int64
+    argpartition result. With n_rows, batches are also made small enough
+    to give every worker several of them.
+    """
+    bytes_per_row = n_movies * (12 + 4 + 4 + 8)
+    workers = max(1, workers)
+    batch_size = max(1, int(memory_budget_mb * 1024 * 1024 // (bytes_per_row * workers)))
+    if n_rows:
+        batch_size = min(batch_size, -(-n_rows // (workers * MIN_BATCHES_PER_WORKER)))
+    return batch_size
+
+def _top_k_rows(scores, top_k):
+    """Top-k columns of every row of a dense score block, best first, in one 2D pass."""
+    top = np.argpartition(-scores, top_k - 1, axis=1)[:, :top_k]
+    top_scores = np.take_along_axis(scores, top, axis=1)
+    best_first = np.argsort(-top_scores, axis=1, kind='stable')
+    return np.take_along_axis(top, best_first, axis=1), np.take_along_axis(top_scores, best_first, axis=1)
+
+def _save_csr(directory, name, matrix):
+    np.save(os.path.join(directory, f'{name}.data.npy'), matrix.data.astype(np.float32))
+    np.save(os.path.join(directory, f'{name}.indices.npy'), matrix.indices.astype(np.int32))
+    np.save(os.path.join(directory, f'{name}.indptr.npy'), matrix.indptr.astype(np.int64))
+
+def _load_csr(directory, name, shape):
+    return sparse.csr_matrix(
+        tuple(np.load(os.path.join(directory, f'{name}.{part}.npy'), mmap_mode='r') for part in ('data', 'indices', 'indptr')),
+        shape=shape,
+        copy=False,
+    )
+
+# State of a similarity worker process, set up by _init_worker
+_worker = {}
+
+def _init_worker(shared_dir, shape, top_k):
+    """Open the shared feature matrices and output arrays of a build worker."""
+    _worker['rows'] = np.load(os.path.join(shared_dir, 'rows.npy'), mmap_mode='r')
+    _worker['features'] = _load_csr(shared_dir, 'features', shape)
+    _worker['features_t'] = _load_csr(shared_dir, 'features_t', (shape[1], shape[0]))
+    _worker['neighbors'] = np.load(os.path.join(shared_dir, 'neighbors.npy'), mmap_mode='r+')
+    _worker['scores'] = np.load(os.path.join(shared_dir, 'scores.npy'), mmap_mode='r+')
+    _worker['top_k'] = top_k
+
+def _score_batch(bounds):
+    """Score one batch of rows against all movies and store its top-k lists."""
+    start_idx, end_idx = bounds
+    batch_rows = np.asarray(_worker['rows'][start_idx:end_idx])
+    # Rows are L2-normalized, so the dot product is the cosine similarity
+    batch_similarity = (_worker['features'][batch_rows] @ _worker['features_t']).toarray()
+    top_indices, top_scores = _top_k_rows(batch_similarity, _worker['top_k'])
+    _worker['neighbors'][start_idx:end_idx] = top_indices
+    _worker['scores'][start_idx:end_idx] = top_scores
+    return end_idx - start_idx
+
+def exact_top_k(feature_vectors, top_k, workers=1, memory_budget_mb=2048, rows=None):
+    """
+    Exact top-k neighbors of every row, in CSR layout (offsets, neighbors, scores).
+    Similarity is computed in batches of rows against all movies, sized to
+    the memory budget. With several workers, batches are spread over a
+    process pool that shares the feature matrix and the output arrays
+    through memory-mapped files.
+
+    With `rows`, only those rows are scored (still against all movies) and
+    the result has one list per given row, in the same order.
+    """
+    n_movies = feature_vectors.shape[0]
+    rows = np.arange(n_movies, dtype=np.int64) if rows is None else np.asarray(rows, dtype=np.int64)
+    n_rows = len(rows)
+    workers = max(1, workers)
+    batch_size = batch_size_for_budget(n_movies, workers, memory_budget_mb, n_rows)
+    batches = [(start, min(start + batch_size, n_rows)) for start in range(0, n_rows, batch_size)]
+    print(f"  {len(batches)} batches of up to {batch_size} movies on {workers} worker(s)...")
+
+    with tempfile.TemporaryDirectory(prefix='similarity-build-') as shared_dir:
+        features = sparse.csr_matrix(feature_vectors, dtype=np.float32)
+        np.save(os.path.join(shared_dir, 'rows.npy'), rows)
+        _save_csr(shared_dir, 'features', features)
+        _save_csr(shared_dir, 'features_t', features.T.tocsr())
+        np.lib.format.open_memmap(os.path.join(shared_dir, 'neighbors.npy'), mode='w+', dtype=np.int32, shape=(n_rows, top_k))
+        np.lib.format.open_memmap(os.path.join(shared_dir, 'scores.npy'), mode='w+', dtype=np.float32, shape=(n_rows, top_k))
+
+        init_args = (shared_dir, features.shape, top_k)
+        done = 0
+        if workers == 1:
+            _init_worker(*init_args)
+            results = map(_score_batch, batches)
+            pool = None
+        else:
+            pool = ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=init_args)
+            results = pool.map(_score_batch, batches)
+        try:
+            for count in results:
+                done += count
+                print(f"  Processed {done} of {n_rows} movies...")
+        finally:
+            if pool is not None:
+                pool.shutdown()
+            _worker.clear()
+
+        top_neighbors = np.load(os.path.join(shared_dir, 'neighbors.npy'))
+        top_similarity = np.load(os.path.join(shared_dir, 'scores.npy'))
+
+    offsets = np.arange(n_rows + 1, dtype=np.int64) * top_k
+    return offsets, top_neighbors.ravel(), top_similarity.ravel()
+
+def combined_features(df):
+    """Text the similarity is computed from, one string per movie."""
+    return df['genres'] + ' ' + df['overview'] + ' ' + df['original_language'] + ' ' + df['cast'] + ' ' + df['director']
+
+def field_features(df, fields=FEATURE_FIELDS):
+    """
+    One TF-IDF matrix per field, side by side in a single CSR matrix, each
+    field's block L2-normalized on its own so a dot product over a block
+    is that field's cosine similarity.
+
+    Returns (features, slices, vectorizers): slices maps every field to
+    its [start, end) columns. Fields without a term left by the vectorizer
+    settings get no columns and a None vectorizer.
+    """
+    blocks = []
+    slices = {}
+    vectorizers = {}
+    start = 0
+    for field in fields:
+        vectorizer = TfidfVectorizer(**VECTORIZER_PARAMS)
+        try:
+            block = vectorizer.fit_transform(df[field]).astype(np.float32)
+        except ValueError:
+            # Empty vocabulary, e.g. a column that is blank on every row
+            print(f"  No terms kept for the {field} field")
+            vectorizer = None
+            block = sparse.csr_matrix((len(df), 0), dtype=np.float32)
+        blocks.append(block)
+        slices[field] = [start, start + block.shape[1]]
+        vectorizers[field] = vectorizer
+        start += block.shape[1]
+    return sparse.hstack(blocks, format='csr', dtype=np.float32), slices, vectorizers
+
+def row_keys(df):
+    """Stable identity of every row: title plus release date, numbered when repeated."""
+    keys = df[['title', 'release_date']].astype(str)
+    keys = keys.assign(occurrence=keys.groupby(['title', 'release_date']).cumcount())
+    return pd.util.hash_pandas_object(keys, index=False).to_numpy(np.uint64)
+
+def content_hashes(combined):
+    """Hash of every movie's similarity text, to detect changed rows."""
+    return pd.util.hash_pandas_object(combined, index=False).to_numpy(np.uint64)
+
+def oov_rate(vectorizer, texts):
+    """Share of analyzed tokens missing from the vectorizer's vocabulary."""
+    analyzer = vectorizer.build_analyzer()
+    vocabulary = vectorizer.vocabulary_
+    total = missing = 0
+    for text in texts:
+        tokens = analyzer(text)
+        total += len(tokens)
+        missing += sum(token not in vocabulary for token in tokens)
+    return missing / total if total else 0.0
+
+def _sorted_lists(owners, neighbors, scores, n_movies, top_k):
+    """CSR neighbor lists from (row, neighbor, score) triples, best first, at most top_k per row."""
+    order = np.lexsort((-scores, owners))
+    owners, neighbors, scores = owners[order], neighbors[order], scores[order]
+    starts = np.zeros(n_movies + 1, dtype=np.int64)
+    np.cumsum(np.bincount(owners, minlength=n_movies), out=starts[1:])
+    keep = np.arange(len(owners)) - starts[owners] < top_k
+
+    offsets = np.zeros(n_movies + 1, dtype=np.int64)
+    np.cumsum(np.bincount(owners[keep], minlength=n_movies), out=offsets[1:])
+    return offsets, neighbors[keep].astype(np.int32), scores[keep].astype(np.float32)
+
+def incremental_similarity(previous, combined, keys, hashes, top_k, workers=1, memory_budget_mb=2048,
+                           max_fraction=MAX_INCREMENTAL_FRACTION, max_drift=MAX_VOCABULARY_DRIFT):
+    """
+    Update the similarity data of a previous artifact for a new catalog.
+
+    Rows are matched to the previous artifact by key. New and changed rows
+    are vectorized with the persisted vectorizer and scored against the
+    whole catalog, as are rows whose lists pointed at a changed or removed
+    movie. Every other row keeps its list, merged with its scores against
+    the new and changed rows.
+
+    Returns (features, offsets, neighbors, scores, build_info), or None
+    after printing the reason when a full rebuild is needed instead.
+    """
+    build = previous['manifest'].get('build', {})
+    vectorizer = previous['vectorizer']
+    if previous['features'] is None or vectorizer is None or previous['row_keys'] is None:
+        print("  Previous artifact has no stored features or row keys")
+        return None
+    if build.get('top_k') != top_k or 'oov_rate' not in build:
+        print("  Previous artifact was built with different settings")
+        return None
+
+    old_index = pd.Index(np.asarray(previous['row_keys']))
+    if not old_index.is_unique:
+        print("  Previous artifact has duplicate row keys")
+        return None
+    n_movies = len(keys)
+    old_position = old_index.get_indexer(keys)
+    matched = old_position >= 0
+    unchanged = matched.copy()
+    unchanged[matched] = np.asarray(previous['content_hashes'])[old_position[matched]] == hashes[matched]
+    kept = np.flatnonzero(unchanged)
+    dirty = np.flatnonzero(~unchanged)
+    removed = len(old_index) - int(matched.sum())
+
+    incremental_rows = build.get('incremental_rows', 0) + len(dirty) + removed
+    if incremental_rows > max_fraction * n_movies:
+        print(f"  {incremental_rows} movies changed since the last full build, over {max_fraction:.0%} of the catalog")
+        return None
+    if len(dirty):
+        drift = oov_rate(vectorizer, combined.iloc[dirty]) - build['oov_rate']
+        if drift > max_drift:
+            print(f"  Vocabulary drift of {drift:.1%} on changed movies, over {max_drift:.0%}")
+            return None
+    print(f"  {int((~matched).sum())} new, {len(dirty) - int((~matched).sum())} changed, {removed} removed movies")
+
+    # Unchanged rows reuse their stored vectors, so scores stay comparable
+    parts = [previous['features'][old_position[kept]]]
+    if len(dirty):
+        parts.append(vectorizer.transform(combined.iloc[dirty]).astype(np.float32))
+    features = sparse.vstack(parts, format='csr')[np.argsort(np.concatenate([kept, dirty]))]
+
+    # Old row -> new row, -1 for removed or changed movies
+    new_position = np.full(len(old_index), -1, dtype=np.int64)
+    new_position[old_position[kept]] = kept
+    table = previous['similarity']
+    old_neighbors, old_scores, _ = table.gather(old_position[kept], int(np.diff(table.offsets).max(initial=0)))
+    valid = old_neighbors >= 0
+    remapped = np.where(valid, new_position[np.maximum(old_neighbors, 0)], -1)
+    # Lists pointing at changed or removed movies lost entries, rescore them fully
+    affected = (valid & (remapped < 0)).any(axis=1)
+    rescore = np.union1d(dirty, kept[affected])
+    merged = kept[~affected]
+
+    print(f"  Rescoring {len(rescore)} movies...")
+    rescore_offsets, rescore_neighbors, rescore_scores = exact_top_k(
+        features, top_k, workers, memory_budget_mb, rows=rescore
+    )
+    merged_valid = valid[~affected]
+    owners = [np.repeat(rescore, np.diff(rescore_offsets)), np.broadcast_to(merged[:, None], merged_valid.shape)[merged_valid]]
+    neighbors = [rescore_neighbors, remapped[~affected][merged_valid]]
+    scores = [rescore_scores, np.asarray(old_scores[~affected][merged_valid], dtype=np.float32)]
+    if len(dirty) and len(merged):
+        print(f"  Merging new scores into {len(merged)} neighbor lists...")
+        cross = (features[merged] @ features[dirty].T).tocoo()
+        owners.append(merged[cross.row])
+        neighbors.append(dirty[cross.col])
+        scores.append(cross.data.astype(np.float32))
+
+    offsets, neighbors, scores = _sorted_lists(
+        np.concatenate(owners), np.concatenate(neighbors), np.concatenate(scores), n_movies, top_k
+    )
+    build_info = dict(build, incremental_rows=incremental_rows, last_update={
+        'base_version': previous['manifest'].get('artifact_version'),
+        'added': int((~matched).sum()),
+        'changed': len(dirty) - int((~matched).sum()),
+        'removed': removed,
+        'rescored': len(rescore),
+    })
+    return features, offsets, neighbors, scores, build_info
+
+def preprocess_data(score_dtype='float32', mode='exact', ann_lists=None, ann_probe=8,
+                    ann_components=64, ann_rare_df=100, recall_sample=200,
+                    top_k=50, workers=1, memory_budget_mb=2048, incremental=False,
+                    max_incremental_fraction=MAX_INCREMENTAL_FRACTION, max_vocabulary_drift=MAX_VOCABULARY_DRIFT,
+                    embedding_dim=EMBEDDING_DIM, embedding_dtype='int8', with_field_features=True,
+                    csv_path=CSV_PATH, artifact_path=ARTIFACT_PATH):
+    """
+    Generate preprocessed similarity data from CSV file.
+
+    Every movie keeps its top_k most similar movies. The exact build runs on
+    `workers` processes and sizes its batches to stay within
+    memory_budget_mb.
+
+    mode='exact' scores every pair of movies. mode='ann' only scores
+    candidates from an IVF index and rare-term postings (see ann.py),
+    tuned by the ann_* arguments, and reports recall@k against exact
+    search on recall_sample random movies.
+
+    With incremental=True, an existing artifact is updated for the added,
+    changed and removed movies only (see incremental_similarity). A full
+    build runs instead when too much of the catalog changed since the last
+    full build or the vocabulary drifted.
+
+    embedding_dim > 0 also stores TruncatedSVD embeddings of the TF-IDF
+    rows, quantized to embedding_dtype (see quantize_embeddings), which
+    the request path can score against the whole catalog in one pass.
+
+    with_field_features also stores a TF-IDF matrix per field of the
+    similarity text (see field_features), for field weights set at
+    request time.
+    """
     
     print("Starting preprocessing...")
     print(f"Loading data from {csv_path}...")
@@ -25,54 +412,183 @@ def preprocess_data():
         if col in df.columns:
             df[col] = df[col].fillna('')
 
+    print("Adding display columns...")
+    df = add_display_columns(df)
+
     print("Creating combined features...")
-    combined = df['genres'] + ' ' + df['overview'] + ' ' + df['original_language'] + ' ' + df['cast'] + ' ' + df['director']
+    combined = combined_features(df)
+    keys = row_keys(df)
+    hashes = content_hashes(combined)
+    top_k = min(top_k, len(df))
 
-    print("Vectorizing features (this may take a while)...")
-    vectorizer = TfidfVectorizer(min_df=2, max_df=0.8)  # Limit features to reduce memory
-    feature_vectors = vectorizer.fit_transform(combined)
+    update = None
+    if incremental and artifact_exists(artifact_path):
+        print("Updating similarity incrementally...")
+        previous = load_artifact(artifact_path)
+        update = incremental_similarity(
+            previous, combined, keys, hashes, top_k, workers, memory_budget_mb,
+            max_incremental_fraction, max_vocabulary_drift,
+        )
+        if update is None:
+            print("Falling back to a full build...")
+    elif incremental:
+        print("No previous artifact, running a full build...")
 
-    print("Computing similarity in batches to save memory...")
-    # Compute similarities in batches to avoid memory issues
-    top_k = 50
-    batch_size = 1000
-    n_movies = feature_vectors.shape[0]
-    optimized_similarity = []
-    
-    for start_idx in range(0, n_movies, batch_size):
-        end_idx = min(start_idx + batch_size, n_movies)
-        print(f"  Processing movies {start_idx} to {end_idx} of {n_movies}...")
-        
-        # Compute similarity for this batch against all movies
-        batch_similarity = cosine_similarity(
-            feature_vectors[start_idx:end_idx], 
-            feature_vectors
-        ).astype('float32')
-        
-        # For each movie in batch, keep only top K similar movies
-        for i in range(batch_similarity.shape[0]):
-            sim_scores = batch_similarity[i]
-            top_indices = np.argpartition(sim_scores, -top_k)[-top_k:]
-            top_indices = top_indices[np.argsort(-sim_scores[top_indices])]
-            top_scores = sim_scores[top_indices]
-            optimized_similarity.append((top_indices, top_scores))
-
-    # Ensure directory exists
-    os.makedirs(os.path.dirname(pkl_path), exist_ok=True)
-    
-    print(f"Saving preprocessed data to {pkl_path}...")
-    with open(pkl_path, 'wb') as f:
-        pickle.dump({
-            'df': df[['title', 'release_date', 'original_language', 'overview', 'genres', 'cast', 'director', 'imdb_rating', 'poster_path']],
-            'similarity': optimized_similarity
-        }, f)
+    if update is not None:
+        vectorizer = previous['vectorizer']
+        feature_vectors, offsets, neighbors, scores, build_info = update
+    else:
+        print("Vectorizing features (this may take a while)...")
+        vectorizer = TfidfVectorizer(**VECTORIZER_PARAMS)
+        # Rows are L2-normalized, so dot products are cosine similarities
+        feature_vectors = vectorizer.fit_transform(combined)
+
+        sample = combined.sample(min(len(combined), OOV_SAMPLE_SIZE), random_state=0)
+        build_info = {'mode': mode, 'top_k': top_k, 'oov_rate': round(oov_rate(vectorizer, sample), 4), 'incremental_rows': 0}
+        if mode == 'ann':
+            print("Computing approximate similarity...")
+            offsets, neighbors, scores = ann_top_k(
+                feature_vectors, top_k, n_lists=ann_lists, n_probe=ann_probe,
+                n_components=ann_components, rare_df=ann_rare_df,
+            )
+            build_info.update(
+                ann_lists=ann_lists, ann_probe=ann_probe, ann_components=ann_components, ann_rare_df=ann_rare_df
+            )
+            if recall_sample:
+                print(f"Measuring recall@{top_k} on {recall_sample} movies...")
+                recall = recall_at_k(feature_vectors, offsets, neighbors, top_k, sample_size=recall_sample)
+                build_info['recall_at_k'] = round(recall, 4)
+                print(f"  Recall@{top_k}: {recall:.2%}")
+        elif mode == 'exact':
+            print("Computing similarity in batches to save memory...")
+            offsets, neighbors, scores = exact_top_k(feature_vectors, top_k, workers, memory_budget_mb)
+        else:
+            raise ValueError(f"Unknown similarity mode {mode!r}, expected 'exact' or 'ann'")
+
+    embeddings = embedding_scales = None
+    if embedding_dim:
+        # Refit on every build, incremental ones included, so all rows share one basis
+        print(f"Computing {embedding_dim}-dimensional embeddings...")
+        embeddings, embedding_scales = quantize_embeddings(embed(feature_vectors, embedding_dim), embedding_dtype)
+
+    fields = field_slices = field_vectorizers = None
+    if with_field_features:
+        # Refit on every build too, they are cheap next to the similarity
+        print("Vectorizing each field...")
+        fields, field_slices, field_vectorizers = field_features(df)
+
+    print("Building title index...")
+    title_index = TitleIndex(df['title'], df['release_date'])
+
+    print(f"Saving preprocessed data to {artifact_path}...")
+    manifest = save_artifact(
+        artifact_path,
+        df[ARTIFACT_COLUMNS],
+        offsets=offsets,
+        neighbors=neighbors,
+        scores=scores,
+        title_index=title_index,
+        score_dtype=score_dtype,
+        features=feature_vectors,
+        vectorizer=vectorizer,
+        build_info=build_info,
+        row_keys=keys,
+        content_hashes=hashes,
+        embeddings=embeddings,
+        embedding_scales=embedding_scales,
+        field_features=fields,
+        field_slices=field_slices,
+        field_vectorizers=field_vectorizers,
+    )
+    print(f"Artifact version: {manifest['artifact_version']}")
 
     print("✓ Preprocessing complete! Data saved successfully.")
     return True
 
+def build_parser(add_help=True):
+    parser = argparse.ArgumentParser(
+        description="Generate preprocessed similarity data from final_movies.csv", add_help=add_help
+    )
+    parser.add_argument('--mode', choices=['exact', 'ann'], default='exact',
+                        help="exact pairwise similarity, or approximate search for large catalogs")
+    parser.add_argument('--top-k', type=int, default=50,
+                        help="similar movies kept per movie")
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1,
+                        help="processes computing exact similarity (default: all cores)")
+    parser.add_argument('--memory-budget', type=int, default=2048, metavar='MB',
+                        help="memory for similarity batches across all workers, in MB")
+    parser.add_argument('--incremental', action='store_true',
+                        help="update the existing artifact for added, changed and removed movies only")
+    parser.add_argument('--max-incremental-fraction', type=float, default=MAX_INCREMENTAL_FRACTION,
+                        help="share of the catalog changed since the last full build that forces a full build")
+    parser.add_argument('--max-vocabulary-drift', type=float, default=MAX_VOCABULARY_DRIFT,
+                        help="extra out-of-vocabulary token share in changed movies that forces a full build")
+    parser.add_argument('--score-dtype', choices=['float32', 'float16'], default='float32',
+                        help="storage type of the similarity scores")
+    parser.add_argument('--embedding-dim', type=int, default=EMBEDDING_DIM,
+                        help="dimensions of the dense movie embeddings, 0 to skip them")
+    parser.add_argument('--embedding-dtype', choices=EMBEDDING_DTYPES, default='int8',
+                        help="storage type of the dense movie embeddings")
+    parser.add_argument('--no-field-features', dest='field_features', action='store_false',
+                        help="skip the per-field TF-IDF matrices used by field weights")
+    parser.add_argument('--ann-lists', type=int, default=None,
+                        help="number of IVF lists (default: square root of the catalog size)")
+    parser.add_argument('--ann-probe', type=int, default=8,
+                        help="lists scored per query list, higher is slower with better recall")
+    parser.add_argument('--ann-components', type=int, default=64,
+                        help="embedding dimensions used to cluster the catalog")
+    parser.add_argument('--ann-rare-df', type=int, default=100,
+                        help="terms found in at most this many movies make them candidates for each other")
+    parser.add_argument('--recall-sample', type=int, default=200,
+                        help="movies sampled for the recall@k report, 0 to skip it")
+    return parser
+
+def parse_args(argv=None):
+    return build_parser().parse_args(argv)
+
+def preprocess_options(args):
+    """preprocess_data keyword arguments from parsed command line arguments."""
+    return {
+        'score_dtype': args.score_dtype,
+        'mode': args.mode,
+        'ann_lists': args.ann_lists,
+        'ann_probe': args.ann_probe,
+        'ann_components': args.ann_components,
+        'ann_rare_df': args.ann_rare_df,
+        'recall_sample': args.recall_sample,
+        'top_k': args.top_k,
+        'workers': args.workers,
+        'memory_budget_mb': args.memory_budget,
+        'incremental': args.incremental,
+        'max_incremental_fraction': args.max_incremental_fraction,
+        'max_vocabulary_drift': args.max_vocabulary_drift,
+        'embedding_dim': args.embedding_dim,
+        'embedding_dtype': args.embedding_dtype,
+        'with_field_features': args.field_features,
+    }
+
+def output_params(options):
+    """
+    The preprocess_data options that shape the artifact's content, as
+    opposed to how it is built (workers, memory, incremental updates).
+    """
+    params = {
+        'mode': options.get('mode', 'exact'),
+        'top_k': options.get('top_k', 50),
+        'score_dtype': options.get('score_dtype', 'float32'),
+        'vectorizer': VECTORIZER_PARAMS,
+        'embedding_dim': options.get('embedding_dim', EMBEDDING_DIM),
+        'embedding_dtype': options.get('embedding_dtype', 'int8'),
+        'field_features': options.get('with_field_features', True),
+    }
+    if params['mode'] == 'ann':
+        params.update({name: options.get(name) for name in ('ann_lists', 'ann_probe', 'ann_components', 'ann_rare_df')})
+    return params
+
 if __name__ == '__main__':
+    args = parse_args()
     try:
-        preprocess_data()
+        preprocess_data(**preprocess_options(args))
     except Exception as e:
         print(f"Error during preprocessing: {e}")
         exit(1)
@@ -9,8 +9,11 @@ Author: Cinema Project
 Date: 2026-01-05
 """
 
+import argparse
 import pandas as pd
 import os
+import resource
+import sys
 from datetime import datetime
 
 # ============================================================================
@@ -48,6 +51,13 @@ COLUMNS_TO_KEEP = [
     'poster_path'
 ]
 
+# Rows read per chunk in streaming mode
+DEFAULT_CHUNKSIZE = 100000
+
+# Explicit types for streaming mode, so every chunk parses the same way.
+# Other kept columns are read as text.
+NUMERIC_COLUMNS = ['popularity', 'runtime', 'imdb_rating']
+
 # ============================================================================
 # HELPER FUNCTIONS
 # ============================================================================
@@ -78,12 +88,54 @@ def print_header(text):
     print(text)
     print("=" * 70)
 
+def peak_rss_mb():
+    """Peak resident memory of this process so far, in MB."""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in kilobytes on Linux and in bytes on macOS
+    return peak / (1024 * 1024) if sys.platform == 'darwin' else peak / 1024
+
 def print_subheader(text):
     """Print a formatted subheader."""
     print("\n" + "-" * 70)
     print(text)
     print("-" * 70)
 
+def print_results(file_size_mb, output_file, start_time, total, n_columns, indian_count,
+                  hollywood_count, other_popular_count, lang_dist):
+    """Print the final summary: file sizes, breakdown, languages, time and memory."""
+    output_size_mb = os.path.getsize(output_file) / (1024 * 1024)
+    
+    # ====================================================================
+    # FINAL RESULTS
+    # ====================================================================
+    print_header("PROCESSING COMPLETE")
+    
+    print(f"\n[FILE SIZES]")
+    print(f"  Original: {file_size_mb:.2f} MB")
+    print(f"  Final:    {output_size_mb:.2f} MB")
+    print(f"  Reduction: {file_size_mb - output_size_mb:.2f} MB ({((file_size_mb - output_size_mb) / file_size_mb * 100):.1f}%)")
+    
+    print(f"\n[DATASET INFO]")
+    print(f"  Total movies: {total:,}")
+    print(f"  Columns: {n_columns}")
+    
+    print(f"\n[BREAKDOWN]")
+    print(f"  Indian movies: {indian_count:,} ({indian_count / total * 100:.1f}%)")
+    print(f"  Hollywood movies: {hollywood_count:,} ({hollywood_count / total * 100:.1f}%)")
+    print(f"  Other popular movies: {other_popular_count:,} ({other_popular_count / total * 100:.1f}%)")
+    
+    print(f"\n[TOP 10 LANGUAGES]")
+    for i, (lang, count) in enumerate(lang_dist.items(), 1):
+        lang_name = get_language_name(lang)
+        percentage = (count / total) * 100
+        print(f"  {i:2d}. {lang} ({lang_name:15s}): {count:7,} ({percentage:5.2f}%)")
+    
+    duration = (datetime.now() - start_time).total_seconds()
+    print(f"\n[SUCCESS] Processing completed in {duration:.2f} seconds")
+    print(f"[MEMORY] Peak RSS: {peak_rss_mb():.1f} MB")
+    print(f"[OUTPUT] {output_file}")
+    print("=" * 70)
+
 # ============================================================================
 # MAIN PROCESSING FUNCTION
 # ============================================================================
@@ -91,7 +143,9 @@ def print_subheader(text):
 def process_movies(
     input_file='TMDB_all_movies.csv',
     output_file='final_movies.csv',
-    keep_intermediate=False
+    keep_intermediate=False,
+    streaming=False,
+    chunksize=DEFAULT_CHUNKSIZE
 ):
     """
     Complete movie dataset processing pipeline.
@@ -100,6 +154,8 @@ def process_movies(
         input_file (str): Path to the input CSV file
         output_file (str): Path to the final output CSV file
         keep_intermediate (bool): Keep intermediate filtered file
+        streaming (bool): Process the input in chunks (see stream_movies)
+        chunksize (int): Rows per chunk in streaming mode
     
     Returns:
         bool: True if successful, False otherwise
@@ -126,6 +182,13 @@ def process_movies(
     start_time = datetime.now()
     
     try:
+        if streaming:
+            summary = stream_movies(input_file, output_file, chunksize)
+            if summary is None:
+                return False
+            print_results(file_size_mb, output_file, start_time, **summary)
+            return True
+        
         # ====================================================================
         # STEP 1: LOAD DATA
         # ====================================================================
@@ -258,38 +321,15 @@ def process_movies(
         print(f"\nSaving to '{output_file}'...")
         df.to_csv(output_file, index=True)
         
-        output_size_mb = os.path.getsize(output_file) / (1024 * 1024)
-        
-        # ====================================================================
-        # FINAL RESULTS
-        # ====================================================================
-        print_header("PROCESSING COMPLETE")
-        
-        print(f"\n[FILE SIZES]")
-        print(f"  Original: {file_size_mb:.2f} MB")
-        print(f"  Final:    {output_size_mb:.2f} MB")
-        print(f"  Reduction: {file_size_mb - output_size_mb:.2f} MB ({((file_size_mb - output_size_mb) / file_size_mb * 100):.1f}%)")
-        
-        print(f"\n[DATASET INFO]")
-        print(f"  Total movies: {len(df):,}")
-        print(f"  Columns: {len(df.columns)}")
-        
-        print(f"\n[BREAKDOWN]")
-        print(f"  Indian movies: {indian_count:,} ({indian_count / len(df) * 100:.1f}%)")
-        print(f"  Hollywood movies: {hollywood_count:,} ({hollywood_count / len(df) * 100:.1f}%)")
-        print(f"  Other popular movies: {other_popular_count:,} ({other_popular_count / len(df) * 100:.1f}%)")
-        
-        print(f"\n[TOP 10 LANGUAGES]")
-        lang_dist = df['original_language'].value_counts().head(10)
-        for i, (lang, count) in enumerate(lang_dist.items(), 1):
-            lang_name = get_language_name(lang)
-            percentage = (count / len(df)) * 100
-            print(f"  {i:2d}. {lang} ({lang_name:15s}): {count:7,} ({percentage:5.2f}%)")
-        
-        duration = (datetime.now() - start_time).total_seconds()
-        print(f"\n[SUCCESS] Processing completed in {duration:.2f} seconds")
-        print(f"[OUTPUT] {output_file}")
-        print("=" * 70)
+        print_results(
+            file_size_mb, output_file, start_time,
+            total=len(df),
+            n_columns=len(df.columns),
+            indian_count=indian_count,
+            hollywood_count=hollywood_count,
+            other_popular_count=other_popular_count,
+            lang_dist=df['original_language'].value_counts().head(10),
+        )
         
         return True
         
@@ -299,6 +339,116 @@ def process_movies(
         traceback.print_exc()
         return False
 
+# ============================================================================
+# STREAMING PROCESSING FUNCTION
+# ============================================================================
+
+def stream_movies(input_file, output_file, chunksize=DEFAULT_CHUNKSIZE):
+    """
+    Streaming version of the processing steps, for dumps too large to load
+    at once. The input is read in chunks of `chunksize` rows, limited to
+    the columns the pipeline uses. Each chunk is filtered by runtime,
+    region and popularity, rows already written are dropped by their hash,
+    and the survivors are appended to the output. Produces the same rows
+    as the in-memory pipeline.
+    
+    Returns:
+        dict: Summary counts for print_results, or None on error
+    """
+    
+    print_header("STEP 1: SCANNING COLUMNS")
+    header = pd.read_csv(input_file, nrows=0).columns
+    for required in ('popularity', 'original_language'):
+        if required not in header:
+            print(f"[ERROR] '{required}' column not found in the dataset!")
+            return None
+    
+    existing_columns = [col for col in COLUMNS_TO_KEEP if col in header]
+    missing_columns = [col for col in COLUMNS_TO_KEEP if col not in header]
+    if missing_columns:
+        print("\n[WARNING] The following columns are not in the CSV:")
+        for col in missing_columns:
+            print(f"  - {col}")
+    if not existing_columns:
+        print("\n[ERROR] None of the specified columns exist in the CSV!")
+        return None
+    
+    has_runtime = 'runtime' in header
+    if not has_runtime:
+        print("\n[WARNING] 'runtime' column not found, skipping runtime filter")
+    usecols = set(existing_columns) | {'popularity', 'original_language'} | ({'runtime'} if has_runtime else set())
+    dtype = {col: 'float64' if col in NUMERIC_COLUMNS else str for col in usecols}
+    print(f"[OK] Reading {len(usecols)} of {len(header)} columns in chunks of {chunksize:,} rows")
+    
+    print_header("STEP 2: FILTERING AND DEDUPLICATING CHUNKS")
+    counts = {'rows': 0, 'runtime_removed': 0, 'indian': 0, 'hollywood': 0, 'other': 0, 'duplicates': 0, 'written': 0}
+    languages = pd.Series(dtype='int64')
+    # Hashes of the rows written so far
+    seen = set()
+    
+    # Written next to the output and renamed at the end, so a failed run
+    # never leaves a partial file behind
+    tmp_output = output_file + '.tmp'
+    try:
+        with open(tmp_output, 'w', newline='', encoding='utf-8') as out:
+            pd.DataFrame(columns=existing_columns).rename_axis('index').to_csv(out)
+            
+            reader = pd.read_csv(input_file, usecols=sorted(usecols), dtype=dtype, chunksize=chunksize)
+            for chunk_number, chunk in enumerate(reader, 1):
+                counts['rows'] += len(chunk)
+                if has_runtime:
+                    before_runtime = len(chunk)
+                    chunk = chunk[chunk['runtime'] >= MIN_RUNTIME]
+                    counts['runtime_removed'] += before_runtime - len(chunk)
+                
+                popularity = chunk['popularity'].fillna(0)
+                is_indian = chunk['original_language'].isin(INDIAN_LANGUAGES)
+                is_hollywood = chunk['original_language'] == HOLLYWOOD_LANGUAGE
+                is_indian_popular = is_indian & (popularity >= MIN_POPULARITY_INDIAN)
+                is_hollywood_popular = is_hollywood & (popularity >= MIN_POPULARITY_HOLLYWOOD)
+                is_other_popular = ~(is_indian | is_hollywood) & (popularity >= MIN_POPULARITY_OTHER)
+                counts['indian'] += int(is_indian_popular.sum())
+                counts['hollywood'] += int(is_hollywood_popular.sum())
+                counts['other'] += int(is_other_popular.sum())
+                chunk = chunk.loc[is_indian_popular | is_hollywood_popular | is_other_popular, existing_columns]
+                
+                # Keep the first occurrence of each row, within the chunk and across chunks
+                hashes = pd.util.hash_pandas_object(chunk, index=False).tolist()
+                is_new = []
+                for row_hash in hashes:
+                    is_new.append(row_hash not in seen)
+                    seen.add(row_hash)
+                counts['duplicates'] += len(is_new) - sum(is_new)
+                chunk = chunk[is_new]
+                
+                chunk.index = pd.RangeIndex(counts['written'] + 1, counts['written'] + 1 + len(chunk), name='index')
+                chunk.to_csv(out, header=False)
+                counts['written'] += len(chunk)
+                languages = languages.add(chunk['original_language'].value_counts(), fill_value=0)
+                print(f"[OK] Chunk {chunk_number}: {counts['rows']:,} rows read, {counts['written']:,} kept")
+        os.replace(tmp_output, output_file)
+    except BaseException:
+        if os.path.exists(tmp_output):
+            os.remove(tmp_output)
+        raise
+    
+    if has_runtime:
+        print(f"\n[OK] Removed {counts['runtime_removed']:,} movies with runtime < {MIN_RUNTIME} mins")
+    print(f"  [OK] Indian movies (popularity >= {MIN_POPULARITY_INDIAN}): {counts['indian']:,}")
+    print(f"  [OK] Hollywood movies (popularity >= {MIN_POPULARITY_HOLLYWOOD}): {counts['hollywood']:,}")
+    print(f"  [OK] Other country movies (popularity >= {MIN_POPULARITY_OTHER}): {counts['other']:,}")
+    print(f"[OK] Removed {counts['duplicates']:,} duplicate rows")
+    print(f"[OK] Final row count: {counts['written']:,}, index numbered from 1")
+    
+    return {
+        'total': counts['written'],
+        'n_columns': len(existing_columns),
+        'indian_count': counts['indian'],
+        'hollywood_count': counts['hollywood'],
+        'other_popular_count': counts['other'],
+        'lang_dist': languages.astype('int64').sort_values(ascending=False, kind='stable').head(10),
+    }
+
 # ============================================================================
 # MAIN ENTRY POINT
 # ============================================================================
@@ -317,11 +467,22 @@ if __name__ == "__main__":
     print("  3. Remove duplicate entries")
     print("  3. Remove duplicate entries")
     
+    parser = argparse.ArgumentParser(description="Filter and clean the TMDB movie dump")
+    parser.add_argument('--input', default='TMDB_all_movies.csv', help="input CSV file")
+    parser.add_argument('--output', default='final_movies.csv', help="output CSV file")
+    parser.add_argument('--streaming', action='store_true',
+                        help="process the input in chunks instead of loading it at once")
+    parser.add_argument('--chunksize', type=int, default=DEFAULT_CHUNKSIZE,
+                        help="rows per chunk in streaming mode")
+    args = parser.parse_args()
+    
     # Run the processing
     success = process_movies(
-        input_file='TMDB_all_movies.csv',
-        output_file='final_movies.csv',
-        keep_intermediate=False
+        input_file=args.input,
+        output_file=args.output,
+        keep_intermediate=False,
+        streaming=args.streaming,
+        chunksize=args.chunksize
     )
     
     if success:
@@ -0,0 +1,228 @@
+"""
+Opt-in profiling of single requests, to see where a slow one spent its
+time across title matching, difflib, scoring and template rendering.
+
+Disabled by default (see RECOMMENDATION_PROFILING). Once enabled, views
+decorated with profiled() profile two kinds of requests: those with an
+X-Profile header equal to RECOMMENDATION_PROFILE_TOKEN (or any X-Profile
+header when DEBUG is on and no token is set), and a random
+RECOMMENDATION_PROFILE_SAMPLE_RATE share of the others. Other requests
+cost a flag check, or a random draw when sampling.
+
+Two profilers, chosen by RECOMMENDATION_PROFILER:
+
+    sampling  a thread records the stack of the request thread every
+              SAMPLE_INTERVAL seconds, written as <name>.folded: one
+              "frame;frame;frame microseconds" line per stack, the
+              input of flamegraph.pl, inferno and speedscope
+    cprofile  cProfile, written as <name>.prof (pstats), for snakeviz,
+              flameprof, gprof2dot or python -m pstats
+
+Sampling adds little to the request but only sees a few stacks of a
+request lasting a few milliseconds; cProfile counts every call, at the
+cost of slowing the profiled request down, and profiles one request at
+a time.
+
+Profiles go to RECOMMENDATION_PROFILE_DIR, named after the time, view
+and duration, and the response names its file in an X-Profile-File
+header. Only sync views are profiled: async views run their work on the
+offload pool, out of the request thread's reach.
+"""
+
+import cProfile
+import hmac
+import itertools
+import os
+import random
+import sys
+import threading
+import time
+from collections import Counter
+from functools import lru_cache, wraps
+
+PROFILERS = ('sampling', 'cprofile')
+# Seconds between two stack samples of the sampling profiler
+SAMPLE_INTERVAL = 0.001
+
+_enabled = False
+_profiler = 'sampling'
+_directory = 'profiles'
+_sample_rate = 0.0
+_token = ''
+_debug = False
+_counter = itertools.count()
+# cProfile can't profile two threads at once on Python 3.12+
+_cprofile_lock = threading.Lock()
+# Running samplers, and the GIL switch interval to restore when the last stops
+_samplers_lock = threading.Lock()
+_samplers = 0
+_switch_interval = None
+
+
+def configure(enabled, profiler='sampling', directory='profiles', sample_rate=0.0, token='', debug=False):
+    global _enabled, _profiler, _directory, _sample_rate, _token, _debug
+    if profiler not in PROFILERS:
+        raise ValueError(f"Unknown profiler {profiler!r}, expected one of {', '.join(PROFILERS)}")
+    _enabled = bool(enabled)
+    _profiler = profiler
+    _directory = str(directory)
+    _sample_rate = float(sample_rate)
+    _token = token or ''
+    _debug = bool(debug)
+
+
+def is_enabled():
+    return _enabled
+
+
+def _should_profile(request):
+    header = request.headers.get('X-Profile')
+    if header is not None:
+        # Anyone can send the header, so without a token it only counts in development
+        if _token:
+            return hmac.compare_digest(header, _token)
+        return _debug
+    return _sample_rate > 0 and random.random() < _sample_rate
+
+
+def profiled(view):
+    """Profile the requests to a sync view picked by the settings (see the module docstring)."""
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        if not _enabled or not _should_profile(request):
+            return view(request, *args, **kwargs)
+        return _profile(view, request, args, kwargs)
+    return wrapper
+
+
+def _run_view(view, request, args, kwargs):
+    # Root frame of the sampled stacks
+    return view(request, *args, **kwargs)
+
+
+@lru_cache(maxsize=4096)
+def _short_path(filename):
+    """Path of a source file relative to the sys.path entry it was imported from."""
+    best = ''
+    for entry in sys.path:
+        entry = os.path.abspath(entry or os.curdir)
+        if filename.startswith(entry + os.sep) and len(entry) > len(best):
+            best = entry
+    return os.path.relpath(filename, best) if best else filename
+
+
+def _frame_label(code):
+    return f"{getattr(code, 'co_qualname', code.co_name)} ({_short_path(code.co_filename)}:{code.co_firstlineno})"
+
+
+class Sampler:
+    """
+    Samples the stack of one thread below _run_view every `interval`
+    seconds. Each stack counts the microseconds since the previous
+    sample, so irregular sampling (the thread holding the GIL) still
+    gives time-proportional flame graphs.
+
+    While samplers run, the interpreter switches threads every `interval`
+    instead of every 5 ms, or a CPU bound request would hold the GIL
+    through most of the sampling ticks.
+    """
+
+    def __init__(self, thread_id, interval=SAMPLE_INTERVAL):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stacks = Counter()
+        self._running = True
+        self._thread = threading.Thread(target=self._run, name='recommendation-profiler', daemon=True)
+
+    def start(self):
+        global _samplers, _switch_interval
+        with _samplers_lock:
+            if _samplers == 0:
+                _switch_interval = sys.getswitchinterval()
+                sys.setswitchinterval(min(self.interval, _switch_interval))
+            _samplers += 1
+        self._last = time.perf_counter()
+        self._thread.start()
+
+    def stop(self):
+        global _samplers
+        self._running = False
+        self._thread.join()
+        with _samplers_lock:
+            _samplers -= 1
+            if _samplers == 0:
+                sys.setswitchinterval(_switch_interval)
+
+    def _run(self):
+        root = _run_view.__code__
+        # sleep() takes the GIL back once per tick, Event.wait() several times
+        while self._running:
+            time.sleep(self.interval)
+            frame = sys._current_frames().get(self.thread_id)
+            now = time.perf_counter()
+            labels = []
+            while frame is not None and frame.f_code is not root:
+                labels.append(_frame_label(frame.f_code))
+                frame = frame.f_back
+            elapsed, self._last = now - self._last, now
+            if frame is None or not labels:
+                # Not inside the view yet, or already out of it
+                continue
+            self.stacks[';'.join(reversed(labels))] += int(elapsed * 1e6)
+
+    def write_folded(self, path):
+        with open(path, 'w', encoding='utf-8') as f:
+            for stack, microseconds in self.stacks.most_common():
+                f.write(f'{stack} {microseconds}\n')
+
+
+def _output_path(name, seconds, extension):
+    os.makedirs(_directory, exist_ok=True)
+    stamp = time.strftime('%Y%m%dT%H%M%S')
+    return os.path.join(
+        _directory, f'{stamp}-{name}-{seconds * 1000:.0f}ms-{os.getpid()}-{next(_counter)}.{extension}'
+    )
+
+
+def _profile(view, request, args, kwargs):
+    if _profiler == 'cprofile':
+        if not _cprofile_lock.acquire(blocking=False):
+            # Another request is being profiled, serve this one as is
+            return _run_view(view, request, args, kwargs)
+        profile = cProfile.Profile()
+        start = time.perf_counter()
+        try:
+            profile.enable()
+            try:
+                response = _run_view(view, request, args, kwargs)
+            finally:
+                profile.disable()
+        finally:
+            _cprofile_lock.release()
+            seconds = time.perf_counter() - start
+            path = _save(lambda path: profile.dump_stats(path), view.__name__, seconds, 'prof')
+    else:
+        sampler = Sampler(threading.get_ident())
+        start = time.perf_counter()
+        sampler.start()
+        try:
+            response = _run_view(view, request, args, kwargs)
+        finally:
+            sampler.stop()
+            seconds = time.perf_counter() - start
+            path = _save(sampler.write_folded, view.__name__, seconds, 'folded')
+
+    if path is not None:
+        response['X-Profile-File'] = os.path.basename(path)
+    return response
+
+
+def _save(write, name, seconds, extension):
+    """Write a profile with write(path); returns the path, None when writing failed."""
+    try:
+        path = _output_path(name, seconds, extension)
+        write(path)
+    except OSError as e:
+        print(f"Could not write the profile of a {name} request: {e}")
+        return None
+    return path
@@ -1,30 +1,197 @@
-import pandas as pd
-import difflib
 import pickle
 import os
+import threading
+import time
+import numpy as np
+from concurrent.futures import ThreadPoolExecutor
+from scipy import sparse
+from itertools import chain
+from . import metrics
+from .artifact import NeighborTable, artifact_exists, load_artifact, read_manifest
+from .cache import ResultCache
+from .filters import CatalogFilters
+from .offload import Cancelled, check_cancelled
+from .term_index import TermIndex
+from .title_index import TitleIndex
 
-# Load preprocessed data
+# Preprocessed data, preferring the memory-mapped artifact over the legacy pickle
+artifact_path = 'recommendation/static/recommendation/preprocessed'
 preprocessed_path = 'recommendation/static/recommendation/preprocessed_data.pkl'
 
-if not os.path.exists(preprocessed_path):
-    print("Preprocessed data not found. Generating it now...")
-    try:
-        from .preprocess_data import preprocess_data
-        preprocess_data()
-        print("Preprocessing complete!")
-    except Exception as e:
+# The model is loaded on first use (or by start_background_load) rather than
+# at import time, so management commands and worker boot stay fast
+_model = None
+_model_lock = threading.Lock()
+_filters_lock = threading.Lock()
+_load_thread = None
+_status = {
+    'state': 'not_loaded',
+    'artifact_version': None,
+    'artifact_format': None,
+    'n_movies': None,
+    'load_seconds': None,
+    'artifact_bytes': None,
+    'error': None,
+}
+
+# Request path results, keyed by artifact version and normalized arguments.
+# Cached values are shared between requests and must not be modified.
+# Bytes kept by each cache, per worker process
+RESULT_CACHE_BYTES = 16 * 1024 * 1024
+SUGGESTION_CACHE_BYTES = 16 * 1024 * 1024
+_result_cache = ResultCache(RESULT_CACHE_BYTES)
+_suggestion_cache = ResultCache(SUGGESTION_CACHE_BYTES)
+
+# Weight of each field of the similarity text, set by configure_field_weights.
+# None ranks neighbors by the build's combined similarity
+_field_weights = None
+
+def parse_field_weights(spec):
+    """
+    Field weights from a "director=3,genres=2" string or a dict, None when
+    empty. Fields not named weigh 1; weights can't be negative or all 0.
+    """
+    if not spec:
+        return None
+    from .preprocess_data import FEATURE_FIELDS
+
+    if isinstance(spec, str):
+        pairs = [item.split('=', 1) for item in spec.split(',') if item.strip()]
+        if any(len(pair) != 2 for pair in pairs):
+            raise ValueError(f"Invalid field weights {spec!r}, expected field=weight pairs such as 'director=3,genres=2'")
+        spec = {name.strip(): value for name, value in pairs}
+
+    weights = dict.fromkeys(FEATURE_FIELDS, 1.0)
+    for name, value in spec.items():
+        if name not in weights:
+            raise ValueError(f"Unknown field {name!r} in the field weights, expected one of {', '.join(FEATURE_FIELDS)}")
+        weights[name] = float(value)
+        if not 0 <= weights[name] < float('inf'):
+            raise ValueError(f"Invalid weight {value!r} for the {name} field")
+    if not any(weights.values()):
+        raise ValueError("At least one field weight must be above 0")
+    return weights
+
+def configure_field_weights(spec):
+    """Rank neighbors by the per-field similarity weighted by spec (see parse_field_weights)."""
+    global _field_weights
+    _field_weights = parse_field_weights(spec)
+
+def _load_model():
+    if not artifact_exists(artifact_path) and not os.path.exists(preprocessed_path):
+        # Building takes minutes and gigabytes, it is the build step's job
+        # (build.sh), never a web worker's
         raise FileNotFoundError(
-            f"Preprocessed data not found at {preprocessed_path}. "
-            f"Attempted to generate it but failed: {e}. "
-            "Please run 'python recommendation/preprocess_data.py' manually."
+            f"Preprocessed data not found at {artifact_path}. "
+            "Run 'python recommendation/pipeline.py' to build it."
         )
 
-with open(preprocessed_path, 'rb') as f:
-    data = pickle.load(f)
-    df = data['df']
-    similarity = data['similarity']
+    if artifact_exists(artifact_path):
+        # The version current now, a rebuild may swap the path meanwhile
+        path = os.path.realpath(artifact_path)
+        # Text stays in the memory-mapped artifact and is decoded only for
+        # the rows a request renders, unless the artifact predates the
+        # display columns and they must be built here
+        lazy_columns = 'full_title' in read_manifest(path)['columns']
+        data = load_artifact(path, lazy_columns=lazy_columns)
+    else:
+        with open(preprocessed_path, 'rb') as f:
+            data = pickle.load(f)
+        data['manifest'] = {'artifact_version': 'legacy', 'format_version': 0}
+
+    if data.get('columns') is None:
+        # Artifacts that predate the display columns get them built at load time
+        if 'full_title' not in data['df'].columns:
+            from .preprocess_data import add_display_columns
+            data['df'] = add_display_columns(data['df'])
+        # Column arrays for vectorized gathers on the request path
+        data['columns'] = {column: data['df'][column].to_numpy() for column in data['df'].columns}
+        # Only the columns are used from here on
+        data['df'] = None
+
+    if data.get('title_index') is None:
+        data['title_index'] = TitleIndex(data['columns']['title'], data['columns']['release_date'])
+    if isinstance(data['similarity'], list):
+        data['similarity'] = NeighborTable.from_lists(data['similarity'])
+    if _field_weights and data.get('field_features') is None:
+        print("Field weights are ignored, the artifact has no per-field features. "
+              "Rerun 'python recommendation/preprocess_data.py' to add them.")
+
+    return data
+
+def get_model():
+    """Return the loaded model, loading it on first use."""
+    global _model
+    if _model is not None:
+        return _model
 
-def get_movie_suggestions(query, limit=5):
+    with _model_lock:
+        if _model is None:
+            _status.update(state='loading', error=None)
+            start = time.perf_counter()
+            try:
+                model = _load_model()
+            except Exception as e:
+                _status.update(state='failed', error=str(e))
+                raise
+            manifest = model['manifest']
+            _status.update(
+                state='ready',
+                artifact_version=manifest.get('artifact_version'),
+                artifact_format=manifest.get('format_version'),
+                n_movies=len(model['title_index']),
+                load_seconds=round(time.perf_counter() - start, 3),
+                artifact_bytes=_artifact_bytes(),
+            )
+            _model = model
+    return _model
+
+def _artifact_bytes():
+    """On-disk size of the loaded artifact."""
+    if artifact_exists(artifact_path):
+        return sum(entry.stat().st_size for entry in os.scandir(artifact_path) if entry.is_file())
+    if os.path.exists(preprocessed_path):
+        return os.path.getsize(preprocessed_path)
+    return None
+
+def start_background_load():
+    """Load the model in a daemon thread unless it is loaded or loading already."""
+    global _load_thread
+    with _model_lock:
+        if _model is not None or (_load_thread is not None and _load_thread.is_alive()):
+            return
+        _load_thread = threading.Thread(target=_load_in_background, name='recommendation-model-loader', daemon=True)
+        _load_thread.start()
+
+def _load_in_background():
+    try:
+        get_model()
+    except Exception as e:
+        print(f"Background model load failed: {e}")
+
+def model_status():
+    """Load state, artifact version and load duration of the model."""
+    return dict(_status)
+
+def cache_stats():
+    """Size and hit counts of the result caches."""
+    return {'results': _result_cache.stats(), 'suggestions': _suggestion_cache.stats()}
+
+def _artifact_version(model):
+    return model['manifest'].get('artifact_version')
+
+def _cached(cache, key, compute, cancel=None):
+    """
+    cache.get_or_compute, computing the value here when the request it was
+    coalesced with got cancelled (see offload).
+    """
+    while True:
+        try:
+            return cache.get_or_compute(key, compute)
+        except Cancelled:
+            check_cancelled(cancel)
+
+def get_movie_suggestions(query, limit=5, cancel=None):
     """
     Get movie suggestions based on user query for autocomplete
     Returns a list of dictionaries with title and poster_path
@@ -32,140 +199,548 @@ def get_movie_suggestions(query, limit=5):
     if not query or len(query) < 1:
         return []
     
-    # Filter movies where title contains the query (case insensitive)
-    query_lower = query.lower()
-    matching_movies = df[df['title'].str.lower().str.contains(query_lower, na=False, regex=False)]
+    model = get_model()
+    key = (_artifact_version(model), query.lower(), limit)
+    return _cached(_suggestion_cache, key, lambda: _movie_suggestions(model, query, limit, cancel), cancel)
+
+def _movie_suggestions(model, query, limit, cancel=None):
+    columns = model['columns']
+    title_index = model['title_index']
     
-    # If no direct matches, use fuzzy matching
-    if len(matching_movies) == 0:
-        list_of_titles = [title.lower() for title in df['title'].tolist()]
-        find_close_match = difflib.get_close_matches(query_lower, list_of_titles, n=limit*3, cutoff=0.3)
+    with metrics.stage('title_search'):
+        # Find movies where title contains the query (case insensitive)
+        query_lower = query.lower()
+        matching_rows = title_index.iter_contains(query_lower, cancel)
+        first_row = next(matching_rows, None)
         
-        if find_close_match:
-            matching_movies = df[df['title'].str.lower().isin(find_close_match)]
-    
-    # Get unique movies, limit results
-    suggestions = []
-    seen = set()
-    
-    for idx, movie in matching_movies.iterrows():
-        # Create a unique key based on title and release date
-        unique_key = (movie['title'].lower(), str(movie['release_date']))
+        # If no direct matches, use fuzzy matching
+        if first_row is None:
+            metrics.increment('recommendation_fuzzy_fallbacks_total', ('autocomplete',))
+            with metrics.stage('fuzzy'):
+                matching_rows = []
+                find_close_match = title_index.close_matches(query_lower, n=limit*3, cutoff=0.3, cancel=cancel)
+                
+                if find_close_match:
+                    matching_rows = title_index.rows_for_titles(find_close_match)
+        else:
+            matching_rows = chain([first_row], matching_rows)
+        
+        # Get unique movies based on title and release date, limit results
+        release_dates = columns['release_date']
+        lowered_titles = title_index.titles
+        rows = []
+        seen = set()
         
-        if unique_key not in seen and len(suggestions) < limit:
-            seen.add(unique_key)
-            # Extract year from release_date
-            year = movie['release_date'].split('-')[0] if movie['release_date'] and '-' in str(movie['release_date']) else ''
-            # Create full title with year for internal use
-            full_title = f"{movie['title']} ({year})" if year else movie['title']
-            
-            # Format release_date to dd-mm-yyyy
-            formatted_date = ''
-            if movie['release_date'] and '-' in str(movie['release_date']):
-                parts = movie['release_date'].split('-')
-                if len(parts) == 3:
-                    formatted_date = f"{parts[2]}-{parts[1]}-{parts[0]}"
-                else:
-                    formatted_date = movie['release_date']
-            else:
-                formatted_date = movie['release_date']
-            
-            suggestions.append({
-                'title': movie['title'],  # Display title without year
+        for idx in matching_rows:
+            if len(rows) >= limit:
+                break
+            unique_key = (lowered_titles[idx], str(release_dates[idx]))
+            if unique_key not in seen:
+                seen.add(unique_key)
+                rows.append(idx)
+    
+    rows = np.asarray(rows, dtype=np.int64)
+    with metrics.stage('format'):
+        return [
+            {
+                'title': title,  # Display title without year
                 'full_title': full_title,  # Full title with year for matching
-                'poster_path': movie['poster_path'],
+                'poster_path': poster_path,
                 'release_date': formatted_date,
-                'index': int(idx)  # Include dataframe index
-            })
-    
-    return suggestions
+                'index': index  # Include dataframe index
+            }
+            for title, full_title, poster_path, formatted_date, index in zip(
+                columns['title'][rows].tolist(),
+                columns['full_title'][rows].tolist(),
+                columns['poster_path'][rows].tolist(),
+                columns['formatted_date'][rows].tolist(),
+                rows.tolist(),
+            )
+        ]
 
-def movie_recommendation(movie_name, number=10, movie_index=None):
+def resolve_movie(movie_name, movie_index=None, cancel=None):
+    """
+    Catalog row of the requested movie: movie_index when valid, otherwise
+    the "Title (Year)" or fuzzy match of movie_name. None when not found.
+    """
+    title_index = get_model()['title_index']
+    
     # If movie_index is provided, use it directly
     if movie_index is not None:
         try:
             movie_index = int(movie_index)
-            # Verify the index exists in the dataframe
-            if movie_index not in df.index:
+            # Verify the index exists in the catalog
+            if not title_index.is_valid_row(movie_index):
                 movie_index = None
         except (ValueError, TypeError):
             movie_index = None
     
     # If no valid index provided, search by movie name
-    if movie_index is None:
-        # Check if movie_name includes year in format "Title (Year)"
-        import re
-        match = re.match(r'^(.+?)\s*\((\d{4})\)$', movie_name)
+    if movie_index is None and movie_name:
+        # Title lookups are case insensitive
+        key = ('resolve', _artifact_version(get_model()), movie_name.lower())
+        with metrics.stage('resolve'):
+            movie_index = _cached(_result_cache, key, lambda: _resolve_title(title_index, movie_name, cancel), cancel)
+    
+    return movie_index
+
+def _resolve_title(title_index, movie_name, cancel=None):
+    # Check if movie_name includes year in format "Title (Year)"
+    import re
+    match = re.match(r'^(.+?)\s*\((\d{4})\)$', movie_name)
+    
+    if match:
+        # Extract title and year
+        title_only = match.group(1).strip()
+        year = match.group(2)
         
-        if match:
-            # Extract title and year
-            title_only = match.group(1).strip()
-            year = match.group(2)
-            
-            # Find movie matching both title and year
-            matching_movies = df[
-                (df['title'].str.lower() == title_only.lower()) & 
-                (df['release_date'].str.startswith(year))
-            ]
-            
-            if len(matching_movies) > 0:
-                movie_index = matching_movies.index[0]
-            else:
-                # Fallback to just title match
-                movie_index = df[df['title'].str.lower() == title_only.lower()].index[0]
+        # Find movie matching both title and year, falling back to just title
+        return title_index.resolve(title_only, year)
+
+    # Original logic for title-only search
+    metrics.increment('recommendation_fuzzy_fallbacks_total', ('resolve',))
+    find_close_match = title_index.close_matches(movie_name.lower(), n=10, cutoff=0.3, cancel=cancel)
+    if find_close_match:
+        return title_index.resolve(find_close_match[0])
+    return None
+
+def _catalog_filters(model):
+    """Filter arrays of the model, built on the first filtered request."""
+    if 'filters' not in model:
+        with _filters_lock:
+            if 'filters' not in model:
+                model['filters'] = CatalogFilters(model['columns'])
+    return model['filters']
+
+def _weights_for(model):
+    """The configured field weights, None when unset or the model has no per-field features."""
+    return _field_weights if model.get('field_features') is not None else None
+
+def _column_weights(model, weights):
+    """
+    Weight of every column of the field matrix: its field's weight over
+    the sum of the weights, so weighted scores stay between 0 and 1.
+    """
+    cached = model.get('column_weights')
+    if cached is None or cached[0] is not weights:
+        slices = model['field_slices']
+        total = sum(weights.get(field, 1.0) for field, (start, end) in slices.items() if end > start)
+        vector = np.zeros(model['field_features'].shape[1], dtype=np.float32)
+        for field, (start, end) in slices.items():
+            vector[start:end] = weights.get(field, 1.0) / total if total else 0.0
+        cached = model['column_weights'] = (weights, vector)
+    return cached[1]
+
+def field_scores(model, movie_index, candidates, weights):
+    """
+    Weighted sum of the per-field cosine similarities of the candidate
+    rows (every catalog row when None) to movie_index. The weights fold
+    into the query vector, so this is one sparse product over the
+    candidates whatever the number of fields.
+    """
+    fields = model['field_features']
+    query = fields[movie_index].toarray().ravel() * _column_weights(model, weights)
+    if candidates is None:
+        return _score_catalog(model, query, 'field_features')
+    return fields[candidates] @ query
+
+def _can_score_on_demand(model):
+    return model.get('features') is not None or model.get('embeddings') is not None
+
+def _score_on_demand(model, movie_index, mask, number, weights=None):
+    """
+    Top movies passing the filter mask (all movies when None), scored on
+    demand against the feature matrix, or against the dense embeddings of
+    artifacts without one. With field weights, the per-field matrices are
+    scored instead (see field_scores).
+    """
+    features = model.get('features')
+    candidates = np.flatnonzero(mask) if mask is not None else np.arange(len(model['title_index']))
+    if weights is not None:
+        if len(candidates) * 4 < len(model['title_index']):
+            scores = field_scores(model, movie_index, candidates, weights)
         else:
-            # Original logic for title-only search
-            list_of_titles = [title.lower() for title in df['title'].tolist()]
-            find_close_match = difflib.get_close_matches(movie_name.lower(), list_of_titles, n=10, cutoff=0.3)
-
-            if not find_close_match:
-                return {}
-            
-            close_match = find_close_match[0]
-            movie_index = df[df['title'].str.lower() == close_match].index[0]
-    
+            scores = field_scores(model, movie_index, None, weights)[candidates]
+    elif features is None:
+        scores = embedding_scores(model, _embedding(model, [movie_index]))[candidates]
+    elif len(candidates) * 4 < features.shape[0]:
+        # Selective filter: only score the movies that pass it
+        scores = features[candidates] @ features[movie_index].toarray().ravel()
+    else:
+        scores = _score_catalog(model, features[movie_index].toarray().ravel())[candidates]
+    top = _top_k(scores, number)
+    top = top[scores[top] > 0]
+    return candidates[top], scores[top]
+
+def check_number(model, number):
+    """
+    Raise ValueError when the artifact can't return `number` movies: its
+    neighbor lists stop at top_k and it has nothing to score on demand.
+    """
+    if isinstance(model['similarity'], NeighborTable) and not _can_score_on_demand(model):
+        top_k = _stored_top_k(model)
+        if number > top_k:
+            raise ValueError(f"'number' must be at most {top_k} with this artifact")
+
+def similar_movies(movie_index, number=10, filters=None):
+    """
+    Rows and scores of the movies most similar to movie_index, best first.
+    With filters (see CatalogFilters) the cached neighbors are filtered
+    first, and when too few remain the movies passing the filter are
+    scored on demand. With field weights (see configure_field_weights)
+    the movies passing the filter are always scored on demand by the
+    weighted per-field similarity: the cached neighbors were ranked by
+    the combined text, so they would only be the right candidates for
+    some values of `number`. Raises ValueError when the artifact can't
+    return `number` movies (see check_number).
+    """
+    model = get_model()
+    check_number(model, number)
+    filters = CatalogFilters.normalize(filters) if filters else {}
+    weights = _weights_for(model)
+    key = (
+        'similar', _artifact_version(model), int(movie_index), int(number), tuple(sorted(filters.items())),
+        tuple(sorted(weights.items())) if weights else None,
+    )
+    with metrics.stage('neighbors'):
+        return _result_cache.get_or_compute(key, lambda: _similar_movies(model, movie_index, number, filters, weights))
+
+def _similar_movies(model, movie_index, number, filters, weights=None):
+    mask = _catalog_filters(model).mask(filters) if filters else None
+    if weights is not None:
+        top_indices, top_scores = _score_on_demand(model, movie_index, mask, number, weights)
+        return _shared(top_indices, top_scores)
+
+    similarity = model['similarity']
+
     # Get precomputed similar movies
-    if isinstance(similarity, list):
-        # Optimized format: list of (indices, scores) tuples
+    if isinstance(similarity, NeighborTable):
+        # Optimized format: top-k neighbor lists in CSR layout
         top_indices, top_scores = similarity[movie_index]
-        similarity_score = list(zip(top_indices, top_scores))
     else:
         # Legacy format: full similarity matrix
-        similarity_score = list(enumerate(similarity[movie_index]))
-        similarity_score = sorted(similarity_score, key=lambda x: x[1], reverse=True)
-
-    recommendations = []
-    count = 0
-    for index, score in similarity_score:
-        if count >= number:
-            break
-        movie = df.iloc[index]
-        # Convert imdb_rating to float, handle empty strings
-        try:
-            rating = round(float(movie['imdb_rating']), 2) if movie['imdb_rating'] else 0.0
-        except (ValueError, TypeError):
-            rating = 0.0
-        
-        # Format release_date to dd-mm-yyyy
-        formatted_date = ''
-        if movie['release_date'] and '-' in str(movie['release_date']):
-            parts = str(movie['release_date']).split('-')
-            if len(parts) == 3:
-                formatted_date = f"{parts[2]}-{parts[1]}-{parts[0]}"
-            else:
-                formatted_date = movie['release_date']
+        all_scores = np.asarray(similarity[movie_index])
+        top_indices = np.argsort(-all_scores, kind='stable')
+        top_scores = all_scores[top_indices]
+    top_indices = np.asarray(top_indices, dtype=np.int64)
+    top_scores = np.asarray(top_scores, dtype=np.float32)
+
+    if mask is not None:
+        keep = mask[top_indices]
+        top_indices, top_scores = top_indices[keep], top_scores[keep]
+    # The cached neighbor list ran dry (filters, or more movies asked for
+    # than the build kept), fall back to on-demand scoring
+    if len(top_indices) < number and _can_score_on_demand(model):
+        top_indices, top_scores = _score_on_demand(model, movie_index, mask, number)
+
+    return _shared(top_indices[:number], top_scores[:number])
+
+def _shared(*arrays):
+    """Make arrays read-only before sharing them through the result cache."""
+    for array in arrays:
+        array.setflags(write=False)
+    return arrays
+
+def movie_recommendation(movie_name, number=10, movie_index=None, filters=None):
+    columns = get_model()['columns']
+    
+    movie_index = resolve_movie(movie_name, movie_index)
+    if movie_index is None:
+        return {}
+    
+    rows, scores = similar_movies(movie_index, number, filters)
+    with metrics.stage('format'):
+        return _recommendation_rows(columns, rows)
+
+def _recommendation_rows(columns, rows):
+    """Display rows of the index page, gathering the fields of all movies at once."""
+    return [
+        list(movie)
+        for movie in zip(
+            columns['title'][rows].tolist(),
+            columns['genres'][rows].tolist(),
+            columns['overview'][rows].tolist(),
+            columns['formatted_date'][rows].tolist(),
+            columns['rating'][rows].tolist(),
+            columns['poster_path'][rows].tolist(),
+            rows.tolist(),  # Add the dataframe index
+        )
+    ]
+
+def recommendations_for(movie_name, number=10, movie_index=None, filters=None, cancel=None):
+    """
+    JSON-ready variant of movie_recommendation.
+    Returns {'movie_index': row, 'recommendations': [...]}, movie_index None when not found.
+    """
+    movie_index = resolve_movie(movie_name, movie_index, cancel)
+    if movie_index is None:
+        return {'movie_index': None, 'recommendations': []}
+    check_cancelled(cancel)
+    rows, scores = similar_movies(movie_index, number, filters)
+    with metrics.stage('format'):
+        recommendations = _recommendation_dicts(get_model()['columns'], rows, scores)
+    return {'movie_index': movie_index, 'recommendations': recommendations}
+
+def _term_index(model):
+    """Inverted index of the model, built on first use for artifacts stored without one."""
+    if model.get('term_index') is None:
+        with _filters_lock:
+            if model.get('term_index') is None:
+                model['term_index'] = TermIndex.from_features(model['features'])
+    return model['term_index']
+
+def search_descriptions(description, number=10, filters=None):
+    """
+    Rows and scores of the movies best matching a free-text description
+    such as "heist thriller with a twist ending", best first. The text is
+    vectorized with the vocabulary and IDF weights of the build and scored
+    through the inverted index (see TermIndex); words outside the
+    vocabulary are ignored, so both arrays are empty when none is known.
+    """
+    model = get_model()
+    if model.get('vectorizer') is None or (model.get('term_index') is None and model.get('features') is None):
+        raise RuntimeError(
+            "The loaded artifact has no vectorizer or feature matrix. "
+            "Please rerun 'python recommendation/preprocess_data.py'."
+        )
+    description = ' '.join(description.lower().split())
+    filters = CatalogFilters.normalize(filters) if filters else {}
+    key = ('describe', _artifact_version(model), description, int(number), tuple(sorted(filters.items())))
+    with metrics.stage('text_search'):
+        return _result_cache.get_or_compute(key, lambda: _search_descriptions(model, description, number, filters))
+
+def _search_descriptions(model, description, number, filters):
+    query_vector = model['vectorizer'].transform([description])
+    mask = _catalog_filters(model).mask(filters) if filters else None
+    rows, scores = _term_index(model).search(query_vector, number, mask)
+    # Shared through the result cache
+    rows.setflags(write=False)
+    scores.setflags(write=False)
+    return rows, scores
+
+def description_recommendation(description, number=10, filters=None):
+    """Index page rows (see movie_recommendation) of the movies matching a description."""
+    rows, scores = search_descriptions(description, number, filters)
+    with metrics.stage('format'):
+        return _recommendation_rows(get_model()['columns'], rows)
+
+def descriptions_for(description, number=10, filters=None):
+    """JSON-ready variant of description_recommendation: {'recommendations': [...]}"""
+    rows, scores = search_descriptions(description, number, filters)
+    with metrics.stage('format'):
+        return {'recommendations': _recommendation_dicts(get_model()['columns'], rows, scores)}
+
+def _validate_indices(title_index, movie_indices):
+    """
+    Split movie indices into valid catalog rows and rejected values. Only
+    integers are indices: bools, floats and strings are rejected rather
+    than coerced.
+    """
+    rows = []
+    invalid = []
+    for movie_index in movie_indices:
+        is_integer = isinstance(movie_index, (int, np.integer)) and not isinstance(movie_index, bool)
+        if is_integer and title_index.is_valid_row(int(movie_index)):
+            rows.append(int(movie_index))
         else:
-            formatted_date = movie['release_date']
-        
-        recommendations.append([
-            movie['title'],
-            movie['genres'],
-            movie['overview'],
-            formatted_date,
-            rating,
-            movie['poster_path'],
-            int(index)  # Add the dataframe index
-        ])
-        count += 1
-
-    return recommendations
\ No newline at end of file
+            invalid.append(movie_index)
+    return rows, invalid
+
+def _recommendation_dicts(columns, rows, scores):
+    """JSON-ready recommendations for the given rows, gathering each field once."""
+    rows = np.asarray(rows, dtype=np.int64)
+    fields = zip(
+        rows.tolist(),
+        columns['title'][rows].tolist(),
+        columns['full_title'][rows].tolist(),
+        columns['genres'][rows].tolist(),
+        columns['formatted_date'][rows].tolist(),
+        columns['rating'][rows].tolist(),
+        columns['poster_path'][rows].tolist(),
+        np.round(np.asarray(scores, dtype=np.float64), 4).tolist(),
+    )
+    return [
+        {
+            'index': index,
+            'title': title,
+            'full_title': full_title,
+            'genres': genres,
+            'release_date': release_date,
+            'rating': rating,
+            'poster_path': poster_path,
+            'score': score,
+        }
+        for index, title, full_title, genres, release_date, rating, poster_path, score in fields
+    ]
+
+def batch_recommendations(movie_indices, number=10):
+    """
+    Recommendations for many movies in one call, for offline consumers.
+    All neighbor lists are gathered at once from the top-k table instead of
+    resolving each movie through movie_recommendation. Seeds whose stored
+    list is shorter than number are scored on demand; artifacts that can't
+    score on demand raise ValueError when number exceeds their top_k.
+    Returns {'results': {movie_index: [recommendation, ...]}, 'invalid': [...]}
+    """
+    model = get_model()
+    similarity = model['similarity']
+
+    seeds, invalid = _validate_indices(model['title_index'], movie_indices)
+    seeds = np.unique(np.asarray(seeds, dtype=np.int64))
+    check_number(model, number)
+    if isinstance(similarity, NeighborTable):
+        neighbors, scores, counts = similarity.gather(seeds, number)
+        if _can_score_on_demand(model):
+            # Stored lists stop at top_k, score the seeds they are too short for on demand
+            for position in np.flatnonzero(counts < number).tolist():
+                top_indices, top_scores = _score_on_demand(model, int(seeds[position]), None, number)
+                neighbors[position, :len(top_indices)] = top_indices
+                scores[position, :len(top_scores)] = top_scores
+                counts[position] = len(top_indices)
+    else:
+        # Legacy format: full similarity matrix
+        seed_scores = np.asarray(similarity[seeds], dtype=np.float32).reshape(len(seeds), -1)
+        neighbors = np.argsort(-seed_scores, axis=1, kind='stable')[:, :number]
+        scores = np.take_along_axis(seed_scores, neighbors, axis=1)
+        counts = np.full(len(seeds), neighbors.shape[1])
+
+    # Gather every display field once for all seeds, then split per seed
+    valid = np.arange(neighbors.shape[1]) < counts[:, None]
+    recommendations = _recommendation_dicts(model['columns'], neighbors[valid], scores[valid])
+
+    results = {}
+    start = 0
+    for seed, count in zip(seeds.tolist(), counts.tolist()):
+        results[seed] = recommendations[start:start + count]
+        start += count
+
+    return {'results': results, 'invalid': invalid}
+
+def _stored_top_k(model):
+    """Longest neighbor list stored in the artifact."""
+    top_k = model['manifest'].get('build', {}).get('top_k')
+    if top_k is None:
+        top_k = int(np.diff(model['similarity'].offsets).max(initial=0))
+    return top_k
+
+def _top_k(scores, number):
+    """
+    Rows of the `number` highest scores, best first, ties in row order,
+    so the top rows for a number are the first ones for any larger number.
+    """
+    number = min(number, len(scores))
+    if number <= 0:
+        return np.empty(0, dtype=np.int64)
+    # Every row tied with the number-th best score, then the first of them by row
+    threshold = np.partition(scores, len(scores) - number)[len(scores) - number]
+    top = np.flatnonzero(scores >= threshold)
+    return top[np.lexsort((top, -scores[top]))][:number]
+
+# Catalogs with at least this many rows are scored in parallel row chunks;
+# scipy's sparse kernels release the GIL so threads use separate cores
+PARALLEL_SCORING_MIN_ROWS = 200000
+_scoring_pool = None
+_scoring_lock = threading.Lock()
+
+def _row_chunks(features, n_chunks):
+    """Split a CSR matrix into row blocks that share its data arrays."""
+    bounds = np.linspace(0, features.shape[0], n_chunks + 1).astype(np.int64)
+    chunks = []
+    for start, end in zip(bounds[:-1], bounds[1:]):
+        lo, hi = features.indptr[start], features.indptr[end]
+        chunks.append(sparse.csr_matrix(
+            (features.data[lo:hi], features.indices[lo:hi], features.indptr[start:end + 1] - lo),
+            shape=(end - start, features.shape[1]),
+            copy=False,
+        ))
+    return chunks
+
+def _score_catalog(model, vector, name='features'):
+    """Scores of every catalog row against a dense vector in the space of the model's `name` matrix."""
+    global _scoring_pool
+    features = model[name]
+    workers = min(os.cpu_count() or 1, 8)
+    if features.shape[0] < PARALLEL_SCORING_MIN_ROWS or workers < 2:
+        return features @ vector
+
+    chunks_key = f'{name}_chunks'
+    if chunks_key not in model or _scoring_pool is None:
+        # Concurrent first requests must not each start a pool
+        with _scoring_lock:
+            if chunks_key not in model:
+                model[chunks_key] = _row_chunks(features, workers)
+            if _scoring_pool is None:
+                _scoring_pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='recommendation-scoring')
+    return np.concatenate(list(_scoring_pool.map(lambda chunk: chunk @ vector, model[chunks_key])))
+
+# Embedding rows converted to float32 at a time, bounds the scratch memory
+# of embedding_scores to a few megabytes whatever the catalog size
+EMBEDDING_BLOCK_ROWS = 16384
+
+def _embedding(model, rows):
+    """Unit-length sum of the dense embeddings of the given rows, as float32."""
+    rows = np.asarray(rows, dtype=np.int64)
+    vectors = np.asarray(model['embeddings'][rows], dtype=np.float32)
+    if model.get('embedding_scales') is not None:
+        vectors *= np.asarray(model['embedding_scales'][rows])[:, None]
+    vector = vectors.sum(axis=0)
+    norm = np.linalg.norm(vector)
+    return vector / norm if norm > 0 else vector
+
+def embedding_scores(model, vector):
+    """
+    Approximate cosine similarity of every catalog row to a unit query
+    embedding, one BLAS matrix-vector product per block of rows.
+    """
+    embeddings = model.get('embeddings')
+    if embeddings is None:
+        raise RuntimeError(
+            "The loaded artifact has no embeddings. "
+            "Please rerun 'python recommendation/preprocess_data.py' with --embedding-dim above 0."
+        )
+    vector = np.asarray(vector, dtype=np.float32)
+    scores = np.empty(len(embeddings), dtype=np.float32)
+    for start in range(0, len(embeddings), EMBEDDING_BLOCK_ROWS):
+        block = embeddings[start:start + EMBEDDING_BLOCK_ROWS]
+        np.matmul(block.astype(np.float32), vector, out=scores[start:start + len(block)])
+    if model.get('embedding_scales') is not None:
+        scores *= model['embedding_scales']
+    return scores
+
+def profile_recommendation(movie_indices, number=10):
+    """
+    Recommendations for a set of liked movies. Their TF-IDF vectors are
+    summed into one profile and the whole catalog is ranked against it with
+    a single sparse matrix-vector product, excluding the liked movies.
+    Artifacts without a feature matrix use the dense embeddings instead.
+    Returns {'recommendations': [...], 'invalid': [...]}
+    """
+    model = get_model()
+    features = model.get('features')
+    if not _can_score_on_demand(model):
+        raise RuntimeError(
+            "The loaded artifact has neither a feature matrix nor embeddings. "
+            "Please rerun 'python recommendation/preprocess_data.py'."
+        )
+
+    seeds, invalid = _validate_indices(model['title_index'], movie_indices)
+    seeds = np.unique(np.asarray(seeds, dtype=np.int64))
+    if len(seeds) == 0:
+        return {'recommendations': [], 'invalid': invalid}
+
+    if features is None:
+        scores = embedding_scores(model, _embedding(model, seeds))
+    else:
+        # Rows are L2-normalized, so normalizing the summed profile makes the
+        # scores cosine similarities
+        profile = np.asarray(features[seeds].sum(axis=0), dtype=np.float32).ravel()
+        norm = np.linalg.norm(profile)
+        if norm > 0:
+            profile /= norm
+        scores = _score_catalog(model, profile)
+    scores[seeds] = -np.inf
+    rows = _top_k(scores, number)
+    return {
+        'recommendations': _recommendation_dicts(model['columns'], rows, scores[rows]),
+        'invalid': invalid,
+    }
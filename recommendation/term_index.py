@@ -0,0 +1,58 @@
+import numpy as np
+from scipy import sparse
+
+
+class TermIndex:
+    """
+    Inverted index of the TF-IDF matrix: for each vocabulary term, the
+    movies whose features contain it with their weights, i.e. the rows of
+    the transposed matrix. Scoring a query only touches the postings of
+    its terms, so its cost depends on how common the terms are rather than
+    on the catalog size.
+    """
+
+    def __init__(self, postings):
+        # Plain array views, slicing memmaps term by term is slower
+        self.indptr = np.asarray(postings.indptr)
+        self.indices = np.asarray(postings.indices)
+        self.data = np.asarray(postings.data)
+        self.n_terms, self.n_movies = postings.shape
+
+    @classmethod
+    def from_features(cls, features):
+        return cls(sparse.csr_matrix(features, dtype=np.float32).T.tocsr())
+
+    def __len__(self):
+        return self.n_terms
+
+    def search(self, query_vector, number, mask=None):
+        """
+        Rows and cosine scores of the `number` best matches of an
+        L2-normalized query vector (a 1 x n_terms sparse row from the
+        vectorizer), best first, ties in catalog order. Only movies sharing
+        a term with the query and passing the optional mask are returned.
+        """
+        query_vector = sparse.csr_matrix(query_vector)
+        terms = query_vector.indices.astype(np.int64)
+        if len(terms) == 0 or number <= 0:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+
+        starts, ends = self.indptr[terms], self.indptr[terms + 1]
+        rows = np.concatenate([self.indices[start:end] for start, end in zip(starts, ends)])
+        weights = np.concatenate([
+            self.data[start:end] * weight for start, end, weight in zip(starts, ends, query_vector.data)
+        ])
+
+        # Sum the weights per movie, over the movies of the postings only
+        candidates, position = np.unique(rows, return_inverse=True)
+        scores = np.bincount(position, weights=weights).astype(np.float32)
+        if mask is not None:
+            keep = mask[candidates]
+            candidates, scores = candidates[keep], scores[keep]
+
+        number = min(number, len(scores))
+        if number == 0:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+        top = np.argpartition(-scores, number - 1)[:number]
+        top = top[np.lexsort((candidates[top], -scores[top]))]
+        return candidates[top].astype(np.int64), scores[top]
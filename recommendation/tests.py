@@ -1,3 +1,495 @@
-from django.test import TestCase
+import os
+import shutil
+import stat
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from unittest.mock import patch
 
-# Create your tests here.
+import numpy as np
+import pandas as pd
+from django.test import RequestFactory, SimpleTestCase, override_settings
+
+from benchmarks.generate_catalog import generate_catalog
+
+from . import profiling, similarity
+from .artifact import load_artifact, save_artifact
+from .cache import ResultCache, estimate_size
+from .filters import CatalogFilters
+from .preprocess_data import batch_size_for_budget, exact_top_k, preprocess_data
+from .process_movies import process_movies
+from .title_index import TitleIndex
+
+N_MOVIES = 400
+
+# The index page renders {% static %} URLs, which the manifest storage
+# only knows after collectstatic
+PLAIN_STATIC_STORAGE = {
+    'default': {'BACKEND': 'django.core.files.storage.FileSystemStorage'},
+    'staticfiles': {'BACKEND': 'django.contrib.staticfiles.storage.StaticFilesStorage'},
+}
+
+_tmp_dir = None
+_csv_path = None
+_saved = None
+
+
+def setUpModule():
+    """Build a small synthetic artifact and point the request path at it."""
+    global _tmp_dir, _csv_path, _saved
+    _tmp_dir = tempfile.mkdtemp()
+    _csv_path = os.path.join(_tmp_dir, 'movies.csv')
+    catalog = generate_catalog(N_MOVIES)
+    # Exact duplicates, which autocomplete lists once
+    catalog = pd.concat([catalog, catalog.iloc[:8]], ignore_index=True)
+    catalog.index = pd.RangeIndex(1, len(catalog) + 1, name='index')
+    catalog.to_csv(_csv_path)
+    artifact_path = os.path.join(_tmp_dir, 'preprocessed')
+    preprocess_data(workers=1, recall_sample=0, embedding_dim=16, csv_path=_csv_path, artifact_path=artifact_path)
+    _saved = (similarity.artifact_path, similarity._model, similarity._field_weights)
+    similarity.artifact_path = artifact_path
+    similarity._model = None
+    _clear_caches()
+
+
+def tearDownModule():
+    similarity.artifact_path, similarity._model, similarity._field_weights = _saved
+    _clear_caches()
+    shutil.rmtree(_tmp_dir, ignore_errors=True)
+
+
+def _clear_caches():
+    similarity._result_cache.clear()
+    similarity._suggestion_cache.clear()
+
+
+class FieldWeightsTests(SimpleTestCase):
+    def setUp(self):
+        similarity.configure_field_weights('director=5,genres=2')
+        _clear_caches()
+
+    def tearDown(self):
+        similarity._field_weights = None
+        _clear_caches()
+
+    def test_ranking_does_not_depend_on_number(self):
+        for movie_index in (0, 57, 228):
+            indices, scores = similarity.similar_movies(movie_index, 60)
+            for number in (1, 10, 25):
+                top_indices, top_scores = similarity.similar_movies(movie_index, number)
+                self.assertEqual(list(top_indices), list(indices[:number]))
+                self.assertEqual(list(top_scores), list(scores[:number]))
+
+
+class BatchRecommendationTests(SimpleTestCase):
+    def test_number_above_top_k_is_scored_on_demand(self):
+        result = similarity.batch_recommendations([3, 41], 120)
+        for seed in (3, 41):
+            indices, scores = similarity.similar_movies(seed, 120)
+            self.assertGreater(len(indices), 50)
+            self.assertEqual([movie['index'] for movie in result['results'][seed]], list(indices))
+
+    def test_number_above_top_k_is_rejected_without_on_demand_scoring(self):
+        model = dict(similarity.get_model(), features=None, embeddings=None)
+        with patch.object(similarity, 'get_model', return_value=model):
+            response = self.client.post(
+                '/api/recommendations/batch', {'movie_indices': [3], 'number': 120}, content_type='application/json'
+            )
+            self.assertEqual(response.status_code, 400)
+            response = self.client.post(
+                '/api/recommendations/batch', {'movie_indices': [3], 'number': 50}, content_type='application/json'
+            )
+            self.assertEqual(len(response.json()['results']['3']), 50)
+
+    @override_settings(STORAGES=PLAIN_STATIC_STORAGE)
+    def test_single_movie_requests_agree_with_batches(self):
+        model = dict(similarity.get_model(), features=None, embeddings=None)
+        with patch.object(similarity, 'get_model', return_value=model):
+            _clear_caches()
+            response = self.client.get('/api/recommendations', {'movie_index': 3, 'number': 120})
+            self.assertEqual(response.status_code, 400)
+            self.assertIn('at most 50', response.json()['error'])
+            response = self.client.get('/', {'title': 'x', 'movie_index': 3, 'number': 120})
+            self.assertContains(response, 'at most 50', status_code=400)
+            response = self.client.get('/api/recommendations', {'movie_index': 3, 'number': 50})
+            self.assertEqual(len(response.json()['recommendations']), 50)
+        _clear_caches()
+
+
+class IndicesPayloadTests(SimpleTestCase):
+    def test_non_integer_indices_are_rejected(self):
+        for movie_indices in ([True], [1.7], [2.0], ['3'], [None], [3, False]):
+            for url in ('/api/recommendations/batch', '/api/recommendations/profile'):
+                response = self.client.post(url, {'movie_indices': movie_indices}, content_type='application/json')
+                self.assertEqual(response.status_code, 400, (url, movie_indices))
+
+    def test_non_integer_numbers_are_rejected(self):
+        for number in (True, False, 10.9, 10.0, '10', None):
+            for url in ('/api/recommendations/batch', '/api/recommendations/profile'):
+                payload = {'movie_indices': [3, 4]}
+                if number is not None:
+                    payload['number'] = number
+                response = self.client.post(url, payload, content_type='application/json')
+                self.assertEqual(response.status_code, 200 if number is None else 400, (url, number))
+
+    def test_library_callers_get_non_integers_back_as_invalid(self):
+        result = similarity.batch_recommendations([True, 1.7, np.int64(3), 4, -1], 5)
+        self.assertEqual(sorted(result['results']), [3, 4])
+        self.assertEqual(result['invalid'], [True, 1.7, -1])
+
+
+class BatchSizeTests(SimpleTestCase):
+    def test_every_worker_gets_batches(self):
+        self.assertEqual(batch_size_for_budget(100000, 4, 65536, n_rows=1000), 63)
+        self.assertEqual(batch_size_for_budget(100000, 1, 65536, n_rows=10), 3)
+
+    def test_batches_fit_the_budget(self):
+        # Sparse product, dense scores, negated copy and argpartition result
+        batch_size = batch_size_for_budget(100000, 2, 512)
+        self.assertLessEqual(batch_size * 100000 * 28 * 2, 512 * 1024 * 1024)
+        self.assertGreater((batch_size + 1) * 100000 * 28 * 2, 512 * 1024 * 1024)
+
+
+class ArtifactTests(SimpleTestCase):
+    def test_artifact_directory_is_readable_by_other_users(self):
+        mode = stat.S_IMODE(os.stat(similarity.artifact_path).st_mode)
+        umask = os.umask(0)
+        os.umask(umask)
+        self.assertEqual(mode, 0o755 & ~umask)
+
+    def test_title_index_is_memory_mapped(self):
+        title_index = load_artifact(similarity.artifact_path)['title_index']
+        for array in title_index.arrays().values():
+            self.assertIsInstance(array.base, np.memmap)
+        df = pd.read_csv(_csv_path)
+        rebuilt = TitleIndex(df['title'], df['release_date'])
+        for row in (0, 3, 399, 407):
+            title = df['title'][row]
+            self.assertEqual(title_index.lookup(title), rebuilt.lookup(title))
+            year = str(df['release_date'][row])[:4]
+            self.assertEqual(df['title'][title_index.resolve(title.upper(), year)], title)
+        self.assertIsNone(title_index.resolve('no such movie'))
+
+    def test_rebuilds_swap_a_symlink_and_keep_the_previous_version(self):
+        artifact = load_artifact(similarity.artifact_path)
+        table = artifact['similarity']
+        path = os.path.join(_tmp_dir, 'swapped')
+        # A directory from before versioning is replaced as well
+        shutil.copytree(similarity.artifact_path, path)
+        targets = []
+        for _ in range(3):
+            save_artifact(path, artifact['df'], table.offsets, table.neighbors, table.scores, artifact['title_index'])
+            self.assertTrue(os.path.islink(path))
+            targets.append(os.path.realpath(path))
+            self.assertEqual(len(load_artifact(path)['title_index']), len(table))
+        self.assertEqual(len(set(targets)), 3)
+        versions = os.path.dirname(targets[-1])
+        self.assertEqual(sorted(os.listdir(versions)), sorted(map(os.path.basename, targets[-2:])))
+
+    def test_missing_artifact_is_not_built_by_the_web_worker(self):
+        missing = os.path.join(_tmp_dir, 'missing')
+        with (
+            patch.object(similarity, 'artifact_path', missing),
+            patch.object(similarity, 'preprocessed_path', missing + '.pkl'),
+            patch('recommendation.pipeline.run_pipeline') as run_pipeline,
+            self.assertRaisesRegex(FileNotFoundError, 'pipeline.py'),
+        ):
+            similarity._load_model()
+        run_pipeline.assert_not_called()
+
+
+class ResultCacheTests(SimpleTestCase):
+    def test_cache_is_bounded_by_bytes(self):
+        value = np.zeros(1000, dtype=np.float32)
+        entry_size = estimate_size(0) + estimate_size(value)
+        cache = ResultCache(entry_size * 3)
+        for key in range(5):
+            cache.get_or_compute(key, lambda: value)
+        self.assertEqual(cache.stats()['entries'], 3)
+        self.assertLessEqual(cache.stats()['bytes'], entry_size * 3)
+        # Least recently used entries went first
+        self.assertIs(cache.get_or_compute(4, lambda: None), value)
+        self.assertIsNone(cache.get_or_compute(0, lambda: None))
+
+    def test_oversized_values_are_not_kept(self):
+        cache = ResultCache(100)
+        self.assertEqual(cache.get_or_compute('key', lambda: 'x' * 1000), 'x' * 1000)
+        self.assertEqual(cache.stats()['entries'], 0)
+
+
+class HttpCachingTests(SimpleTestCase):
+    def test_responses_revalidate_against_the_artifact_version(self):
+        response = self.client.get('/api/recommendations', {'movie_index': 5, 'number': 5})
+        self.assertEqual(response['Cache-Control'], 'public, no-cache')
+        version = similarity.model_status()['artifact_version']
+        self.assertTrue(response['ETag'].startswith(f'"{version}-'))
+        response = self.client.get(
+            '/api/recommendations', {'movie_index': 5, 'number': 5}, HTTP_IF_NONE_MATCH=response['ETag']
+        )
+        self.assertEqual(response.status_code, 304)
+
+
+class TitleSearchTests(SimpleTestCase):
+    QUERIES = ['a', 'e', 'ra', 'the', 'ka ', 'sor', 'mira', 'xyz', 'é']
+
+    def test_iter_contains_matches_a_full_scan(self):
+        title_index = similarity.get_model()['title_index']
+        titles = pd.read_csv(_csv_path)['title'].str.lower()
+        for query in self.QUERIES:
+            expected = np.flatnonzero(titles.str.contains(query, na=False, regex=False))
+            self.assertEqual(list(title_index.iter_contains(query)), expected.tolist(), query)
+
+    def test_short_queries_read_only_their_postings(self):
+        title_index = similarity.get_model()['title_index']
+        titles = pd.read_csv(_csv_path)['title'].str.lower()
+        for query in ('a', 'ra', 'q', '%'):
+            expected = np.flatnonzero(titles.str.contains(query, na=False, regex=False))
+            self.assertEqual(list(title_index._candidates(query)), expected.tolist(), query)
+
+    def test_suggestions_match_the_scan_with_duplicates_removed(self):
+        df = pd.read_csv(_csv_path)
+        for query in self.QUERIES:
+            for limit in (5, 50):
+                matches = df[df['title'].str.lower().str.contains(query, na=False, regex=False)]
+                expected = []
+                seen = set()
+                for position, row in zip(np.flatnonzero(df.index.isin(matches.index)), matches.itertuples()):
+                    if len(expected) >= limit:
+                        break
+                    key = (row.title.lower(), str(row.release_date))
+                    if key not in seen:
+                        seen.add(key)
+                        expected.append(position)
+                if not expected:
+                    continue
+                suggestions = similarity.get_movie_suggestions(query, limit)
+                self.assertEqual([movie['index'] for movie in suggestions], expected, (query, limit))
+
+
+class ResultCacheCoalescingTests(SimpleTestCase):
+    def test_concurrent_misses_compute_once(self):
+        cache = ResultCache(1024 * 1024)
+        release = threading.Event()
+        calls = []
+
+        def compute():
+            calls.append(1)
+            release.wait(5)
+            return object()
+
+        results = []
+        threads = [threading.Thread(target=lambda: results.append(cache.get_or_compute('key', compute))) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        # Let every thread reach the cache before the first one finishes
+        time.sleep(0.1)
+        release.set()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(len(results), 8)
+        self.assertTrue(all(result is results[0] for result in results))
+        self.assertEqual((cache.hits, cache.misses), (7, 1))
+
+    def test_failures_are_raised_to_every_caller_and_not_cached(self):
+        cache = ResultCache(1024 * 1024)
+        release = threading.Event()
+        errors = []
+
+        def compute():
+            release.wait(5)
+            raise KeyError('boom')
+
+        def call():
+            try:
+                cache.get_or_compute('key', compute)
+            except KeyError as e:
+                errors.append(e)
+
+        threads = [threading.Thread(target=call) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        time.sleep(0.1)
+        release.set()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(len(errors), 4)
+        self.assertEqual(cache.get_or_compute('key', lambda: 'value'), 'value')
+
+
+class IncrementalBuildTests(SimpleTestCase):
+    def test_incremental_update_matches_a_full_rebuild(self):
+        artifact_path = os.path.join(_tmp_dir, 'incremental')
+        shutil.copytree(similarity.artifact_path, artifact_path)
+        df = pd.read_csv(_csv_path, index_col='index')
+        # Changed, removed and added movies, reusing words the vectorizer knows
+        df.loc[df.index[10:15], 'overview'] = df['overview'].iloc[100:105].to_numpy()
+        df.loc[df.index[40], 'director'] = df['director'].iloc[41]
+        df = df.drop(df.index[20:23])
+        added = df.iloc[30:35].copy()
+        added['title'] = 'Return of ' + added['title']
+        df = pd.concat([df, added])
+        df.index = pd.RangeIndex(1, len(df) + 1, name='index')
+        csv_path = os.path.join(_tmp_dir, 'incremental.csv')
+        df.to_csv(csv_path)
+
+        preprocess_data(workers=1, recall_sample=0, embedding_dim=0, with_field_features=False,
+                        incremental=True, csv_path=csv_path, artifact_path=artifact_path)
+        artifact = load_artifact(artifact_path)
+        self.assertGreater(artifact['manifest']['build']['incremental_rows'], 0)
+
+        table = artifact['similarity']
+        offsets, neighbors, scores = exact_top_k(artifact['features'], artifact['manifest']['build']['top_k'])
+        self.assertEqual(np.asarray(table.offsets).tolist(), offsets.tolist())
+        for row in range(len(df)):
+            start, end = offsets[row], offsets[row + 1]
+            stored_neighbors, stored_scores = table[row]
+            np.testing.assert_allclose(stored_scores, scores[start:end], rtol=1e-5, atol=1e-6)
+            # Ties at the cut-off may keep either movie
+            above = scores[start:end] > scores[end - 1] + 1e-6
+            self.assertEqual(
+                set(np.asarray(stored_neighbors)[above].tolist()), set(neighbors[start:end][above].tolist()), row
+            )
+
+
+class StreamingProcessingTests(SimpleTestCase):
+    def test_streaming_output_is_identical_to_in_memory_output(self):
+        rng = np.random.default_rng(1)
+        raw = generate_catalog(3000, seed=1).reset_index(drop=True)
+        raw['popularity'] = np.round(rng.exponential(3.0, len(raw)), 3)
+        raw.loc[rng.random(len(raw)) < 0.05, 'popularity'] = np.nan
+        raw['runtime'] = rng.integers(20, 200, len(raw))
+        raw['imdb_id'] = [f'tt{i:07d}' for i in range(len(raw))]
+        # Duplicates within and across chunks
+        raw = pd.concat([raw, raw.sample(300, random_state=1)], ignore_index=True).sample(frac=1, random_state=2)
+        raw_path = os.path.join(_tmp_dir, 'raw.csv')
+        raw.to_csv(raw_path, index=False)
+
+        in_memory_path = os.path.join(_tmp_dir, 'in_memory.csv')
+        streaming_path = os.path.join(_tmp_dir, 'streaming.csv')
+        self.assertTrue(process_movies(raw_path, in_memory_path))
+        self.assertTrue(process_movies(raw_path, streaming_path, streaming=True, chunksize=257))
+        with open(in_memory_path, 'rb') as a, open(streaming_path, 'rb') as b:
+            in_memory = a.read()
+            self.assertEqual(in_memory, b.read())
+        self.assertGreater(in_memory.count(b'\n'), 500)
+
+
+class CatalogFiltersTests(SimpleTestCase):
+    def test_masks_match_row_by_row_checks(self):
+        columns = similarity.get_model()['columns']
+        catalog_filters = CatalogFilters(columns)
+        languages = [str(language) for language in columns['original_language'][:].tolist()]
+        genres = [set(str(value).lower().split()) for value in columns['genres'][:].tolist()]
+        years = [int(year) if str(year).isdigit() else 0 for year in columns['year'][:].tolist()]
+        ratings = np.asarray(columns['rating'], dtype=np.float64)
+
+        cases = [
+            ({'language': 'hi'}, lambda i: languages[i] == 'hi'),
+            ({'language': 'EN '}, lambda i: languages[i] == 'en'),
+            ({'language': 'xx'}, lambda i: False),
+            ({'genres': 'drama'}, lambda i: 'drama' in genres[i]),
+            ({'genres': ['Action', 'thriller']}, lambda i: {'action', 'thriller'} <= genres[i]),
+            ({'genres': 'not-a-genre'}, lambda i: False),
+            ({'year_min': 1990}, lambda i: years[i] >= 1990),
+            ({'year_max': 1980}, lambda i: 0 < years[i] <= 1980),
+            ({'min_rating': 7.5}, lambda i: ratings[i] >= 7.5),
+            ({'language': 'en', 'genres': 'comedy', 'year_min': 1970, 'year_max': 2010, 'min_rating': 5},
+             lambda i: languages[i] == 'en' and 'comedy' in genres[i] and 1970 <= years[i] <= 2010 and ratings[i] >= 5),
+        ]
+        for filters, passes in cases:
+            expected = [passes(i) for i in range(len(languages))]
+            self.assertEqual(catalog_filters.mask(filters).tolist(), expected, filters)
+            # Served from the mask cache the second time
+            self.assertIs(catalog_filters.mask(filters), catalog_filters.mask(dict(filters)))
+
+    def test_non_finite_ratings_are_rejected(self):
+        for value in ('nan', 'inf', '-inf', 'NaN'):
+            with self.assertRaises(ValueError):
+                CatalogFilters.normalize({'min_rating': value})
+            response = self.client.get('/api/recommendations', {'movie_index': 5, 'min_rating': value})
+            self.assertEqual(response.status_code, 400, value)
+
+    def test_no_filters_give_no_mask(self):
+        catalog_filters = CatalogFilters(similarity.get_model()['columns'])
+        self.assertIsNone(catalog_filters.mask({}))
+        self.assertIsNone(catalog_filters.mask({'language': '', 'genres': []}))
+
+
+class ProfilingTests(SimpleTestCase):
+    def tearDown(self):
+        profiling.configure(False)
+
+    def should_profile(self, header=None, **settings):
+        profiling.configure(True, **settings)
+        headers = {} if header is None else {'HTTP_X_PROFILE': header}
+        return profiling._should_profile(RequestFactory().get('/', **headers))
+
+    def test_header_needs_the_token(self):
+        self.assertTrue(self.should_profile('secret', token='secret'))
+        self.assertFalse(self.should_profile('guess', token='secret'))
+        self.assertFalse(self.should_profile('guess', token='secret', debug=True))
+
+    def test_header_without_a_token_only_counts_in_debug(self):
+        self.assertFalse(self.should_profile('1'))
+        self.assertTrue(self.should_profile('1', debug=True))
+        self.assertFalse(self.should_profile(debug=True))
+
+
+class LegacyArtifactTests(SimpleTestCase):
+    def setUp(self):
+        # An artifact from before the feature matrix, embeddings and vectorizer were stored
+        model = dict(similarity.get_model(), features=None, embeddings=None, vectorizer=None, term_index=None)
+        patcher = patch.object(similarity, 'get_model', return_value=model)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_profile_recommendations_ask_for_a_rebuild(self):
+        response = self.client.post(
+            '/api/recommendations/profile', {'movie_indices': [3, 4]}, content_type='application/json'
+        )
+        self.assertEqual(response.status_code, 503)
+        self.assertIn('rebuilt', response.json()['error'])
+
+    @override_settings(STORAGES=PLAIN_STATIC_STORAGE)
+    def test_index_page_description_asks_for_a_rebuild(self):
+        response = self.client.get('/', {'describe': 'space war'})
+        self.assertEqual(response.status_code, 503)
+        self.assertContains(response, 'rebuilt', status_code=503)
+
+    def test_description_search_asks_for_a_rebuild(self):
+        response = self.client.get('/api/search', {'q': 'heist thriller'})
+        self.assertEqual(response.status_code, 503)
+        self.assertIn('rebuilt', response.json()['error'])
+
+
+class ParallelScoringTests(SimpleTestCase):
+    def test_concurrent_first_requests_share_one_pool(self):
+        model = dict(similarity.get_model())
+        vector = model['features'][0].toarray().ravel()
+        pools = []
+
+        def executor(*args, **kwargs):
+            pools.append(ThreadPoolExecutor(*args, **kwargs))
+            return pools[-1]
+
+        with (
+            patch.object(similarity, 'PARALLEL_SCORING_MIN_ROWS', 1),
+            patch.object(similarity, '_scoring_pool', None),
+            patch.object(similarity, 'ThreadPoolExecutor', executor),
+            patch('os.cpu_count', return_value=4),
+        ):
+            threads = [threading.Thread(target=similarity._score_catalog, args=(model, vector)) for _ in range(16)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+            scores = similarity._score_catalog(model, vector)
+        for pool in pools:
+            pool.shutdown()
+
+        self.assertEqual(len(pools), 1)
+        np.testing.assert_allclose(scores, model['features'] @ vector, rtol=1e-6)
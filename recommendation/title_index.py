@@ -0,0 +1,288 @@
+import difflib
+import hashlib
+import heapq
+import numpy as np
+from .artifact import StringColumn
+from .offload import check_cancelled
+
+# Popcount of every byte value, used to count shared bits of character masks
+_POPCOUNT = np.array([bin(i).count('1') for i in range(256)], dtype=np.uint8)
+
+
+def _char_mask(text):
+    """64-bit signature with one bit set per (hashed) character of the text."""
+    mask = 0
+    for char in set(text):
+        mask |= 1 << (ord(char) & 63)
+    return mask
+
+
+def _hash(text):
+    """64-bit hash of a string, stable across processes unlike hash()."""
+    return int.from_bytes(hashlib.blake2b(text.encode('utf-8'), digest_size=8).digest(), 'little')
+
+
+def _year(release_date):
+    """Release year as a number, -1 when unknown."""
+    year = release_date[:4] if isinstance(release_date, str) else ''
+    return int(year) if len(year) == 4 and year.isascii() and year.isdigit() else -1
+
+
+def _grams(text, size):
+    """Distinct substrings of the given size."""
+    return {text[i:i + size] for i in range(len(text) - size + 1)}
+
+
+def _popcount(masks):
+    return _POPCOUNT[masks.view(np.uint8).reshape(-1, 8)].sum(axis=1, dtype=np.int64)
+
+
+class TitleIndex:
+    """
+    Lookup structures over lowercased movie titles: sorted title hashes
+    with their rows for exact resolution, and an index of the 1, 2 and 3
+    character grams of each title for autocomplete (a query of up to three
+    characters is answered by its own posting list) and trigram fuzzy
+    matching. Everything is a flat array, postings stored CSR-style (one
+    offsets array plus one flat array of row positions), so the index stays
+    compact on multi-million row catalogs and an artifact can memory-map it.
+    """
+
+    GRAM = 3
+    # Stop intersecting posting lists once the candidate set is this small,
+    # verifying a few rows directly is cheaper than another intersection
+    MIN_CANDIDATES = 256
+    # Latency budget of the fuzzy matcher: at most this many distinct titles
+    # are scored with difflib, gathered from at most this many postings
+    MAX_FUZZY_CANDIDATES = 200
+    MAX_FUZZY_POSTINGS = 200000
+    # Rows scanned between checks of the cancel event of async requests
+    CANCEL_CHECK_ROWS = 4096
+
+    # Arrays the index is made of, saved to and memory-mapped from the artifact
+    ARRAYS = (
+        'title_data', 'title_offsets', 'title_hashes', 'title_rows', 'years',
+        'gram_hashes', 'gram_offsets', 'gram_rows', 'lengths', 'gram_counts', 'char_masks',
+    )
+
+    def __init__(self, titles, release_dates=None):
+        titles = [title.lower() if isinstance(title, str) else '' for title in titles]
+        if release_dates is None:
+            release_dates = [''] * len(titles)
+        arrays = {}
+
+        column = StringColumn.from_values(titles)
+        arrays['title_data'], arrays['title_offsets'] = column.data, column.offsets
+        # Title hashes sorted, with the rows of each hash in catalog order
+        hashes = np.fromiter(map(_hash, titles), dtype=np.uint64, count=len(titles))
+        order = np.argsort(hashes, kind='stable')
+        arrays['title_hashes'] = hashes[order]
+        arrays['title_rows'] = order.astype(np.int32)
+        arrays['years'] = np.array([_year(release_date) for release_date in release_dates], dtype=np.int16)
+
+        # Postings of every 1, 2 and 3 character gram, so queries shorter
+        # than a trigram are answered from their own posting list as well
+        gram_slots = {}
+        gram_ids = []
+        gram_rows = []
+        gram_counts = []
+        for row, title in enumerate(titles):
+            for size in range(1, self.GRAM + 1):
+                grams = _grams(title, size)
+                for gram in grams:
+                    gram_ids.append(gram_slots.setdefault(gram, len(gram_slots)))
+                    gram_rows.append(row)
+            gram_counts.append(len(grams))
+
+        # Number the grams in the order of their hashes, for binary search
+        slot_hashes = np.fromiter(map(_hash, gram_slots), dtype=np.uint64, count=len(gram_slots))
+        slot_order = np.argsort(slot_hashes)
+        ranks = np.empty(len(gram_slots), dtype=np.int32)
+        ranks[slot_order] = np.arange(len(gram_slots), dtype=np.int32)
+        gram_ids = ranks[np.asarray(gram_ids, dtype=np.int64)]
+        # Stable sort keeps the rows of each posting list in catalog order
+        order = np.argsort(gram_ids, kind='stable')
+        arrays['gram_hashes'] = slot_hashes[slot_order]
+        arrays['gram_rows'] = np.asarray(gram_rows, dtype=np.int32)[order]
+        arrays['gram_offsets'] = np.zeros(len(gram_slots) + 1, dtype=np.int64)
+        np.cumsum(np.bincount(gram_ids, minlength=len(gram_slots)), out=arrays['gram_offsets'][1:])
+
+        # Per-row statistics used to rank fuzzy candidates without difflib
+        arrays['lengths'] = np.fromiter(map(len, titles), dtype=np.int32, count=len(titles))
+        # Distinct trigrams of each row
+        arrays['gram_counts'] = np.asarray(gram_counts, dtype=np.int32)
+        arrays['char_masks'] = np.fromiter(map(_char_mask, titles), dtype=np.uint64, count=len(titles))
+        self._open(arrays)
+
+    @classmethod
+    def from_arrays(cls, arrays):
+        """Index over arrays saved from arrays(), typically memory-mapped."""
+        index = cls.__new__(cls)
+        index._open(arrays)
+        return index
+
+    def _open(self, arrays):
+        for name in self.ARRAYS:
+            setattr(self, f'_{name}', arrays[name])
+        self.titles = StringColumn(self._title_data, self._title_offsets)
+
+    def arrays(self):
+        return {name: getattr(self, f'_{name}') for name in self.ARRAYS}
+
+    def __len__(self):
+        return len(self.titles)
+
+    def is_valid_row(self, row):
+        return 0 <= row < len(self.titles)
+
+    def lookup(self, title):
+        """All (year, row) entries for a title, case insensitive, in catalog order."""
+        title = title.lower()
+        key = np.uint64(_hash(title))
+        start = np.searchsorted(self._title_hashes, key, side='left')
+        end = np.searchsorted(self._title_hashes, key, side='right')
+        return [
+            (f'{self._years[row]:04d}' if self._years[row] >= 0 else '', row)
+            for row in self._title_rows[start:end].tolist()
+            if self.titles[row] == title
+        ]
+
+    def resolve(self, title, year=None):
+        """
+        Row of the first movie with the given title, preferring one released
+        in the given year. Returns None when the title is unknown.
+        """
+        entries = self.lookup(title)
+        if not entries:
+            return None
+        if year:
+            for entry_year, row in entries:
+                if entry_year == year:
+                    return row
+        return entries[0][1]
+
+    def rows_for_titles(self, titles):
+        """Rows of every movie whose title is in titles, in catalog order."""
+        return sorted(row for title in set(titles) for year, row in self.lookup(title))
+
+    def _postings(self, gram):
+        key = np.uint64(_hash(gram))
+        slot = np.searchsorted(self._gram_hashes, key)
+        if slot == len(self._gram_hashes) or self._gram_hashes[slot] != key:
+            return None
+        return self._gram_rows[self._gram_offsets[slot]:self._gram_offsets[slot + 1]]
+
+    def _candidates(self, query):
+        """Rows that contain every trigram of the query, in catalog order."""
+        if not query:
+            return range(len(self.titles))
+        if len(query) <= self.GRAM:
+            # The query is a gram itself, its posting list is the exact answer
+            rows = self._postings(query)
+            return [] if rows is None else rows.tolist()
+
+        postings = []
+        for gram in _grams(query, self.GRAM):
+            rows = self._postings(gram)
+            if rows is None:
+                return []
+            postings.append(rows)
+
+        postings.sort(key=len)
+        candidates = postings[0]
+        for rows in postings[1:]:
+            if len(candidates) <= self.MIN_CANDIDATES:
+                break
+            candidates = np.intersect1d(candidates, rows, assume_unique=True)
+        return candidates.tolist()
+
+    def iter_contains(self, query, cancel=None):
+        """
+        Yield row positions whose lowercased title contains the query,
+        in the same order as a full-column str.contains scan
+        """
+        query = query.lower()
+        titles = self.titles
+        # The posting list of a query of up to a trigram needs no verification
+        exact = len(query) <= self.GRAM
+        for scanned, row in enumerate(self._candidates(query)):
+            if scanned % self.CANCEL_CHECK_ROWS == 0:
+                check_cancelled(cancel)
+            if exact or query in titles[row]:
+                yield row
+
+    def _fuzzy_candidates(self, query, cutoff):
+        """Rows most likely to be close matches, best first, within the latency budget."""
+        # difflib's ratio can only reach the cutoff for titles of comparable length
+        length = len(query)
+        min_length = length * cutoff / (2 - cutoff)
+        max_length = length * (2 - cutoff) / cutoff if cutoff > 0 else np.inf
+
+        grams = _grams(query, self.GRAM)
+        postings = sorted((rows for rows in map(self._postings, grams) if rows is not None), key=len)
+        kept = []
+        budget = self.MAX_FUZZY_POSTINGS
+        # Rare trigrams are the most selective, drop the most common ones past the budget
+        for rows in postings:
+            if kept and len(rows) > budget:
+                break
+            kept.append(rows)
+            budget -= len(rows)
+
+        if kept:
+            rows, shared = np.unique(np.concatenate(kept), return_counts=True)
+            fits = (self._lengths[rows] >= min_length) & (self._lengths[rows] <= max_length)
+            rows, shared = rows[fits], shared[fits]
+            # Dice coefficient over trigram sets
+            scores = 2 * shared / (len(grams) + self._gram_counts[rows])
+        else:
+            # No trigram in common (typo-heavy or very short query): rank every
+            # row by how many distinct characters it shares with the query
+            rows = np.flatnonzero((self._lengths >= min_length) & (self._lengths <= max_length))
+            query_mask = np.uint64(_char_mask(query))
+            masks = self._char_masks[rows]
+            shared = _popcount(masks & query_mask)
+            total = _popcount(np.array([query_mask], dtype=np.uint64))[0] + _popcount(masks)
+            scores = 2 * shared / np.maximum(total, 1)
+
+        # Oversample rows since duplicated titles collapse into one candidate
+        limit = self.MAX_FUZZY_CANDIDATES * 4
+        if len(rows) > limit:
+            top = np.argpartition(-scores, limit)[:limit]
+            rows, scores = rows[top], scores[top]
+        return rows[np.lexsort((rows, -scores))].tolist()
+
+    def close_matches(self, query, n=3, cutoff=0.6, cancel=None):
+        """
+        Drop-in replacement for difflib.get_close_matches over the lowercased
+        titles. Candidates come from the trigram postings (or character
+        overlap) and only the best few hundred are scored with difflib.
+        Returns distinct lowercased titles, best match first.
+        """
+        query = query.lower()
+        if not query or n <= 0:
+            return []
+
+        candidates = []
+        seen = set()
+        for row in self._fuzzy_candidates(query, cutoff):
+            title = self.titles[row]
+            if title not in seen:
+                seen.add(title)
+                candidates.append(title)
+                if len(candidates) >= self.MAX_FUZZY_CANDIDATES:
+                    break
+
+        # Same scoring as difflib.get_close_matches
+        matcher = difflib.SequenceMatcher()
+        matcher.set_seq2(query)
+        result = []
+        for title in candidates:
+            check_cancelled(cancel)
+            matcher.set_seq1(title)
+            if (matcher.real_quick_ratio() >= cutoff and
+                    matcher.quick_ratio() >= cutoff and
+                    matcher.ratio() >= cutoff):
+                result.append((matcher.ratio(), title))
+
+        return [title for score, title in heapq.nlargest(n, result)]
@@ -1,7 +1,21 @@
+from django.conf import settings
 from django.urls import path
 from . import views
 
+# Async views offload the matching to a bounded pool, for ASGI servers
+if settings.RECOMMENDATION_ASYNC_VIEWS:
+    autocomplete_view, recommendation_api_view = views.autocomplete_async, views.recommendation_api_async
+else:
+    autocomplete_view, recommendation_api_view = views.autocomplete, views.recommendation_api
+
 urlpatterns = [
     path("", views.index, name="index"),
-    path("autocomplete/", views.autocomplete, name="autocomplete"),
+    path("autocomplete/", autocomplete_view, name="autocomplete"),
+    path("api/recommendations", recommendation_api_view, name="recommendations"),
+    path("api/search", views.search_api, name="search"),
+    path("api/recommendations/batch", views.batch_recommendation_api, name="batch_recommendations"),
+    path("api/recommendations/profile", views.profile_recommendation_api, name="profile_recommendations"),
+    path("healthz", views.healthz, name="healthz"),
+    path("readyz", views.readyz, name="readyz"),
+    path("metrics", views.metrics_view, name="metrics"),
 ]
\ No newline at end of file
@@ -1,34 +1,392 @@
+import asyncio
+import hashlib
+import json
+from functools import wraps
+
+from asgiref.sync import iscoroutinefunction
+
+from django.conf import settings
+from django.contrib.staticfiles.storage import staticfiles_storage
 from django.shortcuts import render
-from django.http import JsonResponse
-from .similarity import movie_recommendation, get_movie_suggestions
+from django.http import Http404, HttpResponse, JsonResponse
+from django.utils.cache import patch_cache_control
+from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.http import require_POST
+from . import metrics, offload, profiling
+from .similarity import (
+    batch_recommendations,
+    cache_stats,
+    description_recommendation,
+    descriptions_for,
+    get_movie_suggestions,
+    model_status,
+    movie_recommendation,
+    profile_recommendation,
+    recommendations_for,
+    start_background_load,
+)
+from .autocomplete_shards import INDEX_FILE
+from .filters import FILTER_NAMES, CatalogFilters
+
+# Upper bounds for the recommendation views. Beyond the top-k neighbors
+# kept by the build, recommendations are scored on demand
+MAX_BATCH_SIZE = 10000
+MAX_PROFILE_SIZE = 500
+MAX_RECOMMENDATIONS = 200
+
+# Longest accepted free-text description, in characters
+MAX_DESCRIPTION_LENGTH = 500
+
+# Index of the static autocomplete shards written by collectstatic
+STATIC_AUTOCOMPLETE_INDEX = f'recommendation/autocomplete/{INDEX_FILE}'
+
+def _cacheable(view):
+    """
+    Let browsers and proxies keep successful responses, revalidating them
+    on every use, or reusing them for RECOMMENDATION_CACHE_MAX_AGE seconds
+    when it is above 0. The ETag holds the artifact version and a hash of
+    the content, so responses listing movie rows never outlive the
+    artifact they were built from; ConditionalGetMiddleware answers a
+    matching If-None-Match with 304.
+    """
+    def patch(request, response):
+        if request.method != 'GET' or response.status_code != 200:
+            return response
+        max_age = getattr(settings, 'RECOMMENDATION_CACHE_MAX_AGE', 0)
+        if max_age > 0:
+            patch_cache_control(response, public=True, max_age=max_age)
+        else:
+            patch_cache_control(response, public=True, no_cache=True)
+        if not response.streaming and not response.has_header('ETag'):
+            digest = hashlib.md5(response.content, usedforsecurity=False).hexdigest()
+            response['ETag'] = f'"{model_status()["artifact_version"] or "none"}-{digest}"'
+        return response
+
+    if iscoroutinefunction(view):
+        @wraps(view)
+        async def async_wrapper(request, *args, **kwargs):
+            return patch(request, await view(request, *args, **kwargs))
+        return async_wrapper
+
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        return patch(request, view(request, *args, **kwargs))
+    return wrapper
+
+def _parse_filters(params):
+    """
+    Recommendation filters from query parameters: language, genres
+    (comma separated or repeated 'genre'), year_min, year_max, min_rating.
+    Raises ValueError for malformed values.
+    """
+    filters = {name: params.get(name) for name in FILTER_NAMES}
+    if not filters['genres'] and params.getlist('genre'):
+        filters['genres'] = params.getlist('genre')
+    return CatalogFilters.normalize(filters)
+
+def _static_autocomplete_url():
+    """URL of the static autocomplete index, None when disabled or not collected."""
+    if not getattr(settings, 'RECOMMENDATION_STATIC_AUTOCOMPLETE', False):
+        return None
+    if not staticfiles_storage.exists(STATIC_AUTOCOMPLETE_INDEX):
+        return None
+    return staticfiles_storage.url(STATIC_AUTOCOMPLETE_INDEX)
 
 # Create your views here.
+@profiling.profiled
+@_cacheable
 def index(request):
     recommendation = []
-    # Check for title in GET or POST
+    error = None
+    status = 200
+    # Check for title or a free-text description in GET or POST
     title = request.GET.get('title') or request.POST.get('title')
     movie_index = request.GET.get('movie_index') or request.POST.get('movie_index')
+    description = request.GET.get('describe') or request.POST.get('describe')
     
-    if title:
+    if title or description:
         number = request.GET.get('number') or request.POST.get('number')
         # Default to 10 if number is missing/invalid, though HTML enforces it.
         # It's safer to handle conversion errors
         try:
-            number = int(number)
+            number = min(max(int(number), 1), MAX_RECOMMENDATIONS)
         except (ValueError, TypeError):
             number = 10
         
-        # Pass movie_index if provided
-        recommendation = movie_recommendation(title, number, movie_index)
+        # Optional filters, ignored when malformed since the form never sends them
+        try:
+            filters = _parse_filters(request.GET if request.method == 'GET' else request.POST)
+        except ValueError:
+            filters = None
+        
+        if title:
+            # Pass movie_index if provided
+            try:
+                recommendation = movie_recommendation(title, number, movie_index, filters)
+            except ValueError as e:
+                error = f"Too many recommendations requested: {e}."
+                status = 400
+        else:
+            try:
+                recommendation = description_recommendation(description[:MAX_DESCRIPTION_LENGTH], number, filters)
+            except RuntimeError:
+                error = "Describing a movie is unavailable until the recommendation data is rebuilt."
+                status = 503
 
-    return render(request, 'recommendation/movies.html', {
-        'recommendation' : recommendation
-    })
+    with metrics.stage('render'):
+        return render(request, 'recommendation/movies.html', {
+            'recommendation' : recommendation,
+            'error': error,
+            'static_autocomplete_url': _static_autocomplete_url(),
+            'max_recommendations': MAX_RECOMMENDATIONS,
+        }, status=status)
 
+@profiling.profiled
+@_cacheable
 def autocomplete(request):
     """
     API endpoint for movie autocomplete suggestions
     """
     query = request.GET.get('q', '')
     suggestions = get_movie_suggestions(query, limit=50)
-    return JsonResponse({'suggestions': suggestions})
+    with metrics.stage('render'):
+        return JsonResponse({'suggestions': suggestions})
+
+def _timed_out():
+    return JsonResponse({'error': 'Request timed out'}, status=503)
+
+def _rebuild_needed(error):
+    """503 for endpoints the loaded artifact is too old to serve, until it is rebuilt."""
+    return JsonResponse({'error': f"The artifact must be rebuilt to serve this request. {error}"}, status=503)
+
+@_cacheable
+async def autocomplete_async(request):
+    """
+    Async variant of autocomplete for ASGI servers. Matching runs on the
+    offload pool within RECOMMENDATION_REQUEST_TIMEOUT and stops when the
+    client goes away, which typing fast does to the older queries.
+    """
+    query = request.GET.get('q', '')
+    try:
+        suggestions = await offload.run(
+            get_movie_suggestions, query, 50, timeout=settings.RECOMMENDATION_REQUEST_TIMEOUT
+        )
+    except asyncio.TimeoutError:
+        return _timed_out()
+    with metrics.stage('render'):
+        return JsonResponse({'suggestions': suggestions})
+
+def _parse_number(value, default=10):
+    """
+    Validate the 'number' parameter of the JSON APIs, None when invalid.
+    Query string values are parsed; JSON bodies must send an integer (see
+    _parse_indices_payload).
+    """
+    if value is None:
+        return default
+    try:
+        number = int(value)
+    except (ValueError, TypeError):
+        return None
+    return number if 1 <= number <= MAX_RECOMMENDATIONS else None
+
+@profiling.profiled
+@_cacheable
+def recommendation_api(request):
+    """
+    Recommendations for one movie as JSON, selected by 'movie_index' or
+    'title' plus 'number' and optional filters (see _parse_filters).
+    """
+    title = request.GET.get('title', '')
+    movie_index = request.GET.get('movie_index')
+    if not title and movie_index is None:
+        return JsonResponse({'error': "Either 'title' or 'movie_index' is required"}, status=400)
+
+    number = _parse_number(request.GET.get('number'))
+    if number is None:
+        return JsonResponse({'error': f"'number' must be an integer between 1 and {MAX_RECOMMENDATIONS}"}, status=400)
+    try:
+        filters = _parse_filters(request.GET)
+    except ValueError:
+        return JsonResponse({'error': 'Invalid filter value'}, status=400)
+
+    try:
+        result = recommendations_for(title, number, movie_index, filters)
+    except ValueError as e:
+        return JsonResponse({'error': str(e)}, status=400)
+    if result['movie_index'] is None:
+        return JsonResponse({'error': 'Movie not found', **result}, status=404)
+    with metrics.stage('render'):
+        return JsonResponse(result)
+
+@_cacheable
+async def recommendation_api_async(request):
+    """Async variant of recommendation_api for ASGI servers, see autocomplete_async."""
+    title = request.GET.get('title', '')
+    movie_index = request.GET.get('movie_index')
+    if not title and movie_index is None:
+        return JsonResponse({'error': "Either 'title' or 'movie_index' is required"}, status=400)
+
+    number = _parse_number(request.GET.get('number'))
+    if number is None:
+        return JsonResponse({'error': f"'number' must be an integer between 1 and {MAX_RECOMMENDATIONS}"}, status=400)
+    try:
+        filters = _parse_filters(request.GET)
+    except ValueError:
+        return JsonResponse({'error': 'Invalid filter value'}, status=400)
+
+    try:
+        result = await offload.run(
+            recommendations_for, title, number, movie_index, filters,
+            timeout=settings.RECOMMENDATION_REQUEST_TIMEOUT,
+        )
+    except asyncio.TimeoutError:
+        return _timed_out()
+    except ValueError as e:
+        return JsonResponse({'error': str(e)}, status=400)
+    if result['movie_index'] is None:
+        return JsonResponse({'error': 'Movie not found', **result}, status=404)
+    with metrics.stage('render'):
+        return JsonResponse(result)
+
+@profiling.profiled
+@_cacheable
+def search_api(request):
+    """
+    Movies matching a free-text description as JSON, given in 'q' plus
+    'number' and optional filters (see _parse_filters).
+    Returns {"recommendations": [...]}, empty when no word of 'q' is known.
+    """
+    description = request.GET.get('q', '').strip()
+    if not description:
+        return JsonResponse({'error': "'q' is required"}, status=400)
+    if len(description) > MAX_DESCRIPTION_LENGTH:
+        return JsonResponse({'error': f"'q' must be at most {MAX_DESCRIPTION_LENGTH} characters"}, status=400)
+
+    number = _parse_number(request.GET.get('number'))
+    if number is None:
+        return JsonResponse({'error': f"'number' must be an integer between 1 and {MAX_RECOMMENDATIONS}"}, status=400)
+    try:
+        filters = _parse_filters(request.GET)
+    except ValueError:
+        return JsonResponse({'error': 'Invalid filter value'}, status=400)
+
+    try:
+        result = descriptions_for(description, number, filters)
+    except RuntimeError as e:
+        return _rebuild_needed(e)
+    with metrics.stage('render'):
+        return JsonResponse(result)
+
+def _parse_indices_payload(request, max_indices):
+    """
+    Parse a {"movie_indices": [...], "number": n} JSON body.
+    Returns (movie_indices, number, None) or (None, None, error response).
+    """
+    try:
+        payload = json.loads(request.body or b'{}')
+    except (ValueError, UnicodeDecodeError):
+        return None, None, JsonResponse({'error': 'Request body must be valid JSON'}, status=400)
+
+    movie_indices = payload.get('movie_indices') if isinstance(payload, dict) else None
+    if not isinstance(movie_indices, list):
+        return None, None, JsonResponse({'error': "'movie_indices' must be a list of movie indices"}, status=400)
+    if len(movie_indices) > max_indices:
+        return None, None, JsonResponse({'error': f"At most {max_indices} movie indices per request"}, status=400)
+    # JSON true and 1.7 are not movie indices
+    if any(type(movie_index) is not int for movie_index in movie_indices):
+        return None, None, JsonResponse({'error': "'movie_indices' must only contain integers"}, status=400)
+
+    number = payload.get('number')
+    # Like the indices, JSON true, 10.9 and "10" are rejected rather than coerced
+    number = _parse_number(number) if number is None or type(number) is int else None
+    if number is None:
+        return None, None, JsonResponse(
+            {'error': f"'number' must be an integer between 1 and {MAX_RECOMMENDATIONS}"}, status=400
+        )
+    return movie_indices, number, None
+
+@csrf_exempt
+@require_POST
+def batch_recommendation_api(request):
+    """
+    Recommendations for many movies in one call.
+    Expects a JSON body {"movie_indices": [...], "number": 10} and returns
+    {"results": {"<movie_index>": [...]}, "invalid": [...]}
+    """
+    movie_indices, number, error = _parse_indices_payload(request, MAX_BATCH_SIZE)
+    if error:
+        return error
+    try:
+        return JsonResponse(batch_recommendations(movie_indices, number))
+    except ValueError as e:
+        return JsonResponse({'error': str(e)}, status=400)
+
+@csrf_exempt
+@require_POST
+def profile_recommendation_api(request):
+    """
+    Recommendations for a set of liked movies.
+    Expects a JSON body {"movie_indices": [...], "number": 10} and returns
+    {"recommendations": [...], "invalid": [...]}
+    """
+    movie_indices, number, error = _parse_indices_payload(request, MAX_PROFILE_SIZE)
+    if error:
+        return error
+    try:
+        return JsonResponse(profile_recommendation(movie_indices, number))
+    except RuntimeError as e:
+        return _rebuild_needed(e)
+
+def healthz(request):
+    """
+    Liveness probe, always 200 while the process is serving requests.
+    Reports model load state, artifact version and load duration.
+    """
+    return JsonResponse(model_status())
+
+def readyz(request):
+    """
+    Readiness probe, 200 once the model is loaded and 503 until then.
+    The first probe starts loading the model in the background.
+    """
+    status = model_status()
+    if status['state'] != 'ready':
+        start_background_load()
+        status = model_status()
+    return JsonResponse(status, status=200 if status['state'] == 'ready' else 503)
+
+def metrics_view(request):
+    """
+    Request and stage latency histograms, fuzzy fallback counts, result
+    cache hit rates and artifact load figures in Prometheus text format.
+    404 unless RECOMMENDATION_METRICS is on.
+    """
+    if not metrics.is_enabled():
+        raise Http404("Metrics are disabled")
+
+    status = model_status()
+    caches = cache_stats()
+    gauges = [
+        ('recommendation_model_loaded', 'gauge', "1 once the model is loaded", (),
+         [((), int(status['state'] == 'ready'))]),
+        ('recommendation_cache_hits_total', 'counter', "Result cache hits", ('cache',),
+         [((name,), stats['hits']) for name, stats in caches.items()]),
+        ('recommendation_cache_misses_total', 'counter', "Result cache misses", ('cache',),
+         [((name,), stats['misses']) for name, stats in caches.items()]),
+        ('recommendation_cache_entries', 'gauge', "Entries held by each result cache", ('cache',),
+         [((name,), stats['entries']) for name, stats in caches.items()]),
+        ('recommendation_cache_bytes', 'gauge', "Estimated bytes held by each result cache", ('cache',),
+         [((name,), stats['bytes']) for name, stats in caches.items()]),
+    ]
+    if status['state'] == 'ready':
+        gauges += [
+            ('recommendation_artifact_load_seconds', 'gauge', "Time taken to load the model", (),
+             [((), status['load_seconds'])]),
+            ('recommendation_artifact_movies', 'gauge', "Movies in the loaded catalog", (),
+             [((), status['n_movies'])]),
+        ]
+        if status['artifact_bytes'] is not None:
+            gauges.append(('recommendation_artifact_bytes', 'gauge', "On-disk size of the loaded artifact", (),
+                           [((), status['artifact_bytes'])]))
+    return HttpResponse(metrics.render(gauges), content_type='text/plain; version=0.0.4; charset=utf-8')